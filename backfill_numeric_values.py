@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""Add `answers.numeric_value` to an existing database and fill it.
+
+Safe to run repeatedly: the column and index are created only if missing and
+only answers with an empty numeric value are recomputed. The application does
+the same at startup; the script is for filling a database without starting it.
+
+Usage:
+    python backfill_numeric_values.py [--batch-size 1000]
+"""
+import argparse
+
+from sqlalchemy import inspect, text
+
+from src.db.session import LocalSession, engine
+from src.db.models import Answer
+from src.app.services.answers import backfill_numeric_values
+
+
+def ensure_column():
+    inspector = inspect(engine)
+    columns = {c["name"] for c in inspector.get_columns(Answer.__tablename__)}
+    if "numeric_value" not in columns:
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {Answer.__tablename__} ADD COLUMN numeric_value FLOAT"))
+        print("Added column answers.numeric_value")
+
+    indexes = {i["name"] for i in inspect(engine).get_indexes(Answer.__tablename__)}
+    for index in Answer.__table__.indexes:
+        if index.name not in indexes and "numeric_value" in index.columns:
+            index.create(bind=engine)
+            print(f"Created index {index.name}")
+
+
+def backfill(batch_size: int) -> int:
+    with LocalSession() as db:
+        return backfill_numeric_values(db, batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    ensure_column()
+    print(f"Backfilled numeric values: {backfill(args.batch_size)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+"""Compare the side extraction prompt variants of `llm_agg.prompts` on fixture reviews.
+
+Every variant is run over the anonymised reviews of a fixture file:
+- `layout`: the production request (`sides_layout`), then `RECOMMENDATIONS_PROMPT`;
+- `combined`: sides and recommendations in one call (`combined_layout`);
+- every `SIDES_EXTRACTING_PROMPT*` template of `llm_agg.prompts.eval` with a
+  `{feedback}` placeholder, then `RECOMMENDATIONS_PROMPT`.
+
+Per variant the table shows prompt and completion tokens per review, latency
+percentiles of a whole review, schema-validation failures (after the local
+repair of `llm_agg.repair`, which is counted separately) and the share of
+proofs that are verbatim quotes of the feedback.
+
+Without `--base-url`, a fake server (`llm_agg.fake_server`) is started in
+process, which is useful to check the harness and the overhead of the
+prompts but not their quality.
+
+Usage:
+    python benchmarks/prompt_variants.py [--base-url http://127.0.0.1:9001/v1 --model name]
+        [--api-key KEY] [--provider local] [--fixtures benchmarks/fixtures/reviews.json]
+        [--variants layout,combined] [--repeat 1] [--concurrency 4] [--json results.json]
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from openai import AsyncOpenAI
+from pydantic import BaseModel
+
+from src.llm_agg.feedback import assemble_feedback
+from src.llm_agg.map_reduce import MARKER_RE, ReviewerFeedback
+from src.llm_agg.prompts import BASE_PROMPT_WO_TASK, RECOMMENDATIONS_PROMPT
+from src.llm_agg.prompts import eval as eval_prompts
+from src.llm_agg.prompts.builder import combined_layout, sides_layout, sides_variable_part
+from src.llm_agg.repair import REPAIR_STATS
+from src.llm_agg.response import get_so_completion
+from src.llm_agg.schemas.combined import SidesWithRecommendations
+from src.llm_agg.schemas.recommendations import Recommendations
+from src.llm_agg.schemas.sides import AmbiguousSide, Sides
+from src.llm_agg.usage import UsageTracker
+from src.llm_agg.utils import get_provider, remove_ambiguous_sides
+
+DEFAULT_FIXTURES = Path(__file__).resolve().parent / "fixtures" / "reviews.json"
+
+
+@dataclass
+class Variant:
+    name: str
+    messages: Callable[[str], list[dict]]  # feedback -> sides request
+    model: type[BaseModel] = Sides
+    recommendations: bool = True  # a second call with RECOMMENDATIONS_PROMPT
+
+
+def _template_messages(template: str):
+    return lambda feedback: [
+        {"role": "system", "content": BASE_PROMPT_WO_TASK},
+        {"role": "user", "content": template.replace("{feedback}", feedback)},
+    ]
+
+
+def all_variants() -> list[Variant]:
+    variants = [
+        Variant("layout", lambda feedback: sides_layout().messages(sides_variable_part(feedback))),
+        Variant(
+            "combined",
+            lambda feedback: combined_layout().messages(sides_variable_part(feedback)),
+            model=SidesWithRecommendations,
+            recommendations=False,
+        ),
+    ]
+    for name, value in vars(eval_prompts).items():
+        if name.startswith("SIDES_EXTRACTING_PROMPT") and isinstance(value, str) and "{feedback}" in value:
+            variants.append(Variant(name, _template_messages(value)))
+    return variants
+
+
+def load_fixtures(path: Path) -> list[list[ReviewerFeedback]]:
+    """Reviewer blocks of every fixture review, labelled as the pipeline labels anonymous reviewers."""
+    reviews = []
+    for review in json.loads(path.read_text(encoding="utf-8")):
+        blocks = []
+        for i, reviewer in enumerate(review["reviewers"]):
+            answers = [(a["question"], a["answer"]) for a in reviewer["answers"]]
+            blocks.append(ReviewerFeedback(
+                label=f"Reviewer {i+1}",
+                text="\n".join(f"{q}: {a}" for q, a in answers if a),
+                answers=answers,
+            ))
+        reviews.append(blocks)
+    return reviews
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().replace("ё", "е").split()).strip(" .,;:!?\"'«»…")
+
+
+def verbatim_counts(sides: Sides, feedback: str) -> tuple[int, int]:
+    """(verbatim proofs, all proofs): a proof is verbatim if its text after the marker is in the feedback."""
+    source = _normalize(feedback)
+    proofs = []
+    for item in sides.sides:
+        proofs.extend(item.proofs_strong + item.proofs_weak if isinstance(item, AmbiguousSide) else item.proofs)
+    verbatim = sum(1 for p in proofs if _normalize(MARKER_RE.sub("", p)) in source)
+    return verbatim, len(proofs)
+
+
+@dataclass
+class VariantResult:
+    variant: str
+    reviews: int = 0
+    failures: int = 0  # reviews with a call that failed validation (or any other error)
+    repaired: int = 0
+    continued: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    proofs: int = 0
+    verbatim_proofs: int = 0
+    latencies: list[float] = field(default_factory=list)
+    errors: list[str] = field(default_factory=list)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    def row(self) -> dict:
+        ok = self.reviews - self.failures
+        return {
+            "variant": self.variant,
+            "reviews": self.reviews,
+            "failures": self.failures,
+            "repaired": self.repaired + self.continued,
+            "prompt_tok": round(self.prompt_tokens / ok) if ok else 0,
+            "completion_tok": round(self.completion_tokens / ok) if ok else 0,
+            "p50_s": self.percentile(0.5),
+            "p95_s": self.percentile(0.95),
+            "verbatim": self.verbatim_proofs / self.proofs if self.proofs else None,
+        }
+
+
+async def run_review(variant: Variant, blocks: list[ReviewerFeedback], complete) -> tuple[UsageTracker, float, Sides]:
+    usage = UsageTracker()
+    feedback = assemble_feedback(blocks).text
+    started = time.perf_counter()
+    log = variant.messages(feedback)
+    result = await complete(log, variant.model, usage)
+    sides = result.parsed.sides if variant.model is SidesWithRecommendations else result.parsed
+    if variant.recommendations:
+        log.append({"role": "assistant", "content": remove_ambiguous_sides(result)})
+        log.append({"role": "user", "content": RECOMMENDATIONS_PROMPT})
+        await complete(log, Recommendations, usage)
+    return usage, time.perf_counter() - started, sides
+
+
+async def run_variant(variant: Variant, reviews, complete, repeat: int, concurrency: int) -> VariantResult:
+    result = VariantResult(variant.name)
+    slots = asyncio.Semaphore(concurrency)
+    repairs_before = asdict(REPAIR_STATS)
+
+    async def _one(blocks):
+        async with slots:
+            result.reviews += 1
+            try:
+                usage, latency, sides = await run_review(variant, blocks, complete)
+            except Exception as e:  # validation failures, provider errors
+                result.failures += 1
+                result.errors.append(f"{type(e).__name__}: {str(e)[:200]}")
+                return
+        totals = usage.totals()
+        result.prompt_tokens += totals["prompt_tokens"]
+        result.completion_tokens += totals["completion_tokens"]
+        result.latencies.append(latency)
+        verbatim, proofs = verbatim_counts(sides, "\n".join(b.text for b in blocks))
+        result.verbatim_proofs += verbatim
+        result.proofs += proofs
+
+    # variants run one after another, so the repair counters can be attributed
+    await asyncio.gather(*(_one(blocks) for _ in range(repeat) for blocks in reviews))
+    repairs_after = asdict(REPAIR_STATS)
+    result.repaired = repairs_after["repaired"] - repairs_before["repaired"]
+    result.continued = repairs_after["continued"] - repairs_before["continued"]
+    return result
+
+
+def print_table(results: list[VariantResult]) -> None:
+    def fmt(value, spec):
+        return "-" if value is None else format(value, spec)
+
+    print(f"{'variant':<48}{'reviews':>8}{'fail':>6}{'repair':>7}{'prompt':>8}{'compl':>7}"
+          f"{'p50 s':>8}{'p95 s':>8}{'verbatim':>10}")
+    for result in sorted(results, key=lambda r: r.row()["prompt_tok"]):
+        row = result.row()
+        print(f"{row['variant']:<48}{row['reviews']:>8}{row['failures']:>6}{row['repaired']:>7}"
+              f"{row['prompt_tok']:>8}{row['completion_tok']:>7}{fmt(row['p50_s'], '.2f'):>8}"
+              f"{fmt(row['p95_s'], '.2f'):>8}{fmt(row['verbatim'], '.0%'):>10}")
+
+
+async def run(args, base_url: str) -> list[VariantResult]:
+    client = AsyncOpenAI(base_url=base_url, api_key=args.api_key, max_retries=0)
+    provider = args.provider or get_provider(base_url)
+
+    async def complete(log, model, usage):
+        return await get_so_completion(
+            log=log, model_name=args.model, client=client, pydantic_model=model,
+            provider_name=provider, usage_tracker=usage,
+        )
+
+    variants = all_variants()
+    if args.variants:
+        wanted = set(args.variants.split(","))
+        variants = [v for v in variants if v.name in wanted]
+    reviews = load_fixtures(args.fixtures)
+    results = []
+    for variant in variants:
+        results.append(await run_variant(variant, reviews, complete, args.repeat, args.concurrency))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", help="OpenAI-compatible endpoint; a fake server is started if omitted")
+    parser.add_argument("--api-key", default="local")
+    parser.add_argument("--model", default="fake")
+    parser.add_argument("--provider", choices=["openai", "openrouter", "local"])
+    parser.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURES)
+    parser.add_argument("--variants", help="comma-separated variant names (default: all)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--json", type=Path, help="also write the results here")
+    args = parser.parse_args()
+
+    if args.base_url:
+        results = asyncio.run(run(args, args.base_url))
+    else:
+        from src.llm_agg.fake_server import FakeLLMConfig, FakeServerThread
+        with FakeServerThread(FakeLLMConfig(latency_mean=0.2, seed=0)) as server:
+            args.provider = args.provider or "local"
+            results = asyncio.run(run(args, server.base_url))
+
+    print_table(results)
+    for result in results:
+        for error in result.errors[:3]:
+            print(f"{result.variant}: {error}")
+    if args.json:
+        args.json.write_text(json.dumps(
+            [{**r.row(), "latencies": r.latencies, "errors": r.errors} for r in results],
+            ensure_ascii=False, indent=2,
+        ), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""Compare DB round-trips of the survey answer save path, before and after.
+
+Builds a 50-question review in an in-memory SQLite database and counts the SQL
+statements sent to the driver for:
+- the legacy path (delete every answer, `db.get(Question)` and a per-answer
+  option query, ORM inserts);
+- the current path (`load_question_map` + `resolve_answers` + `apply_answer_diff`).
+
+Both are measured for the first full save and for a typical autosave where a
+single answer changed.
+
+Usage:
+    python benchmarks/save_answers_roundtrips.py [--questions 50]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import create_engine, delete, event, select
+from sqlalchemy.orm import Session
+
+from src.db import Base
+from src.db.models import (
+    Answer, AnswerSelection,
+    Question, QuestionOption, QuestionType,
+    Review, Survey, User,
+)
+from src.app.schemas.answer import AnswerIn
+from src.app.services.answers import apply_answer_diff, load_question_map, resolve_answers
+
+QUESTION_TYPES = [QuestionType.radio, QuestionType.checkbox, QuestionType.text, QuestionType.textarea, QuestionType.range_slider]
+
+
+def _seed(db: Session, n_questions: int) -> tuple[str, str, list[AnswerIn]]:
+    user = User(first_name="Bench", last_name="User")
+    db.add(user)
+    db.flush()
+    review = Review(created_by_user_id=user.user_id, title="bench")
+    db.add(review)
+    db.flush()
+    survey = Survey(review_id=review.review_id, evaluator_user_id=user.user_id)
+    db.add(survey)
+
+    answers = []
+    for i in range(n_questions):
+        qtype = QUESTION_TYPES[i % len(QUESTION_TYPES)]
+        question = Question(review_id=review.review_id, question_text=f"Q{i}", question_type=qtype, position=i)
+        db.add(question)
+        db.flush()
+        if qtype in (QuestionType.radio, QuestionType.checkbox):
+            opts = [QuestionOption(question_id=question.question_id, option_text=str(v), position=v) for v in range(1, 6)]
+            db.add_all(opts)
+            db.flush()
+            picked = [opts[0].option_id] if qtype == QuestionType.radio else [opts[0].option_id, opts[2].option_id]
+            answers.append(AnswerIn(question_id=question.question_id, selected_option_ids=picked))
+        else:
+            answers.append(AnswerIn(question_id=question.question_id, response_text=f"answer {i}"))
+    db.commit()
+    return review.review_id, survey.survey_id, answers
+
+
+def _legacy_save(db: Session, review_id: str, survey_id: str, answers: list[AnswerIn]) -> None:
+    db.execute(
+        delete(AnswerSelection).where(
+            AnswerSelection.answer_id.in_(select(Answer.answer_id).where(Answer.survey_id == survey_id))
+        )
+    )
+    db.execute(delete(Answer).where(Answer.survey_id == survey_id))
+    db.flush()
+    for answer_data in answers:
+        question = db.get(Question, answer_data.question_id)
+        if not question or question.review_id != review_id:
+            continue
+        new_answer = Answer(survey_id=survey_id, question_id=question.question_id)
+        if question.question_type in (QuestionType.text, QuestionType.textarea, QuestionType.range_slider):
+            new_answer.response_text = answer_data.response_text
+        elif answer_data.selected_option_ids:
+            options = db.scalars(
+                select(QuestionOption).where(
+                    QuestionOption.option_id.in_(answer_data.selected_option_ids),
+                    QuestionOption.question_id == question.question_id,
+                )
+            ).all()
+            new_answer.selected_options.extend(options)
+        db.add(new_answer)
+    db.commit()
+
+
+def _diff_save(db: Session, review_id: str, survey_id: str, answers: list[AnswerIn]) -> None:
+    desired = resolve_answers(load_question_map(db, review_id), answers)
+    apply_answer_diff(db, survey_id, desired)
+    db.commit()
+
+
+def _measure(save, n_questions: int) -> tuple[int, int]:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        review_id, survey_id, answers = _seed(db, n_questions)
+
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(1))
+
+        save(db, review_id, survey_id, answers)
+        first = len(statements)
+        db.expunge_all()
+
+        statements.clear()
+        edited = list(answers)
+        text_idx = next(i for i, a in enumerate(edited) if a.response_text is not None)
+        edited[text_idx] = AnswerIn(question_id=edited[text_idx].question_id, response_text="edited")
+        save(db, review_id, survey_id, edited)
+        autosave = len(statements)
+    return first, autosave
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=50)
+    args = parser.parse_args()
+
+    rows = [
+        ("legacy (delete + re-insert)", *_measure(_legacy_save, args.questions)),
+        ("diff + question map", *_measure(_diff_save, args.questions)),
+    ]
+    print(f"Round-trips per save, {args.questions}-question review")
+    print(f"{'path':<30}{'first save':>12}{'autosave':>12}")
+    for name, first, autosave in rows:
+        print(f"{name:<30}{first:>12}{autosave:>12}")
+
+
+if __name__ == "__main__":
+    main()
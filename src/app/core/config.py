@@ -1,10 +1,20 @@
 """Application configuration and LLM client initialization.
 
-Defines `Settings` with environment variables and creates an `OPENAI_CLIENT'.
+Defines `Settings` with environment variables and creates an `OPENAI_CLIENT', the
+shared `LLM_CACHE` of structured completions and `LLM_COMPLETER`, which routes
+structured completions over the configured endpoints (`LLM_ROUTES`, or the
+main endpoint plus the optional fallback) and applies the call policy
+(deadlines, retries, hedging, failover) to them.
 """
 # app/core/config.py
+from typing import Literal, Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from openai import AsyncOpenAI
+from src.llm_agg.cache import CompletionCache
+from src.llm_agg.policy import CallPolicy, LLMEndpoint, ResilientCompleter
+from src.llm_agg.routing import parse_routes
+from src.llm_agg.utils import get_provider
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
@@ -12,11 +22,55 @@ class Settings(BaseSettings):
     OPENAI_BASE_URL: str = "https://openrouter.ai/api/v1"
     OPENAI_API_KEY: str = 'your_api_key'
     MODEL_NAME: str = 'openai/gpt-4o'
+    LLM_PROVIDER: Optional[Literal['openai', 'openrouter', 'local']] = None  # by default from OPENAI_BASE_URL
+    LLM_EXTRACTION_MODE: str = "two_call"  # or "combined": sides and recommendations in one completion
+    LLM_STREAM_PROGRESS: bool = True  # stream the sides call of a report job to report progress
+    LLM_PROMPT_CACHE_HINTS: bool = True  # mark the static prompt prefix with cache_control (OpenRouter endpoints only)
+    MAP_REDUCE_TOKEN_THRESHOLD: int = 12000  # feedback size above which sides are extracted in chunks
+    MAP_REDUCE_CHUNK_TOKENS: int = 6000
+    MAP_REDUCE_CONCURRENCY: int = 4
+    FEEDBACK_TOKEN_BUDGET: int = 12000  # longest answers are shortened above it; 0 disables
+    REPORT_INCREMENTAL_ENABLED: bool = True  # update the persisted sides with late surveys only
+    REPORT_INCREMENTAL_MAX_NEW_SHARE: float = 0.5  # above this share of new reviewers, regenerate fully
+    REPORT_VERIFY_PROOFS: bool = True  # check proofs are verbatim quotes, recount respondents from markers
+    REPORT_PROOF_REPAIR_ENABLED: bool = True  # one LLM call for the items with non-verbatim proofs
+    SURVEY_DIGESTS_ENABLED: bool = False  # condense each survey's feedback on final submit
+    SURVEY_DIGEST_MIN_TOKENS: int = 400  # shorter feedback is sent to the report as is
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_PATH: str = "cache/llm_completions.sqlite3"
+    LLM_CACHE_TTL: int = 60 * 60 * 24 * 7  # 7 days
+    LLM_CACHE_MAX_ENTRIES: int = 2000
+    LLM_CALL_TIMEOUT: float = 120.0  # seconds per attempt
+    LLM_CALL_MAX_ATTEMPTS: int = 3  # per endpoint
+    LLM_CALL_BACKOFF_BASE: float = 1.0  # seconds, doubled per retry, full jitter
+    LLM_CALL_BACKOFF_MAX: float = 20.0
+    LLM_HEDGE_ENABLED: bool = True  # duplicate an attempt that outlives the endpoint's p95 latency
+    LLM_HEDGE_MIN_DELAY: float = 5.0
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+    LLM_BREAKER_FAILURES: int = 5
+    LLM_BREAKER_RESET: float = 60.0
+    LLM_FALLBACK_BASE_URL: str = ""  # e.g. http://localhost:8001/v1; empty disables failover
+    LLM_FALLBACK_API_KEY: str = "local"
+    LLM_FALLBACK_MODEL_NAME: str = ""
+    LLM_FALLBACK_PROVIDER: Optional[Literal['openai', 'openrouter', 'local']] = None  # by default from the URL
+    # JSON list of routes (see `llm_agg.routing.RouteConfig`); replaces the main and fallback endpoints, e.g.
+    # [{"name": "local", "base_url": "http://localhost:8001/v1", "model_name": "qwen", "max_prompt_tokens": 8000},
+    #  {"name": "openrouter", "base_url": "https://openrouter.ai/api/v1", "api_key": "...", "model_name": "openai/gpt-4o",
+    #   "cost_per_1k_tokens": 2.5}]
+    LLM_ROUTES: str = ""
 
     APP_NAME: str = "Proxis Core"
     BACKEND_URL: str = "http://127.0.0.1:8000"
     DEBUG: bool = True
     NOTIFICATION_TIMER: int = 60
+    ANSWER_FLUSH_INTERVAL: float = 2.0  # seconds between write-behind flushes of draft answers
+    REPORT_JOB_CONCURRENCY: int = 2  # reports generated in parallel per process
+    REPORT_JOB_MAX_ATTEMPTS: int = 3
+    REPORT_JOB_RETRY_BASE: float = 30.0  # seconds, doubled after every failed attempt
+    REPORT_JOB_RETRY_MAX: float = 15 * 60
+    REPORT_JOB_TIMEOUT: float = 10 * 60  # per attempt; also the lease of a running job
+    REPORT_JOB_POLL_INTERVAL: float = 5.0
+    REPORT_PRECOMPUTE_ENABLED: bool = True  # generate the report once no surveys are pending, before end_at
     LOG_PATH: str="logging"
     SECRET_KEY: str = "change-me-in-env"
     DATABASE_URL: str = "sqlite:///./app.db"
@@ -34,3 +88,66 @@ class Settings(BaseSettings):
 
 settings = Settings()
 OPENAI_CLIENT = AsyncOpenAI(base_url=settings.OPENAI_BASE_URL, api_key=settings.OPENAI_API_KEY)
+LLM_CACHE = CompletionCache(
+    settings.LLM_CACHE_PATH,
+    ttl_seconds=settings.LLM_CACHE_TTL,
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+) if settings.LLM_CACHE_ENABLED else None
+
+def _provider(base_url: str, explicit: Optional[str] = None) -> str:
+    """The explicit provider, else the one guessed from the URL; any other OpenAI-compatible URL is 'openrouter'."""
+    if explicit:
+        return explicit
+    try:
+        return get_provider(base_url)
+    except ValueError:
+        return 'openrouter'
+
+
+def _cache_hints(provider: str, explicit: Optional[bool] = None) -> bool:
+    """Whether an endpoint gets `cache_control` hints: only OpenRouter understands them."""
+    if not settings.LLM_PROMPT_CACHE_HINTS:
+        return False
+    return explicit if explicit is not None else provider == 'openrouter'
+
+
+# retries belong to the call policy, not to the SDK
+_routes = parse_routes(settings.LLM_ROUTES)
+_endpoints = [LLMEndpoint(
+    provider_name=_provider(route.base_url, route.provider),
+    client=AsyncOpenAI(base_url=route.base_url, api_key=route.api_key, max_retries=0),
+    model_name=route.model_name,
+    name=route.name,
+    max_prompt_tokens=route.max_prompt_tokens,
+    max_concurrency=route.max_concurrency,
+    cost_per_1k_tokens=route.cost_per_1k_tokens,
+    cache_hints=_cache_hints(_provider(route.base_url, route.provider), route.cache_hints),
+) for route in _routes] or [LLMEndpoint(
+    provider_name=_provider(settings.OPENAI_BASE_URL, settings.LLM_PROVIDER),
+    client=OPENAI_CLIENT.with_options(max_retries=0),
+    model_name=settings.MODEL_NAME,
+    cache_hints=_cache_hints(_provider(settings.OPENAI_BASE_URL, settings.LLM_PROVIDER)),
+)]
+if settings.LLM_FALLBACK_BASE_URL and not _routes:
+    _endpoints.append(LLMEndpoint(
+        provider_name=_provider(settings.LLM_FALLBACK_BASE_URL, settings.LLM_FALLBACK_PROVIDER),
+        client=AsyncOpenAI(
+            base_url=settings.LLM_FALLBACK_BASE_URL,
+            api_key=settings.LLM_FALLBACK_API_KEY,
+            max_retries=0,
+        ),
+        model_name=settings.LLM_FALLBACK_MODEL_NAME or settings.MODEL_NAME,
+        cache_hints=_cache_hints(_provider(settings.LLM_FALLBACK_BASE_URL, settings.LLM_FALLBACK_PROVIDER)),
+    ))
+LLM_COMPLETER = ResilientCompleter(_endpoints, CallPolicy(
+    attempt_timeout=settings.LLM_CALL_TIMEOUT,
+    max_attempts=settings.LLM_CALL_MAX_ATTEMPTS,
+    backoff_base=settings.LLM_CALL_BACKOFF_BASE,
+    backoff_max=settings.LLM_CALL_BACKOFF_MAX,
+    hedge=settings.LLM_HEDGE_ENABLED,
+    hedge_min_delay=settings.LLM_HEDGE_MIN_DELAY,
+    hedge_min_samples=settings.LLM_HEDGE_MIN_SAMPLES,
+    breaker_failures=settings.LLM_BREAKER_FAILURES,
+    breaker_reset=settings.LLM_BREAKER_RESET,
+# the main endpoint and its fallback keep their order; only routes are ranked per request
+), ranked=bool(_routes))
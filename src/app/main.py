@@ -1,7 +1,7 @@
 """The main entry point of FastAPI applications.
 
 Creates an instance of the application, installs statics and templates, connects routers
-, and raises background tasks (telegram bot and status manager) at the launch event.
+, and raises background tasks (telegram bot, status manager, answer buffer and report worker) at the launch event.
 """
 # app/main.py
 import asyncio
@@ -10,11 +10,15 @@ from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from src.app.core.config import settings
-from src.db.session import engine
+from src.db.session import LocalSession, engine
 from src.db import Base
+from src.db.schema_sync import add_missing_columns, add_missing_unique_indexes
 from src.app.routers import admin, surveys, api
 from src.app.services.telegram_bot import start_telegram_bot
 from src.app.services.status_manager import run_status_manager_loop
+from src.app.services.answer_buffer import answer_buffer, run_answer_buffer_loop
+from src.app.services.answers import backfill_numeric_values
+from src.app.services.report_jobs import report_worker
 
 logger = logging.getLogger(__name__)
 
@@ -30,9 +34,25 @@ app.include_router(api.router)
 @app.on_event("startup")
 async def on_startup():
     Base.metadata.create_all(bind=engine)
+    for column in add_missing_columns(engine):
+        logger.info("Added column %s", column)
+    for column in add_missing_unique_indexes(engine):
+        logger.info("Added unique index on %s", column)
+    # answers stored before `numeric_value` existed; reports read only the typed column
+    with LocalSession() as db:
+        backfilled = backfill_numeric_values(db)
+    if backfilled:
+        logger.info("Backfilled numeric values of %d answer(s)", backfilled)
     
     asyncio.create_task(start_telegram_bot())
     asyncio.create_task(run_status_manager_loop())
+    asyncio.create_task(run_answer_buffer_loop())
+    asyncio.create_task(report_worker.run())
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await answer_buffer.flush_all()
 
 
 @app.get("/health")
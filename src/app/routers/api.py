@@ -4,44 +4,35 @@ Provides CRUD and utility operations:
 - users (create, read, update, delete, check);
 - review (creation, reading, related surveys);
 - surveys (creation/deletion, links, responses);
-- reports (LLM aggregation, upload/download, metadata).
+- reports (LLM aggregation, upload/download, metadata);
+- LLM call metrics.
 """
 # app/routers/api.py
 from fastapi import APIRouter, Depends, HTTPException, Request, status, Form, UploadFile, File
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import select
-from typing import List
-import json
+from typing import Dict, List
 
-from src.app.core.config import settings, OPENAI_CLIENT
+from src.app.core.config import settings, LLM_COMPLETER
 from src.app.services.links import sign_token
+from src.app.services.report_jobs import enqueue_report_job
+from src.app.services.report_pipeline import EXTRACTION_MODES
 from src.db.session import get_db
 from src.db.models import (
     User,
     Review,
-    Report,
+    Report, ReportJob,
     Survey, SurveyStatus, 
-    Answer, AnswerSelection, 
-    Question, QuestionOption, 
     ReviewStatus
 )
 
 from src.app.schemas.user import UserOut, UserCreate, UserUpdate
-from src.app.schemas.report import ReportWithReviewOut, ReportOut
+from src.app.schemas.report import ReportWithReviewOut, ReportOut, ReportJobOut
 from src.app.schemas.survey import CreateSurveysIn, SurveyWithUserOut
 from src.app.schemas.review import CreateReviewIn, ReviewOut
+from src.app.schemas.llm import LLMEndpointMetricsOut
 
-from src.llm_agg.prompts import (
-    SIDES_EXTRACTING_PROMPT, 
-    RECOMMENDATIONS_PROMPT, 
-    BASE_PROMPT_WO_TASK
-)
-from src.llm_agg.schemas.sides import Sides
-from src.llm_agg.response import get_so_completion
-from src.llm_agg.utils import remove_ambiguous_sides
-from src.llm_agg.schemas.recommendations import Recommendations
-from src.llm_agg.reports.jinja import create_report
 from src.app.core.logging import get_logs_writer_logger
 
 logger = get_logs_writer_logger()
@@ -636,177 +627,77 @@ def delete_survey(survey_id: str, db: Session = Depends(get_db)):
     db.commit()
     return {"ok": True, "message": "Survey deleted successfully"}
 
-@router.post("/api/review/get_report")
+def _job_out(job: ReportJob) -> ReportJobOut:
+    return ReportJobOut(
+        job_id=job.job_id,
+        review_id=job.review_id,
+        status=job.status.value,
+        attempts=job.attempts,
+        progress_stage=job.progress_stage,
+        progress_sides=job.progress_sides,
+        progress_tokens=job.progress_tokens,
+        last_error=job.last_error,
+        result_path=job.result_path,
+        created_at=job.created_at.isoformat() if job.created_at else None,
+        finished_at=job.finished_at.isoformat() if job.finished_at else None,
+    )
+
+
+@router.post("/api/review/get_report", response_model=ReportJobOut, status_code=status.HTTP_202_ACCEPTED)
 async def llm_aggregation(
     review_id: str = Form(...), db: Session = Depends(get_db)
 ):
-    """Generate/update a review report using LLM aggregation.
+    """Queue generation/update of a review report using LLM aggregation.
+
+    The report is generated by the background worker; poll
+    `GET /api/report-jobs/{job_id}` for the result.
 
     Args:
         review_id: The ID of the review (form-data).
         db: The DB session.
 
     Returns:
-        dict: {"path_to_file": str, "report_id": str}.
+        ReportJobOut: The queued job, or the in-flight job computing the same answers.
+
+    Errors:
+        404: No review found.
     """
-    survey_ids = db.scalars(
-        select(Survey.survey_id)
-        .where(Survey.review_id == review_id)
-    ).all()
+    review = db.get(Review, review_id)
+    if not review:
+        raise HTTPException(status_code=404, detail="Review not found")
+    job = enqueue_report_job(db, review_id)
+    return _job_out(job)
 
-    surveys = db.execute(
-        select(Survey.survey_id, Survey.evaluator_user_id)
-        .where(Survey.survey_id.in_(survey_ids))
-    ).all()
-    survey_id_to_evaluator = {s_id: eval_uid for s_id, eval_uid in surveys}
 
-    review = db.get(Review, review_id)
+@router.get("/api/report-jobs/{job_id}", response_model=ReportJobOut)
+async def get_report_job(job_id: str, db: Session = Depends(get_db)):
+    """Get the status of a report generation job.
 
-    subject_first_name = review.subject_user.first_name
-    subject_last_name = review.subject_user.last_name
-    subject_middle_name = review.subject_user.middle_name
-    subject_name = ' '.join([subject_last_name, subject_first_name, subject_middle_name])
-    answers = db.scalars(
-        select(Answer)
-        .where(Answer.survey_id.in_(survey_ids))
-    ).all()
+    Args:
+        job_id: The ID of the job.
+        db: The DB session.
 
-    grouped_text_answers = {}
-    self_exteem = {}
-    manage_esteem = {}
-    for answer in answers:
-        if answer.survey_id not in grouped_text_answers:
-            grouped_text_answers[answer.survey_id] = {"response_texts": [], "option_texts": []}
-
-        if answer.response_text:
-            question = db.get(Question, answer.question_id)
-            question_text = question.question_text if question else "Unknown Question"
-
-            def _is_number(value: str) -> bool:
-                try:
-                    float(value)
-                    return True
-                except (TypeError, ValueError):
-                    return False
-
-            if _is_number(answer.response_text):
-                if question_text not in manage_esteem:
-                    manage_esteem[question_text] = []
-                evaluator_user_id = survey_id_to_evaluator.get(answer.survey_id)
-                if evaluator_user_id == review.subject_user_id:
-                    self_exteem[question_text] = float(answer.response_text)
-                else:
-                    manage_esteem[question_text].append(float(answer.response_text)) 
-            else:
-                grouped_text_answers[answer.survey_id]["response_texts"].append([
-                    question_text, answer.response_text
-                ])
-        else:
-            option_texts = db.scalars(
-                select(QuestionOption.option_text, Question.question_text)
-                .join(AnswerSelection, AnswerSelection.option_id == QuestionOption.option_id)
-                .join(Question, QuestionOption.question_id == Question.question_id)
-                .where(AnswerSelection.answer_id == answer.answer_id)
-            ).all()
-
-            for option_text, question_text in option_texts:
-                if _is_number(option_text):
-                    if question_text not in manage_esteem:
-                        manage_esteem[question_text] = []
-                    evaluator_user_id = survey_id_to_evaluator.get(answer.survey_id)
-                    if evaluator_user_id == review.subject_user_id:
-                        self_exteem[question_text] = float(option_text)
-                    else:
-                        manage_esteem[question_text].append(float(option_text)) 
-                else:
-                    grouped_text_answers[answer.survey_id]["option_texts"].append([
-                        question_text, option_text
-                    ])
-    
-    for k, v in list(manage_esteem.items()):
-        if isinstance(v, list):
-            if len(v) > 0:
-                manage_esteem[k] = int(sum(v) / len(v))
-            else:
-                manage_esteem[k] = None
-    numeric_values = {
-        'self-esteem': self_exteem,
-        'manage-esteem': manage_esteem
-    }
-    feedback = ''
-
-    for i, (survey_id, v) in enumerate(grouped_text_answers.items()):
-        reviewer_label = f"Reviewer {i+1}"
-        if review and review.anonymity is False:
-            evaluator_user_id = survey_id_to_evaluator.get(survey_id)
-            evaluator_user = db.get(User, evaluator_user_id)
-            parts = [
-                evaluator_user.last_name,
-                evaluator_user.first_name,
-                evaluator_user.middle_name,
-            ]
-            reviewer_name = " ".join([p for p in parts if p])
-            if reviewer_name:
-                reviewer_label = reviewer_name
-                
-        feedback += f"Feedback from {reviewer_label}: \n"
-        feedback += "\n".join([f"{item[0]}: {item[1]}" for item in v['response_texts']])
-        feedback += "\n".join([f"{item[0]}: {item[1]}" for item in v['option_texts']])
-        feedback += "\n"
-
-    report = db.execute(select(Report).where(Report.review_id == review_id)).scalar()
-    prompt_to_use = report.prompt if report.prompt else SIDES_EXTRACTING_PROMPT
-    if "{feedback}" not in prompt_to_use:
-        prompt_to_use = prompt_to_use + "\n\nFeedback from managers:\n\n{feedback}"
-
-    log = [
-        {"role": "system", "content": BASE_PROMPT_WO_TASK},
-        {"role": "user", "content": prompt_to_use.format(feedback=feedback)}
-    ]
-
-    completion = await get_so_completion(
-        log=log, 
-        model_name=settings.MODEL_NAME, 
-        client=OPENAI_CLIENT, 
-        pydantic_model=Sides, 
-        provider_name='openrouter'
-    )
+    Returns:
+        ReportJobOut: Job status; `result_path` is set once it succeeded.
 
-    new_msg = {
-        "role":"assistant",
-        "content": remove_ambiguous_sides(completion)
-    }
-    log.append(new_msg)
-    
-    new_user_msg = {
-        "role": "user",
-        "content": RECOMMENDATIONS_PROMPT
-    }
-    log.append(new_user_msg)
-
-    rec = await get_so_completion(
-        log, 
-        model_name=settings.MODEL_NAME, 
-        client=OPENAI_CLIENT,
-        pydantic_model=Recommendations, 
-        provider_name='openrouter'
-    )
+    Errors:
+        404: The job was not found.
+    """
+    job = db.get(ReportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return _job_out(job)
 
-    path_to_file = create_report(
-        templates_dir='jinja_templates',
-        template_name='base.html.jinja',
-        sides_json=json.loads(completion),
-        recommendations_json=json.loads(rec),
-        numeric_values=numeric_values,
-        employee_name=subject_name,
-        visualization_url=None,
-        quotes_layout="inline",
-        write_intermediate_html=True
-    )
-    report.file_path = path_to_file
-    db.commit()
-    db.refresh(report)
-    return {"path_to_file": path_to_file, "report_id": report.report_id}
+
+@router.get("/api/llm/metrics", response_model=Dict[str, LLMEndpointMetricsOut])
+async def get_llm_metrics():
+    """Get the call metrics of the LLM endpoints of this process.
+
+    Returns:
+        Dict[str, LLMEndpointMetricsOut]: Attempts, hedges, failovers, p95
+            latency, routing load and circuit breaker state per endpoint.
+    """
+    return LLM_COMPLETER.metrics()
 
 
 @router.get("/api/reviews/{review_id}/report", response_model=ReportOut)
@@ -836,6 +727,7 @@ async def get_review_report(review_id: str, db: Session = Depends(get_db)):
         analytics_for_reviewers=report.analytics_for_reviewers,
         recommendations=report.recommendations,
         file_path=report.file_path,
+        extraction_mode=report.extraction_mode,
     )
 
 
@@ -907,29 +799,37 @@ async def upload_review_report(review_id: str, file: UploadFile = File(...), db:
         analytics_for_reviewers=report.analytics_for_reviewers,
         recommendations=report.recommendations,
         file_path=report.file_path,
+        extraction_mode=report.extraction_mode,
     )
 
 
 @router.patch("/api/reviews/{review_id}/report-meta", response_model=ReportOut)
 async def update_report_meta(review_id: str, request: Request, db: Session = Depends(get_db)):
-    """Update the text prompt of the report to generate.
+    """Update the text prompt and the LLM extraction mode of the report to generate.
 
     Args:
         review_id: The ID of the review.
-        request: JSON with the `prompt` (str) field.
+        request: JSON with the `prompt` (str) and/or `extraction_mode`
+            ("two_call", "combined" or null for the default) fields.
         db: The DB session.
 
     Returns:
-        ReportOut: Report data after prompt update.
+        ReportOut: Report data after the update.
 
     Errors:
-        400: The `prompt` field is missing.
+        400: Neither field is given or the extraction mode is unknown.
         404: No review found.
     """
     payload = await request.json()
     prompt = payload.get("prompt")
-    if prompt is None:
-        raise HTTPException(status_code=400, detail="prompt is required")
+    if prompt is None and "extraction_mode" not in payload:
+        raise HTTPException(status_code=400, detail="prompt or extraction_mode is required")
+    extraction_mode = payload.get("extraction_mode")
+    if extraction_mode is not None and extraction_mode not in EXTRACTION_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"extraction_mode must be one of: {', '.join(EXTRACTION_MODES)}",
+        )
     review = db.get(Review, review_id)
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
@@ -937,7 +837,10 @@ async def update_report_meta(review_id: str, request: Request, db: Session = Dep
     if not report:
         report = Report(review_id=review_id)
         db.add(report)
-    report.prompt = prompt
+    if prompt is not None:
+        report.prompt = prompt
+    if "extraction_mode" in payload:
+        report.extraction_mode = extraction_mode
     db.commit()
     db.refresh(report)
     return ReportOut(
@@ -950,4 +853,5 @@ async def update_report_meta(review_id: str, request: Request, db: Session = Dep
         analytics_for_reviewers=report.analytics_for_reviewers,
         recommendations=report.recommendations,
         file_path=report.file_path,
+        extraction_mode=report.extraction_mode,
     )
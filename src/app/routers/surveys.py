@@ -11,7 +11,6 @@ from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import delete as sa_delete, select
 
 from datetime import datetime, timezone
 import json
@@ -22,12 +21,15 @@ from src.db.session import get_db
 from src.db.models import (
     Survey, SurveyStatus,
     Review,
-    Question, QuestionType, QuestionOption,
-    Answer, AnswerSelection,
+    Question, QuestionType,
 )
-from src.app.schemas.answer import SaveAnswersIn
+from src.app.schemas.answer import PatchAnswerIn, SaveAnswersIn
 from src.app.core.security import issue_csrf, verify_csrf
 from src.app.services.links import verify_token
+from src.app.services.answers import apply_answer_diff, load_question_map, resolve_answer, resolve_answers
+from src.app.services.answer_buffer import answer_buffer
+from src.app.services.answer_matrix import load_answer_matrix
+from src.app.services.report_jobs import enqueue_digest_job
 from src.app.core.logging import get_logs_writer_logger
 
 logger = get_logs_writer_logger()
@@ -142,17 +144,11 @@ async def survey_admin_readonly_page(survey_id: str, request: Request, t: str =
         joinedload(Review.subject_user)
     ).filter(Review.review_id == survey.review_id).one()
 
-    answers = db.scalars(
-        select(Answer).where(Answer.survey_id == survey_id)
-    ).all()
-    by_q: dict[str, dict] = {}
-    for a in answers:
-        by_q[a.question_id] = {
-            "response_text": a.response_text,
-            "selected_option_ids": [sel.option_id for sel in db.scalars(
-                select(AnswerSelection).where(AnswerSelection.answer_id == a.answer_id)
-            ).all()]
-        }
+    matrix = load_answer_matrix(db, review.review_id, survey_ids=[survey_id])
+    by_q: dict[str, dict] = {
+        question_id: {"response_text": cell.response_text, "selected_option_ids": cell.option_ids}
+        for (_, question_id), cell in matrix.cells.items()
+    }
 
     questions_ctx = []
     for q in review.questions:
@@ -177,12 +173,11 @@ async def survey_admin_readonly_page(survey_id: str, request: Request, t: str =
             "answer": ans,
         })
     subject_name = f"{review.subject_user.last_name} {review.subject_user.first_name} {review.subject_user.middle_name or ''}".strip()
-    if review.anonymity:
+    evaluator = matrix.evaluators.get(survey_id)
+    if review.anonymity or not evaluator:
         evaluator_name = "Аноним"
     else:
-        evaluator_name = " ".join(
-            [p for p in [survey.evaluator.last_name, survey.evaluator.first_name, survey.evaluator.middle_name] if p]
-        )
+        evaluator_name = evaluator.full_name
     random_bg_img = randint(1, 5)
     return templates.TemplateResponse(
         "survey_readonly.html",
@@ -210,6 +205,8 @@ async def save_answers(
     """Save the survey responses.
 
     Supports saving draft (`draft=true`) and final submission (`final=true`).
+    Only the answers that differ from the stored ones are written. The answers
+    of a completed survey only change with another final submission.
 
     Args:
         survey_id: The survey ID.
@@ -221,12 +218,14 @@ async def save_answers(
         final: Final submission (False by default).
 
     Returns:
-        dict: {"ok": True, "final": bool}.
+        dict: {"ok": True, "final": bool, "changes": dict} - `changes` holds the
+            per-save counters of inserted/updated/deleted answers and touched rows.
 
     Errors:
         401: Invalid token.
         403: Invalid CSRF.
         404: The survey/review was not found.
+        409: A draft save of a completed survey.
     """
     token = verify_token(t)
     if not token or token.get("sub") != survey_id:
@@ -237,42 +236,20 @@ async def save_answers(
     survey = db.get(Survey, survey_id)
     if not survey:
         raise HTTPException(status_code=404, detail="Survey not found")
+    if survey.status == SurveyStatus.completed and not final:
+        raise HTTPException(status_code=409, detail="Survey already submitted")
     review = db.get(Review, survey.review_id)
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
-    db.execute(
-        sa_delete(AnswerSelection).where(
-            AnswerSelection.answer_id.in_(
-                select(Answer.answer_id).where(Answer.survey_id == survey_id)
-            )
-        )
+    question_map = load_question_map(db, review.review_id)
+    desired = resolve_answers(question_map, payload.answers)
+
+    answer_buffer.discard(survey_id)
+    changes = apply_answer_diff(db, survey_id, desired)
+    logger.info(
+        "Survey %s answers saved: %d inserted, %d updated, %d deleted, %d unchanged (%d rows)",
+        survey_id, changes["inserted"], changes["updated"], changes["deleted"], changes["unchanged"], changes["rows"],
     )
-    db.execute(sa_delete(Answer).where(Answer.survey_id == survey_id))
-    db.flush()
-
-    for answer_data in payload.answers:
-        question = db.get(Question, answer_data.question_id)
-        if not question or question.review_id != review.review_id:
-            continue
-
-        new_answer = Answer(survey_id=survey_id, question_id=question.question_id)
-
-        if question.question_type in (QuestionType.text, QuestionType.textarea, QuestionType.range_slider):
-            if getattr(answer_data, "response_text", None) is not None:
-                new_answer.response_text = str(answer_data.response_text)
-
-        elif question.question_type in (QuestionType.radio, QuestionType.checkbox):
-            sel_ids = getattr(answer_data, "selected_option_ids", None) or []
-            if sel_ids:
-                options = db.scalars(
-                    select(QuestionOption).where(
-                        QuestionOption.option_id.in_(sel_ids),
-                        QuestionOption.question_id == question.question_id
-                    )
-                ).all()
-                new_answer.selected_options.extend(options)
-
-        db.add(new_answer)
 
     if final:
         survey.status = SurveyStatus.completed
@@ -283,7 +260,73 @@ async def save_answers(
             survey.status = SurveyStatus.in_progress
 
     db.commit()
-    return {"ok": True, "final": final}
+    if final and settings.SURVEY_DIGESTS_ENABLED:
+        enqueue_digest_job(db, survey_id)
+    return {"ok": True, "final": final, "changes": changes}
+
+
+@router.patch("/api/surveys/{survey_id}/answers")
+async def patch_answer(
+    survey_id: str,
+    payload: PatchAnswerIn,
+    request: Request,
+    db: Session = Depends(get_db),
+    t: str = Query(...),
+    final: bool = Query(False),
+):
+    """Save a single changed answer of the survey.
+
+    Draft edits are put into the write-behind buffer and reach the DB with the
+    next periodic flush. A final submission (`final=true`) flushes the buffered
+    edits of the survey synchronously and completes the survey. Draft edits of
+    a completed survey (e.g. a debounced PATCH arriving after the submit) are
+    rejected.
+
+    Args:
+        survey_id: The survey ID.
+        payload: The request body with the `csrf_token` and one answer.
+        request: The request object contains headers and cookies.
+        db: The DB session.
+        t: A signed access token for the survey.
+        final: Final submission (False by default).
+
+    Returns:
+        dict: {"ok": True, "final": bool, "buffered": bool, "changes": dict | None}.
+
+    Errors:
+        401: Invalid token.
+        403: Invalid CSRF.
+        404: The survey or question was not found.
+        409: A draft edit of a completed survey.
+    """
+    token = verify_token(t)
+    if not token or token.get("sub") != survey_id:
+        raise HTTPException(status_code=401)
+    if not verify_csrf(request, payload.csrf_token, scope=f"survey:{survey_id}"):
+        raise HTTPException(status_code=403, detail="Bad CSRF")
+
+    survey = db.get(Survey, survey_id)
+    if not survey:
+        raise HTTPException(status_code=404, detail="Survey not found")
+    if survey.status == SurveyStatus.completed and not final:
+        raise HTTPException(status_code=409, detail="Survey already submitted")
+    question_id = payload.answer.question_id
+    spec = load_question_map(db, survey.review_id, question_ids=[question_id]).get(question_id)
+    if spec is None:
+        raise HTTPException(status_code=404, detail="Question not found")
+
+    await answer_buffer.put(survey_id, question_id, resolve_answer(spec[0], spec[1], payload.answer))
+    if not final:
+        return {"ok": True, "final": False, "buffered": True, "changes": None}
+
+    changes = await answer_buffer.flush_survey(survey_id, db)
+    survey.status = SurveyStatus.completed
+    survey.submitted_at = utcnow()
+    survey.notification_call = None
+    db.commit()
+    if settings.SURVEY_DIGESTS_ENABLED:
+        enqueue_digest_job(db, survey_id)
+    return {"ok": True, "final": True, "buffered": False, "changes": changes}
 
 
 @router.get("/thanks", response_class=HTMLResponse)
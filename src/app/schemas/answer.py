@@ -11,4 +11,8 @@ class AnswerIn(BaseModel):
 
 class SaveAnswersIn(BaseModel):
     csrf_token: str
-    answers: List[AnswerIn]
\ No newline at end of file
+    answers: List[AnswerIn]
+
+class PatchAnswerIn(BaseModel):
+    csrf_token: str
+    answer: AnswerIn
\ No newline at end of file
@@ -0,0 +1,23 @@
+"""Pydantic-schemas for LLM call metrics.
+"""
+# app/schemas/llm.py
+from pydantic import BaseModel
+
+
+class LLMEndpointMetricsOut(BaseModel):
+    """Счётчики вызовов одного LLM-эндпоинта (маршрута) с момента запуска процесса"""
+    provider_name: str
+    model_name: str
+    breaker: str
+    consecutive_failures: int
+    attempts: int
+    successes: int
+    failures: int
+    timeouts: int
+    hedges: int
+    hedges_won: int
+    failovers: int
+    p95_latency_s: float | None = None
+    routed: int = 0  # запросов, для которых эндпоинт был выбран первым
+    in_flight: int = 0
+    latency_ewma_s: float | None = None
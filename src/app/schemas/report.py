@@ -13,6 +13,7 @@ class ReportOut(BaseModel):
     analytics_for_reviewers: str | None = None
     recommendations: str | None = None
     file_path: str | None = None
+    extraction_mode: str | None = None
 
 
 class ReportWithReviewOut(ReportOut):
@@ -22,3 +23,18 @@ class ReportWithReviewOut(ReportOut):
     review_status: str
     review_created_at: str
     subject_user_name: str
+
+
+class ReportJobOut(BaseModel):
+    """Состояние фоновой генерации отчёта"""
+    job_id: str
+    review_id: str
+    status: str
+    attempts: int
+    progress_stage: str | None = None
+    progress_sides: int | None = None
+    progress_tokens: int | None = None
+    last_error: str | None = None
+    result_path: str | None = None
+    created_at: str | None = None
+    finished_at: str | None = None
@@ -0,0 +1,125 @@
+"""In-process write-behind buffer for draft survey answers.
+
+Single-answer PATCH requests from the survey form land here instead of the DB.
+Edits are coalesced per survey and question (the latest value wins) and are
+flushed in one small transaction per survey on a short interval. A final
+submission flushes its survey synchronously; edits that are still buffered
+once a survey is completed are dropped, never written into the submitted
+answers.
+
+The buffer lives in the memory of one worker process: a crash loses at most
+`ANSWER_FLUSH_INTERVAL` seconds of draft edits, which the form re-sends on the
+next change or on submit.
+"""
+# app/services/answer_buffer.py
+import asyncio
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from src.app.core.config import settings
+from src.app.core.logging import get_logs_writer_logger
+from src.app.services.answers import AnswerState, apply_answer_diff
+from src.db.models import Survey, SurveyStatus
+from src.db.session import LocalSession
+
+logger = get_logs_writer_logger()
+
+
+class AnswerWriteBuffer:
+    """Coalesces draft answer edits per survey and writes them in batches."""
+
+    def __init__(self):
+        self._pending: dict[str, dict[str, AnswerState]] = {}
+        self._lock = asyncio.Lock()
+
+    async def put(self, survey_id: str, question_id: str, state: AnswerState) -> None:
+        """Buffer the latest state of one answer.
+
+        Args:
+            survey_id: The survey ID.
+            question_id: The question ID (already validated against the review).
+            state: (response_text, option_ids, numeric_value) to store.
+        """
+        async with self._lock:
+            self._pending.setdefault(survey_id, {})[question_id] = state
+
+    def discard(self, survey_id: str) -> None:
+        """Drop buffered edits of the survey (a full-form save supersedes them)."""
+        self._pending.pop(survey_id, None)
+
+    def pending_count(self) -> int:
+        """The number of buffered answers across all surveys."""
+        return sum(len(edits) for edits in self._pending.values())
+
+    async def flush_survey(self, survey_id: str, db: Optional[Session] = None) -> Optional[dict]:
+        """Write buffered edits of one survey.
+
+        Args:
+            survey_id: The survey ID.
+            db: An open session to write into; the caller commits it. If None,
+                a dedicated session is opened and committed.
+
+        Returns:
+            dict | None: Counters from `apply_answer_diff`, or None if nothing was
+                buffered (or the edits were dropped because the survey is completed).
+        """
+        async with self._lock:
+            edits = self._pending.pop(survey_id, None)
+        if not edits:
+            return None
+
+        try:
+            if db is not None:
+                return apply_answer_diff(db, survey_id, edits, prune=False)
+            with LocalSession() as own_db:
+                survey = own_db.get(Survey, survey_id)
+                if survey is None or survey.status == SurveyStatus.completed:
+                    logger.warning("Dropped %d buffered answer(s) of submitted or missing survey %s",
+                                   len(edits), survey_id)
+                    return None
+                changes = apply_answer_diff(own_db, survey_id, edits, prune=False)
+                if survey.status == SurveyStatus.not_started:
+                    survey.status = SurveyStatus.in_progress
+                own_db.commit()
+                return changes
+        except Exception:
+            # put the edits back unless newer ones arrived meanwhile
+            async with self._lock:
+                current = self._pending.setdefault(survey_id, {})
+                for question_id, state in edits.items():
+                    current.setdefault(question_id, state)
+            raise
+
+    async def flush_all(self) -> int:
+        """Flush every survey with buffered edits.
+
+        Returns:
+            int: The number of answer rows touched.
+        """
+        rows = 0
+        for survey_id in list(self._pending):
+            try:
+                changes = await self.flush_survey(survey_id)
+            except Exception as e:
+                logger.error("Failed to flush buffered answers of survey %s: %s", survey_id, e)
+                continue
+            if changes:
+                rows += changes["rows"]
+        return rows
+
+
+answer_buffer = AnswerWriteBuffer()
+
+
+async def run_answer_buffer_loop():
+    """Background task: flush the answer buffer every `ANSWER_FLUSH_INTERVAL` seconds."""
+    logger.info("Answer buffer loop started")
+    while True:
+        await asyncio.sleep(settings.ANSWER_FLUSH_INTERVAL)
+        try:
+            rows = await answer_buffer.flush_all()
+            if rows:
+                logger.info("Answer buffer flushed %d row(s)", rows)
+        except Exception as e:
+            logger.exception("Answer buffer flush failed: %s", e)
@@ -0,0 +1,192 @@
+"""Dense survey x question answer matrix for a review.
+
+Loads everything the report pipeline and the read-only survey page need -
+evaluator identity, question texts, typed values and selected option texts -
+in two queries instead of a query per answer and per reviewer.
+"""
+# app/services/answer_matrix.py
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.db.models import (
+    Answer, AnswerSelection,
+    Question, QuestionOption, QuestionType,
+    Review,
+    Survey, SurveyStatus,
+    User,
+)
+
+
+def to_number(value: str | None) -> float | None:
+    """Parse a numeric answer (range slider value or numeric option text).
+
+    Args:
+        value: The raw string.
+
+    Returns:
+        float | None: The number, or None if the value is not numeric.
+    """
+    if value is None:
+        return None
+    try:
+        return float(str(value).strip().replace(",", "."))
+    except ValueError:
+        return None
+
+
+@dataclass
+class EvaluatorInfo:
+    survey_id: str
+    user_id: str | None
+    full_name: str
+    is_self: bool
+    status: SurveyStatus
+    submitted_at: datetime | None
+
+
+@dataclass
+class QuestionInfo:
+    question_id: str
+    question_text: str
+    question_type: QuestionType
+    position: int
+
+
+@dataclass
+class AnswerCell:
+    """One answer; `numeric_value` is the typed value stored at write time (see `answers.numeric_value_of`)."""
+    survey_id: str
+    question_id: str
+    response_text: str | None = None
+    numeric_value: float | None = None
+    option_ids: list[str] = field(default_factory=list)
+    option_texts: list[str] = field(default_factory=list)
+
+    @property
+    def numbers(self) -> list[float]:
+        """Numeric values of the answer: the typed response value or numeric option texts."""
+        if self.response_text is not None:
+            return [] if self.numeric_value is None else [self.numeric_value]
+        if self.numeric_value is None:
+            # no selected option is numeric
+            return []
+        if len(self.option_texts) == 1:
+            return [self.numeric_value]
+        return [n for n in map(to_number, self.option_texts) if n is not None]
+
+    @property
+    def texts(self) -> list[str]:
+        """Non-numeric textual content: free text or non-numeric option texts."""
+        if self.response_text is not None:
+            return [self.response_text] if self.response_text and self.numeric_value is None else []
+        if self.numeric_value is None:
+            return list(self.option_texts)
+        if len(self.option_texts) == 1:
+            return []
+        return [t for t in self.option_texts if to_number(t) is None]
+
+
+@dataclass
+class AnswerMatrix:
+    review_id: str
+    subject_user_id: str | None
+    anonymity: bool
+    evaluators: dict[str, EvaluatorInfo] = field(default_factory=dict)
+    questions: dict[str, QuestionInfo] = field(default_factory=dict)
+    cells: dict[tuple[str, str], AnswerCell] = field(default_factory=dict)
+
+    def row(self, survey_id: str) -> list[tuple[QuestionInfo, AnswerCell]]:
+        """Answers of one survey in question order."""
+        ordered = sorted(self.questions.values(), key=lambda q: q.position)
+        return [(q, self.cells[(survey_id, q.question_id)]) for q in ordered if (survey_id, q.question_id) in self.cells]
+
+
+def _full_name(last_name: str | None, first_name: str | None, middle_name: str | None) -> str:
+    return " ".join(p for p in (last_name, first_name, middle_name) if p)
+
+
+def load_answer_matrix(db: Session, review_id: str, survey_ids: Optional[Iterable[str]] = None) -> Optional[AnswerMatrix]:
+    """Load the answers of a review as a survey x question matrix.
+
+    Args:
+        db: The DB session.
+        review_id: The ID of the review.
+        survey_ids: Optionally restrict the matrix to these surveys.
+
+    Returns:
+        AnswerMatrix | None: The matrix, or None if the review does not exist.
+    """
+    survey_filter = list(survey_ids) if survey_ids is not None else None
+
+    q = (
+        select(
+            Review.subject_user_id, Review.anonymity,
+            Survey.survey_id, Survey.evaluator_user_id, Survey.status, Survey.submitted_at,
+            User.last_name, User.first_name, User.middle_name,
+        )
+        .outerjoin(Survey, Survey.review_id == Review.review_id)
+        .outerjoin(User, User.user_id == Survey.evaluator_user_id)
+        .where(Review.review_id == review_id)
+        .order_by(Survey.submitted_at, Survey.survey_id)
+    )
+    if survey_filter is not None:
+        q = q.where(Survey.survey_id.in_(survey_filter))
+    rows = db.execute(q).all()
+    if not rows:
+        review = db.get(Review, review_id)
+        if review is None:
+            return None
+        return AnswerMatrix(review_id=review_id, subject_user_id=review.subject_user_id, anonymity=review.anonymity)
+
+    matrix = AnswerMatrix(review_id=review_id, subject_user_id=rows[0].subject_user_id, anonymity=rows[0].anonymity)
+    for r in rows:
+        if r.survey_id is None:
+            continue
+        matrix.evaluators[r.survey_id] = EvaluatorInfo(
+            survey_id=r.survey_id,
+            user_id=r.evaluator_user_id,
+            full_name=_full_name(r.last_name, r.first_name, r.middle_name),
+            is_self=r.evaluator_user_id is not None and r.evaluator_user_id == r.subject_user_id,
+            status=r.status,
+            submitted_at=r.submitted_at,
+        )
+    if not matrix.evaluators:
+        return matrix
+
+    q = (
+        select(
+            Answer.survey_id, Answer.question_id, Answer.response_text, Answer.numeric_value,
+            Question.question_text, Question.question_type, Question.position,
+            QuestionOption.option_id, QuestionOption.option_text,
+        )
+        .join(Question, Question.question_id == Answer.question_id)
+        .outerjoin(AnswerSelection, AnswerSelection.answer_id == Answer.answer_id)
+        .outerjoin(QuestionOption, QuestionOption.option_id == AnswerSelection.option_id)
+        .where(Answer.survey_id.in_(list(matrix.evaluators)))
+        .order_by(Question.position, QuestionOption.position)
+    )
+    for r in db.execute(q).all():
+        if r.question_id not in matrix.questions:
+            matrix.questions[r.question_id] = QuestionInfo(
+                question_id=r.question_id,
+                question_text=r.question_text,
+                question_type=r.question_type,
+                position=r.position,
+            )
+        cell = matrix.cells.get((r.survey_id, r.question_id))
+        if cell is None:
+            cell = AnswerCell(
+                survey_id=r.survey_id,
+                question_id=r.question_id,
+                response_text=r.response_text,
+                numeric_value=r.numeric_value,
+            )
+            matrix.cells[(r.survey_id, r.question_id)] = cell
+        if r.option_id is not None:
+            cell.option_ids.append(r.option_id)
+            cell.option_texts.append(r.option_text)
+    return matrix
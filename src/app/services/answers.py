@@ -0,0 +1,311 @@
+"""Differential saving of survey responses.
+
+Instead of deleting and re-inserting every answer of a survey on each autosave,
+the stored answers are compared with the incoming ones and only the questions
+that actually changed are written, using bulk INSERT/UPDATE/DELETE statements.
+Incoming answers are validated against a question map loaded in one query, so
+a save costs a constant number of round-trips regardless of the form size.
+The typed `Answer.numeric_value` is computed here, at write time.
+"""
+# app/services/answers.py
+import uuid
+from typing import Iterable, Mapping, Optional
+
+from sqlalchemy import and_, delete, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from src.app.schemas.answer import AnswerIn
+from src.app.services.answer_matrix import to_number
+from src.db.models import Answer, AnswerSelection, Question, QuestionOption, QuestionType
+
+# (response_text, selected option ids, numeric value) - the comparable state of one answer
+AnswerState = tuple[str | None, frozenset[str], float | None]
+# question_id -> (question type, {option_id: numeric value of the option text or None})
+QuestionMap = dict[str, tuple[QuestionType, dict[str, float | None]]]
+
+TEXT_TYPES = (QuestionType.text, QuestionType.textarea, QuestionType.range_slider)
+CHOICE_TYPES = (QuestionType.radio, QuestionType.checkbox)
+
+
+def load_question_map(db: Session, review_id: str, question_ids: Optional[Iterable[str]] = None) -> QuestionMap:
+    """Load the review's questions with their valid options in one query.
+
+    Args:
+        db: The DB session.
+        review_id: The ID of the review.
+        question_ids: Optionally restrict the map to these questions.
+
+    Returns:
+        QuestionMap: {question_id: (question_type, {option_id: numeric value})}.
+    """
+    q = (
+        select(Question.question_id, Question.question_type, QuestionOption.option_id, QuestionOption.option_text)
+        .outerjoin(QuestionOption, QuestionOption.question_id == Question.question_id)
+        .where(Question.review_id == review_id)
+    )
+    if question_ids is not None:
+        q = q.where(Question.question_id.in_(list(question_ids)))
+
+    question_map: QuestionMap = {}
+    for question_id, question_type, option_id, option_text in db.execute(q).all():
+        entry = question_map.setdefault(question_id, (question_type, {}))
+        if option_id is not None:
+            entry[1][option_id] = to_number(option_text)
+    return question_map
+
+
+def numeric_value_of(
+    question_type: QuestionType,
+    response_text: str | None,
+    option_ids: Iterable[str],
+    option_numbers: Mapping[str, float | None],
+) -> float | None:
+    """Compute the typed numeric value of an answer.
+
+    Free text and range sliders use the parsed response; choice questions use
+    the numeric value of the selected option (the mean if several numeric
+    options of a checkbox are selected).
+
+    Args:
+        question_type: The type of the answered question.
+        response_text: The stored response text.
+        option_ids: Selected option ids.
+        option_numbers: {option_id: numeric value} of the question's options.
+
+    Returns:
+        float | None: The numeric value, or None for non-numeric answers.
+    """
+    if question_type in CHOICE_TYPES:
+        numbers = [option_numbers[o] for o in option_ids if option_numbers.get(o) is not None]
+        return sum(numbers) / len(numbers) if numbers else None
+    return to_number(response_text)
+
+
+def resolve_answer(question_type: QuestionType, option_numbers: Mapping[str, float | None], answer_data: AnswerIn) -> AnswerState:
+    """Convert an incoming answer into the stored state for its question type.
+
+    Args:
+        question_type: The type of the answered question.
+        option_numbers: {option_id: numeric value} of the question's options.
+        answer_data: The incoming answer.
+
+    Returns:
+        AnswerState: (response_text, option_ids, numeric_value); foreign option
+            ids are dropped.
+    """
+    response_text = None
+    option_ids: frozenset[str] = frozenset()
+    if question_type in TEXT_TYPES:
+        if answer_data.response_text is not None:
+            response_text = str(answer_data.response_text)
+    elif question_type in CHOICE_TYPES:
+        option_ids = frozenset(option_numbers).intersection(answer_data.selected_option_ids or ())
+    return response_text, option_ids, numeric_value_of(question_type, response_text, option_ids, option_numbers)
+
+
+def resolve_answers(question_map: QuestionMap, answers: Iterable[AnswerIn]) -> dict[str, AnswerState]:
+    """Validate incoming answers against the question map.
+
+    Answers to questions outside the map are skipped; for repeated questions
+    the last answer wins.
+
+    Args:
+        question_map: The map from `load_question_map`.
+        answers: Incoming answers.
+
+    Returns:
+        dict: {question_id: AnswerState}.
+    """
+    desired: dict[str, AnswerState] = {}
+    for answer_data in answers:
+        spec = question_map.get(answer_data.question_id)
+        if spec is None:
+            continue
+        desired[answer_data.question_id] = resolve_answer(spec[0], spec[1], answer_data)
+    return desired
+
+
+def load_answer_state(db: Session, survey_id: str) -> dict[str, tuple[str, AnswerState]]:
+    """Load the stored answers of the survey in a single query.
+
+    Args:
+        db: The DB session.
+        survey_id: The survey ID.
+
+    Returns:
+        dict: {question_id: (answer_id, (response_text, option_ids, numeric_value))}.
+            If a question has several stored answers (legacy data), the extra
+            answer ids are returned under the `None` key for cleanup.
+    """
+    rows = db.execute(
+        select(Answer.answer_id, Answer.question_id, Answer.response_text, Answer.numeric_value, AnswerSelection.option_id)
+        .outerjoin(AnswerSelection, AnswerSelection.answer_id == Answer.answer_id)
+        .where(Answer.survey_id == survey_id)
+    ).all()
+
+    by_answer: dict[str, tuple[str, str | None, float | None, set[str]]] = {}
+    for answer_id, question_id, response_text, numeric_value, option_id in rows:
+        entry = by_answer.setdefault(answer_id, (question_id, response_text, numeric_value, set()))
+        if option_id is not None:
+            entry[3].add(option_id)
+
+    state: dict = {}
+    duplicates: list[str] = []
+    for answer_id, (question_id, response_text, numeric_value, option_ids) in by_answer.items():
+        if question_id in state:
+            duplicates.append(answer_id)
+            continue
+        state[question_id] = (answer_id, (response_text, frozenset(option_ids), numeric_value))
+    if duplicates:
+        state[None] = duplicates
+    return state
+
+
+def apply_answer_diff(
+    db: Session,
+    survey_id: str,
+    desired: dict[str, AnswerState],
+    prune: bool = True,
+) -> dict[str, int]:
+    """Bring the stored answers of the survey to the `desired` state.
+
+    Only questions whose text, numeric value or selected options differ are
+    written. The caller is responsible for validating `desired` and for committing.
+
+    Args:
+        db: The DB session.
+        survey_id: The survey ID.
+        desired: {question_id: AnswerState} for the answers to keep.
+        prune: Delete stored answers for questions missing from `desired`
+            (full-form save). Pass False to apply a partial update.
+
+    Returns:
+        dict: Counters `inserted`, `updated`, `deleted`, `unchanged` (answers)
+            and `rows` - the total number of answer and selection rows touched.
+    """
+    stored = load_answer_state(db, survey_id)
+    duplicate_ids: list[str] = stored.pop(None, [])
+
+    new_answers: list[dict] = []
+    changed_values: list[dict] = []
+    new_selections: list[dict] = []
+    removed_selections: list[tuple[str, list[str]]] = []
+    updated = unchanged = 0
+
+    for question_id, (response_text, option_ids, numeric_value) in desired.items():
+        current = stored.get(question_id)
+        if current is None:
+            answer_id = str(uuid.uuid4())
+            new_answers.append({
+                "answer_id": answer_id,
+                "survey_id": survey_id,
+                "question_id": question_id,
+                "response_text": response_text,
+                "numeric_value": numeric_value,
+            })
+            new_selections.extend({"answer_id": answer_id, "option_id": o} for o in option_ids)
+            continue
+
+        answer_id, (old_text, old_options, old_number) = current
+        if old_text == response_text and old_options == option_ids and old_number == numeric_value:
+            unchanged += 1
+            continue
+        updated += 1
+        if old_text != response_text or old_number != numeric_value:
+            changed_values.append({"answer_id": answer_id, "response_text": response_text, "numeric_value": numeric_value})
+        if old_options != option_ids:
+            new_selections.extend({"answer_id": answer_id, "option_id": o} for o in option_ids - old_options)
+            dropped = old_options - option_ids
+            if dropped:
+                removed_selections.append((answer_id, sorted(dropped)))
+
+    stale_ids = list(duplicate_ids)
+    if prune:
+        stale_ids.extend(answer_id for q_id, (answer_id, _) in stored.items() if q_id not in desired)
+
+    rows = 0
+    if stale_ids:
+        rows += db.execute(
+            delete(AnswerSelection)
+            .where(AnswerSelection.answer_id.in_(stale_ids))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        rows += db.execute(
+            delete(Answer)
+            .where(Answer.answer_id.in_(stale_ids))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    if removed_selections:
+        rows += db.execute(
+            delete(AnswerSelection)
+            .where(or_(*[
+                and_(AnswerSelection.answer_id == answer_id, AnswerSelection.option_id.in_(option_ids))
+                for answer_id, option_ids in removed_selections
+            ]))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    if new_answers:
+        db.execute(insert(Answer).execution_options(render_nulls=True), new_answers)
+        rows += len(new_answers)
+    if changed_values:
+        db.execute(update(Answer), changed_values)
+        rows += len(changed_values)
+    if new_selections:
+        db.execute(insert(AnswerSelection), new_selections)
+        rows += len(new_selections)
+
+    return {
+        "inserted": len(new_answers),
+        "updated": updated,
+        "deleted": len(stale_ids),
+        "unchanged": unchanged,
+        "rows": rows,
+    }
+
+
+def backfill_numeric_values(db: Session, batch_size: int = 1000) -> int:
+    """Fill `Answer.numeric_value` of answers stored before the column existed.
+
+    Idempotent: only answers with an empty numeric value are recomputed, in
+    batches, each committed.
+
+    Args:
+        db: The DB session; committed.
+        batch_size: Answers per batch.
+
+    Returns:
+        int: The number of answers that got a numeric value.
+    """
+    updated = 0
+    last_id = ""
+    while True:
+        rows = db.execute(
+            select(Answer.answer_id, Answer.response_text, Question.question_type)
+            .join(Question, Question.question_id == Answer.question_id)
+            .where(Answer.numeric_value.is_(None), Answer.answer_id > last_id)
+            .order_by(Answer.answer_id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].answer_id
+
+        selections: dict[str, dict[str, float | None]] = {}
+        for answer_id, option_id, option_text in db.execute(
+            select(AnswerSelection.answer_id, QuestionOption.option_id, QuestionOption.option_text)
+            .join(QuestionOption, QuestionOption.option_id == AnswerSelection.option_id)
+            .where(AnswerSelection.answer_id.in_([r.answer_id for r in rows]))
+        ).all():
+            selections.setdefault(answer_id, {})[option_id] = to_number(option_text)
+
+        values = []
+        for r in rows:
+            option_numbers = selections.get(r.answer_id, {})
+            value = numeric_value_of(r.question_type, r.response_text, option_numbers, option_numbers)
+            if value is not None:
+                values.append({"answer_id": r.answer_id, "numeric_value": value})
+        if values:
+            db.execute(update(Answer), values)
+            db.commit()
+            updated += len(values)
+    return updated
@@ -0,0 +1,476 @@
+"""Persistent queue and async worker pool for report generation.
+
+`POST /api/review/get_report` and the status manager only enqueue a
+`ReportJob`; the worker started with the application claims due jobs, runs
+the report pipeline with bounded concurrency and retries failures with
+exponential backoff. Job state lives in the DB, so queued work survives a
+process restart: a job whose worker died keeps its `running` status only
+until its lease expires and is then picked up again.
+
+Identical requests share one job, and at most one job per review runs at a
+time in any process (a `single_flight` lock), so two pipelines never race to
+write the same PDF and `Report` row.
+
+The same queue runs `survey_digest` jobs, queued on a final survey
+submission to condense that survey's feedback ahead of the report.
+"""
+# app/services/report_jobs.py
+import asyncio
+import hashlib
+import os
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.app.core.config import settings
+from src.app.core.logging import get_logs_writer_logger
+from src.app.services.report_pipeline import ReportProgress, ReviewNotFoundError, generate_report
+from src.app.services.single_flight import acquire_lock, release_lock
+from src.app.services.survey_digest import SurveyNotFoundError, generate_survey_digest
+from src.db.models import (
+    Answer,
+    AnswerSelection,
+    Report,
+    ReportJob,
+    ReportJobKind,
+    ReportJobStatus,
+    Survey,
+    SurveyDigest,
+)
+from src.db.session import LocalSession
+
+logger = get_logs_writer_logger()
+
+ACTIVE_STATUSES = (ReportJobStatus.queued, ReportJobStatus.running)
+
+# seconds between progress writes of one job within the same stage
+PROGRESS_WRITE_INTERVAL = 1.0
+
+
+def report_input_version(db: Session, review_id: str) -> str:
+    """Hash everything a report is computed from: answers (with their typed values), prompt, extraction mode and model.
+
+    With `SURVEY_DIGESTS_ENABLED`, the survey digests are part of the input
+    too (a report made from raw answers is not current once digests exist).
+
+    Args:
+        db: The DB session.
+        review_id: The ID of the review.
+
+    Returns:
+        str: Hex SHA-256 digest; equal digests produce the same LLM requests.
+    """
+    rows = db.execute(
+        select(Answer.survey_id, Answer.question_id, Answer.response_text, Answer.numeric_value, AnswerSelection.option_id)
+        .join(Survey, Survey.survey_id == Answer.survey_id)
+        .outerjoin(AnswerSelection, AnswerSelection.answer_id == Answer.answer_id)
+        .where(Survey.review_id == review_id)
+    ).all()
+    prompt, extraction_mode = db.execute(
+        select(Report.prompt, Report.extraction_mode).where(Report.review_id == review_id)
+    ).first() or (None, None)
+
+    digest = hashlib.sha256()
+    digest.update(f"{settings.MODEL_NAME}\0{prompt or ''}\0".encode("utf-8"))
+    digest.update(f"{extraction_mode or settings.LLM_EXTRACTION_MODE}\0".encode("utf-8"))
+    for survey_id, question_id, response_text, numeric_value, option_id in sorted(
+        rows, key=lambda r: tuple("" if v is None else str(v) for v in r)
+    ):
+        digest.update(
+            f"{survey_id}\0{question_id}\0{response_text or ''}\0{'' if numeric_value is None else numeric_value}"
+            f"\0{option_id or ''}\n".encode("utf-8")
+        )
+    if settings.SURVEY_DIGESTS_ENABLED:
+        digests = db.execute(
+            select(SurveyDigest.survey_id, SurveyDigest.source_hash, SurveyDigest.created_at, SurveyDigest.updated_at)
+            .where(SurveyDigest.review_id == review_id)
+            .order_by(SurveyDigest.survey_id)
+        ).all()
+        for survey_id, digest_source, created_at, updated_at in digests:
+            digest.update(f"digest\0{survey_id}\0{digest_source}\0{updated_at or created_at}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def find_finished_report_job(db: Session, review_id: str, version: str) -> Optional[ReportJob]:
+    """The latest succeeded report job of this input version whose PDF still exists.
+
+    Args:
+        db: The DB session.
+        review_id: The ID of the review.
+        version: `report_input_version` of the review.
+
+    Returns:
+        ReportJob | None: The job, or None if this version has to be generated.
+    """
+    jobs = db.execute(
+        select(ReportJob)
+        .where(
+            ReportJob.review_id == review_id,
+            ReportJob.answers_version == version,
+            ReportJob.status == ReportJobStatus.succeeded,
+            ReportJob.result_path.isnot(None),
+        )
+        .order_by(ReportJob.finished_at.desc())
+    ).scalars().all()
+    return next((job for job in jobs if os.path.exists(job.result_path)), None)
+
+
+def enqueue_report_job(
+    db: Session,
+    review_id: str,
+    notify_chat_id: Optional[int] = None,
+    reuse_finished: bool = False,
+) -> ReportJob:
+    """Queue report generation for the review (single-flight).
+
+    A request for a review whose answers, prompt and model match a queued or
+    running job attaches to that job instead of starting another pipeline.
+    The unique `active_key` makes this hold across worker processes: a
+    concurrent insert of the same key fails and the request attaches to the
+    winner.
+
+    Args:
+        db: The DB session; committed.
+        review_id: The ID of the review.
+        notify_chat_id: Telegram chat to send the finished report to.
+        reuse_finished: Return an already succeeded job of the same input
+            version (e.g. a precomputed report) instead of generating again;
+            with `notify_chat_id` it is queued for delivery again.
+
+    Returns:
+        ReportJob: The new, the attached in-flight or the reused finished job.
+    """
+    version = report_input_version(db, review_id)
+    if reuse_finished:
+        job = find_finished_report_job(db, review_id, version)
+        if job is not None:
+            if notify_chat_id:
+                job.notify_chat_id = notify_chat_id
+                job.delivered_at = None
+                db.commit()
+            logger.info("Report request for review %s served by finished job %s", review_id, job.job_id)
+            return job
+    active_key = f"{review_id}:{version}"
+
+    for _ in range(2):
+        job = db.execute(select(ReportJob).where(ReportJob.active_key == active_key)).scalar_one_or_none()
+        if job is not None:
+            if notify_chat_id and not job.notify_chat_id:
+                job.notify_chat_id = notify_chat_id
+                db.commit()
+            logger.info("Report request for review %s attached to job %s", review_id, job.job_id)
+            return job
+
+        job = ReportJob(
+            review_id=review_id,
+            notify_chat_id=notify_chat_id,
+            answers_version=version,
+            active_key=active_key,
+        )
+        db.add(job)
+        try:
+            db.commit()
+        except IntegrityError:
+            # another process queued the same version meanwhile
+            db.rollback()
+            continue
+        db.refresh(job)
+        report_worker.wake()
+        return job
+    raise RuntimeError(f"Could not queue a report job for review {review_id}")
+
+
+def enqueue_digest_job(db: Session, survey_id: str) -> Optional[ReportJob]:
+    """Queue the digest of a submitted survey (one queued/running job per survey).
+
+    Args:
+        db: The DB session; committed.
+        survey_id: The ID of the survey.
+
+    Returns:
+        ReportJob | None: The new or the attached in-flight job; None if the
+            survey does not exist.
+    """
+    survey = db.get(Survey, survey_id)
+    if survey is None:
+        return None
+    active_key = f"digest:{survey_id}"
+    for _ in range(2):
+        job = db.execute(select(ReportJob).where(ReportJob.active_key == active_key)).scalar_one_or_none()
+        if job is not None:
+            return job
+        job = ReportJob(
+            kind=ReportJobKind.survey_digest.value,
+            review_id=survey.review_id,
+            survey_id=survey_id,
+            active_key=active_key,
+        )
+        db.add(job)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            continue
+        db.refresh(job)
+        report_worker.wake()
+        return job
+    raise RuntimeError(f"Could not queue a digest job for survey {survey_id}")
+
+
+def progress_writer(job_id: str) -> ReportProgress:
+    """A pipeline progress callback that stores the progress on the job row.
+
+    Every write uses its own short-lived session and an UPDATE of the job
+    row, so the session the pipeline runs in is never committed from the
+    callback (a failed attempt must be able to roll all of its writes back).
+    Writes are throttled to one per `PROGRESS_WRITE_INTERVAL` within a
+    stage; a stage change is always written.
+    """
+    last = {"stage": None, "at": 0.0}
+
+    def _write(stage: str, sides: int, tokens: int) -> None:
+        now = time.monotonic()
+        if stage == last["stage"] and now - last["at"] < PROGRESS_WRITE_INTERVAL:
+            return
+        last["stage"], last["at"] = stage, now
+        try:
+            with LocalSession() as progress_db:
+                progress_db.execute(
+                    update(ReportJob)
+                    .where(ReportJob.job_id == job_id)
+                    .values(progress_stage=stage, progress_sides=sides, progress_tokens=tokens)
+                    .execution_options(synchronize_session=False)
+                )
+                progress_db.commit()
+        except Exception as e:
+            logger.warning("Could not store progress of report job %s: %s", job_id, e)
+    return _write
+
+
+def remove_superseded_reports(db: Session, job: ReportJob) -> int:
+    """Delete the PDFs of the earlier succeeded report jobs of the job's review.
+
+    Every input version gets its own file (`file_tag`), so once a newer
+    version succeeded the older files are never served again. Files still
+    waiting to be delivered to a chat are kept.
+
+    Args:
+        db: The DB session; committed.
+        job: The report job that has just succeeded.
+
+    Returns:
+        int: The number of superseded jobs whose file was removed.
+    """
+    older = db.execute(
+        select(ReportJob).where(
+            ReportJob.review_id == job.review_id,
+            ReportJob.job_id != job.job_id,
+            ReportJob.status == ReportJobStatus.succeeded,
+            ReportJob.result_path.isnot(None),
+            ReportJob.result_path != job.result_path,
+            or_(ReportJob.kind.is_(None), ReportJob.kind == ReportJobKind.report.value),
+            or_(ReportJob.notify_chat_id.is_(None), ReportJob.delivered_at.isnot(None)),
+        )
+    ).scalars().all()
+    removed = 0
+    for old in older:
+        try:
+            os.remove(old.result_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Could not remove superseded report %s: %s", old.result_path, e)
+            continue
+        old.result_path = None
+        removed += 1
+    db.commit()
+    return removed
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Backoff before the next attempt: base * 2^(attempts-1), capped."""
+    delay = settings.REPORT_JOB_RETRY_BASE * (2 ** max(attempts - 1, 0))
+    return timedelta(seconds=min(delay, settings.REPORT_JOB_RETRY_MAX))
+
+
+class ReportJobWorker:
+    """Claims due report jobs from the DB and runs them concurrently."""
+
+    def __init__(self, concurrency: int):
+        self._slots = asyncio.Semaphore(concurrency)
+        self._wake = asyncio.Event()
+        self._tasks: set[asyncio.Task] = set()
+
+    def wake(self) -> None:
+        """Poll the queue now instead of waiting for the next interval."""
+        self._wake.set()
+
+    def _claim(self, db: Session, limit: int, now: datetime) -> list[str]:
+        """Move up to `limit` due jobs to `running` under a fresh lease.
+
+        Jobs are claimed one by one with a conditional UPDATE, so concurrent
+        workers (several app processes) never run the same job twice.
+        """
+        due = db.execute(
+            select(ReportJob.job_id)
+            .where(or_(
+                and_(
+                    ReportJob.status == ReportJobStatus.queued,
+                    or_(ReportJob.next_attempt_at.is_(None), ReportJob.next_attempt_at <= now),
+                ),
+                and_(ReportJob.status == ReportJobStatus.running, ReportJob.lease_until < now),
+            ))
+            .order_by(ReportJob.created_at)
+            .limit(limit)
+        ).scalars().all()
+
+        claimed = []
+        lease_until = now + timedelta(seconds=settings.REPORT_JOB_TIMEOUT)
+        for job_id in due:
+            rowcount = db.execute(
+                update(ReportJob)
+                .where(
+                    ReportJob.job_id == job_id,
+                    or_(
+                        ReportJob.status == ReportJobStatus.queued,
+                        and_(ReportJob.status == ReportJobStatus.running, ReportJob.lease_until < now),
+                    ),
+                )
+                .values(
+                    status=ReportJobStatus.running,
+                    attempts=ReportJob.attempts + 1,
+                    started_at=now,
+                    lease_until=lease_until,
+                )
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if rowcount:
+                claimed.append(job_id)
+        db.commit()
+        return claimed
+
+    async def _run(self, job_id: str) -> None:
+        try:
+            with LocalSession() as db:
+                job = db.get(ReportJob, job_id)
+                if job.kind == ReportJobKind.survey_digest:
+                    lock_key = f"digest:{job.survey_id}"
+                else:
+                    lock_key = f"report:{job.review_id}"
+                if not acquire_lock(db, lock_key, job_id, settings.REPORT_JOB_TIMEOUT):
+                    # another job of this review is running somewhere; wait without spending an attempt
+                    job.status = ReportJobStatus.queued
+                    job.attempts -= 1
+                    job.lease_until = None
+                    job.next_attempt_at = datetime.now(timezone.utc) + timedelta(seconds=settings.REPORT_JOB_POLL_INTERVAL)
+                    db.commit()
+                    return
+                try:
+                    await self._generate(db, job)
+                finally:
+                    release_lock(db, lock_key, job_id)
+        except Exception as e:
+            # the job keeps its lease and is re-claimed when it expires
+            logger.exception("Report job %s crashed: %s", job_id, e)
+        finally:
+            self._slots.release()
+            self.wake()
+
+    async def _generate(self, db: Session, job: ReportJob) -> None:
+        job_id = job.job_id
+        try:
+            if job.attempts > settings.REPORT_JOB_MAX_ATTEMPTS:
+                raise RuntimeError("worker lease expired on the last attempt")
+            if job.kind == ReportJobKind.survey_digest:
+                await asyncio.wait_for(generate_survey_digest(db, job.survey_id), timeout=settings.REPORT_JOB_TIMEOUT)
+                result_path = None
+            else:
+                report = await asyncio.wait_for(
+                    generate_report(
+                        db, job.review_id,
+                        progress=progress_writer(job_id),
+                        file_tag=(job.answers_version or job.job_id)[:12],
+                    ),
+                    timeout=settings.REPORT_JOB_TIMEOUT,
+                )
+                result_path = report.file_path
+        except Exception as e:
+            db.rollback()
+            job = db.get(ReportJob, job_id)
+            job.last_error = f"{type(e).__name__}: {e}"[:2000]
+            job.lease_until = None
+            if isinstance(e, (ReviewNotFoundError, SurveyNotFoundError)) or job.attempts >= settings.REPORT_JOB_MAX_ATTEMPTS:
+                job.status = ReportJobStatus.failed
+                job.active_key = None
+                job.finished_at = datetime.now(timezone.utc)
+                logger.error("Report job %s failed after %d attempt(s): %s", job_id, job.attempts, e)
+            else:
+                job.status = ReportJobStatus.queued
+                job.next_attempt_at = datetime.now(timezone.utc) + retry_delay(job.attempts)
+                logger.warning("Report job %s attempt %d failed, retrying at %s: %s",
+                               job_id, job.attempts, job.next_attempt_at.isoformat(), e)
+            db.commit()
+            return
+
+        job.status = ReportJobStatus.succeeded
+        job.active_key = None
+        job.result_path = result_path
+        job.last_error = None
+        job.lease_until = None
+        job.finished_at = datetime.now(timezone.utc)
+        db.commit()
+        logger.info("Report job %s (%s) succeeded: %s", job_id, job.kind or ReportJobKind.report.value, result_path)
+        if result_path:
+            try:
+                removed = remove_superseded_reports(db, job)
+            except Exception as e:
+                db.rollback()
+                logger.warning("Could not clean up superseded reports of review %s: %s", job.review_id, e)
+            else:
+                if removed:
+                    logger.info("Removed %d superseded report file(s) of review %s", removed, job.review_id)
+
+    async def poll_once(self) -> int:
+        """Start as many due jobs as there are free slots.
+
+        Returns:
+            int: The number of jobs started.
+        """
+        started = 0
+        while not self._slots.locked():
+            await self._slots.acquire()
+            try:
+                with LocalSession() as db:
+                    claimed = self._claim(db, 1, datetime.now(timezone.utc))
+            except Exception:
+                self._slots.release()
+                raise
+            if not claimed:
+                self._slots.release()
+                break
+            task = asyncio.create_task(self._run(claimed[0]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            started += 1
+        return started
+
+    async def run(self) -> None:
+        """Background task: poll the job table every `REPORT_JOB_POLL_INTERVAL` seconds or when woken."""
+        logger.info("Report job worker started")
+        while True:
+            self._wake.clear()
+            try:
+                await self.poll_once()
+            except Exception as e:
+                logger.exception("Report job poll failed: %s", e)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.REPORT_JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+
+report_worker = ReportJobWorker(settings.REPORT_JOB_CONCURRENCY)
@@ -0,0 +1,449 @@
+"""Review report generation pipeline.
+
+Loads the answers of a review, extracts strengths and growth points and
+recommendations with two structured LLM calls (or, in the "combined"
+extraction mode, one call returning both) and renders the PDF report.
+Reviews whose feedback exceeds `MAP_REDUCE_TOKEN_THRESHOLD` are extracted in
+chunks (see `llm_agg.map_reduce`). Feedback is sent grouped by question
+(see `llm_agg.feedback`), within `FEEDBACK_TOKEN_BUDGET`. With
+`SURVEY_DIGESTS_ENABLED`, surveys that were condensed on submission
+contribute their digests instead of raw answers.
+The extracted sides and recommendations are stored with the surveys they
+cover, so a survey arriving after the report was made is folded in with one
+update call over the stored sides instead of re-reading every answer.
+With `REPORT_VERIFY_PROOFS`, proofs are checked to be verbatim quotes and the
+respondent counts are recomputed from their markers (see `llm_agg.verify`)
+before the recommendations are made for the sides.
+Runs inside the report job worker, not in an HTTP request.
+"""
+# app/services/report_pipeline.py
+import asyncio
+import dataclasses
+import json
+import re
+import time
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.app.core.config import settings, LLM_CACHE, LLM_COMPLETER
+from src.app.core.logging import get_logs_writer_logger
+from src.app.services.answer_matrix import load_answer_matrix
+from src.app.services.score_stats import load_score_stats, to_numeric_values
+from src.app.services.survey_digest import load_digests, render_digest, source_hash, survey_feedback_text
+from src.db.models import Report, Review, SurveyDigest
+
+from src.llm_agg.prompts import (
+    RECOMMENDATIONS_PROMPT,
+    BASE_PROMPT_WO_TASK
+)
+from src.llm_agg.prompts.builder import (
+    combined_layout,
+    sides_layout,
+    sides_update_variable_part,
+    sides_variable_part,
+)
+from src.llm_agg.repair import REPAIR_STATS
+from src.llm_agg.streaming import ProgressCallback, ProgressEvent
+from src.llm_agg.usage import ModeComparison, UsageTracker
+from src.llm_agg.schemas.sides import Sides
+from src.llm_agg.schemas.combined import SidesWithRecommendations
+from src.llm_agg.utils import remove_ambiguous_sides
+from src.llm_agg.schemas.recommendations import Recommendations
+from src.llm_agg.reports.jinja import create_report
+from src.llm_agg.map_reduce import (
+    ReviewerFeedback,
+    extract_sides_map_reduce,
+    recount_sides,
+)
+from src.llm_agg.feedback import assemble_feedback
+from src.llm_agg.verify import prune_recommendations, verify_sides
+
+logger = get_logs_writer_logger()
+
+EXTRACTION_MODES = ("two_call", "combined")
+
+# wall time and tokens per extraction mode since the process started
+EXTRACTION_STATS = ModeComparison()
+
+REVIEWER_LABEL_RE = re.compile(r"^Reviewer (\d+)$")
+
+# (stage, sides parsed so far, tokens received) - see `generate_report`
+ReportProgress = Callable[[str, int, int], None]
+
+# verifies the extracted sides before the recommendations are made for them - see `_verify`
+VerifySides = Callable[[object], Awaitable[object]]
+
+
+CHUNKED_FEEDBACK_NOTE = (
+    "(The feedback was processed in parts because of its size; "
+    "the verbatim quotes are in the proofs of the classification below.)"
+)
+
+
+class ReviewNotFoundError(LookupError):
+    """The review of a report job does not exist (not worth retrying)."""
+
+
+def build_feedback_blocks(
+    matrix,
+    digests: Optional[dict[str, SurveyDigest]] = None,
+    labels: Optional[dict[str, str]] = None,
+) -> list[ReviewerFeedback]:
+    """Collect the textual answers of every reviewer for the extraction prompt.
+
+    Args:
+        matrix: The `AnswerMatrix` of the review.
+        digests: Optional survey digests by survey ID; a digest is used
+            instead of the raw answers if they have not changed since it was made.
+        labels: Labels to keep for already covered surveys (see
+            `Report.covered_surveys`); other anonymous reviewers get the
+            next free "Reviewer N", so persisted proof markers stay valid.
+
+    Returns:
+        list[ReviewerFeedback]: One block of "question: answer" lines (or
+            digest lines) per reviewer.
+    """
+    labels = labels or {}
+    taken = set(labels.values())
+    next_number = 1 + max(
+        (int(m.group(1)) for m in map(REVIEWER_LABEL_RE.match, taken) if m), default=0
+    )
+    blocks = []
+    for i, (survey_id, evaluator) in enumerate(matrix.evaluators.items()):
+        if not matrix.row(survey_id):
+            continue
+        text = survey_feedback_text(matrix, survey_id)
+
+        if survey_id in labels:
+            reviewer_label = labels[survey_id]
+        elif matrix.anonymity is False and evaluator.full_name:
+            reviewer_label = evaluator.full_name
+        else:
+            reviewer_label = f"Reviewer {i+1}"
+            if reviewer_label in taken:
+                reviewer_label = f"Reviewer {next_number}"
+                next_number += 1
+        taken.add(reviewer_label)
+
+        block = ReviewerFeedback(
+            label=reviewer_label,
+            text=text,
+            survey_id=survey_id,
+            answers=[(q.question_text, t) for q, cell in matrix.row(survey_id) for t in cell.texts],
+        )
+        digest = (digests or {}).get(survey_id)
+        if digest is not None and digest.source_hash == source_hash(text):
+            block.text = render_digest(digest.content, block.marker)
+            block.answers = []
+        blocks.append(block)
+    return blocks
+
+
+def llm_config_hash(report: Report) -> str:
+    """Hash of what besides the feedback determines the LLM output: model, prompt, mode."""
+    mode = report.extraction_mode or settings.LLM_EXTRACTION_MODE
+    return source_hash(f"{settings.MODEL_NAME}\0{report.prompt or ''}\0{mode}")
+
+
+def _covered(report: Report) -> dict[str, dict]:
+    return json.loads(report.covered_surveys) if report.covered_surveys else {}
+
+
+def incremental_plan(
+    report: Report, blocks: list[ReviewerFeedback], hashes: dict[str, str]
+) -> Optional[list[ReviewerFeedback]]:
+    """The reviewers to add to the persisted output, or None if a full generation is needed.
+
+    An incremental update is possible when the persisted output was made with
+    the same model, prompt and mode, every covered survey is unchanged, and
+    the new reviewers are at most `REPORT_INCREMENTAL_MAX_NEW_SHARE` of all.
+    A prompt override with a `{feedback}` placeholder is a template of a full
+    extraction request, so new reviewers of such reports need a full generation.
+
+    Returns:
+        list[ReviewerFeedback] | None: The new blocks (empty if nothing is
+            new and the persisted output can be re-rendered as is).
+    """
+    if not settings.REPORT_INCREMENTAL_ENABLED:
+        return None
+    covered = _covered(report)
+    if not (covered and report.sides_json and report.recommendations_json):
+        return None
+    if report.llm_config_hash != llm_config_hash(report):
+        return None
+    if any(hashes.get(survey_id) != info.get("hash") for survey_id, info in covered.items()):
+        return None
+    new = [b for b in blocks if b.survey_id not in covered]
+    if len(new) > settings.REPORT_INCREMENTAL_MAX_NEW_SHARE * len(blocks):
+        return None
+    if new and report.prompt and "{feedback}" in report.prompt:
+        return None
+    return new
+
+
+def _stream_progress(progress: Optional[ReportProgress]) -> Optional[ProgressCallback]:
+    """Forward streaming events of the sides call as "extracting" progress (None disables streaming)."""
+    if progress is None or not settings.LLM_STREAM_PROGRESS:
+        return None
+
+    def _forward(event: ProgressEvent) -> None:
+        progress("extracting", event.sides_parsed, event.tokens_received)
+    return _forward
+
+
+async def _verify(sides, blocks: list[ReviewerFeedback], usage: UsageTracker, review_id: str):
+    """Proof verification of the sides (a `CompletionResult` or `Sides`, returned as the same type)."""
+    if not settings.REPORT_VERIFY_PROOFS:
+        return sides
+    verified, verification = await verify_sides(
+        getattr(sides, "parsed", sides),
+        blocks,
+        completer=LLM_COMPLETER if settings.REPORT_PROOF_REPAIR_ENABLED else None,
+        cache=LLM_CACHE,
+        usage_tracker=usage,
+        render=lambda repair_blocks: assemble_feedback(repair_blocks).text,
+    )
+    if verification.repair_error:
+        logger.warning("Review %s: proof repair call failed, dropping unverified proofs: %s",
+                       review_id, verification.repair_error)
+    logger.info("Review %s proofs: %s", review_id, verification.stats())
+    if hasattr(sides, "parsed"):
+        return dataclasses.replace(sides, parsed=verified, raw=verified.model_dump_json())
+    return verified
+
+
+async def _recommendations(log: list[dict], sides, usage: UsageTracker, progress: Optional[ReportProgress]):
+    """The second call of the two-call path: recommendations for the extracted sides."""
+    if progress is not None:
+        progress("recommendations", len(sides.parsed.sides), 0)
+    log.append({
+        "role": "assistant",
+        "content": remove_ambiguous_sides(sides)
+    })
+    log.append({
+        "role": "user",
+        "content": RECOMMENDATIONS_PROMPT
+    })
+    return await LLM_COMPLETER.get_so_completion(
+        log, Recommendations, cache=LLM_CACHE, usage_tracker=usage
+    )
+
+
+async def _extract_two_call(
+    feedback: str, override: Optional[str], usage: UsageTracker, progress: Optional[ReportProgress],
+    verify: VerifySides,
+):
+    """Sides, then recommendations for the verified sides fed back as the assistant turn."""
+    # static system prompt + rules first, per-report override and feedback last
+    layout = sides_layout(cache_hints=settings.LLM_PROMPT_CACHE_HINTS)
+    log = layout.messages(sides_variable_part(feedback, override))
+    sides = await LLM_COMPLETER.get_so_completion(
+        log, Sides, cache=LLM_CACHE, usage_tracker=usage, on_progress=_stream_progress(progress)
+    )
+    sides = await verify(sides)
+    return sides, await _recommendations(log, sides, usage, progress)
+
+
+async def _extract_combined(
+    feedback: str, override: Optional[str], usage: UsageTracker, progress: Optional[ReportProgress],
+    verify: VerifySides,
+):
+    """Sides and recommendations from one completion (one round-trip, feedback sent once).
+
+    Recommendations for sides that did not survive the verification are dropped.
+    """
+    layout = combined_layout(cache_hints=settings.LLM_PROMPT_CACHE_HINTS)
+    combined = await LLM_COMPLETER.get_so_completion(
+        layout.messages(sides_variable_part(feedback, override)),
+        SidesWithRecommendations,
+        cache=LLM_CACHE,
+        usage_tracker=usage,
+        on_progress=_stream_progress(progress),
+        sides_path=("sides", "sides"),
+    )
+    sides = await verify(combined.parsed.sides)
+    return sides, prune_recommendations(combined.parsed.recommendations, combined.parsed.sides, sides)
+
+
+async def _extract_map_reduce(
+    blocks: list[ReviewerFeedback], override: Optional[str], usage: UsageTracker, progress: Optional[ReportProgress],
+    verify: VerifySides,
+):
+    """Chunked sides extraction followed by the recommendations call."""
+    layout = sides_layout(cache_hints=settings.LLM_PROMPT_CACHE_HINTS)
+    sides = await extract_sides_map_reduce(
+        blocks,
+        lambda chunk: layout.messages(sides_variable_part(chunk, override)),
+        render=lambda chunk: assemble_feedback(chunk).text,
+        model_name=LLM_COMPLETER.primary.model_name,
+        client=LLM_COMPLETER.primary.client,
+        provider_name=LLM_COMPLETER.primary.provider_name,
+        system_prompt=BASE_PROMPT_WO_TASK,
+        chunk_tokens=settings.MAP_REDUCE_CHUNK_TOKENS,
+        concurrency=settings.MAP_REDUCE_CONCURRENCY,
+        cache=LLM_CACHE,
+        usage_tracker=usage,
+        completer=LLM_COMPLETER,
+    )
+    sides = await verify(sides)
+    # the full feedback does not fit one request; the quotes in the proofs carry the evidence
+    log = layout.messages(sides_variable_part(CHUNKED_FEEDBACK_NOTE, override))
+    return sides, await _recommendations(log, sides, usage, progress)
+
+
+async def _extract_incremental(
+    report: Report, new: list[ReviewerFeedback], usage: UsageTracker, progress: Optional[ReportProgress],
+    verify: VerifySides,
+):
+    """Fold the feedback of new reviewers into the persisted sides, then redo the recommendations."""
+    layout = sides_layout(cache_hints=settings.LLM_PROMPT_CACHE_HINTS)
+    feedback = assemble_feedback(new, settings.FEEDBACK_TOKEN_BUDGET or None).text
+    log = layout.messages(sides_update_variable_part(report.sides_json, feedback, report.prompt))
+    sides = await LLM_COMPLETER.get_so_completion(
+        log, Sides, cache=LLM_CACHE, usage_tracker=usage, on_progress=_stream_progress(progress)
+    )
+    # the model is told to keep the counts right; the markers are the source of truth
+    recounted = recount_sides(sides.parsed)
+    sides = await verify(dataclasses.replace(sides, parsed=recounted, raw=recounted.model_dump_json()))
+    return sides, await _recommendations(log, sides, usage, progress)
+
+
+def _persist_output(report: Report, blocks: list[ReviewerFeedback], hashes: dict[str, str], sides, rec) -> None:
+    """Store what an incremental update starts from: the outputs and the surveys they cover."""
+    report.sides_json = getattr(sides, "parsed", sides).model_dump_json()
+    report.recommendations_json = getattr(rec, "parsed", rec).model_dump_json()
+    report.covered_surveys = json.dumps(
+        {b.survey_id: {"label": b.label, "hash": hashes[b.survey_id]} for b in blocks},
+        ensure_ascii=False,
+    )
+    report.llm_config_hash = llm_config_hash(report)
+
+
+async def generate_report(
+    db: Session,
+    review_id: str,
+    progress: Optional[ReportProgress] = None,
+    file_tag: Optional[str] = None,
+) -> Report:
+    """Generate/update the review report using LLM aggregation.
+
+    Args:
+        db: The DB session; committed with the new report file path.
+        review_id: The ID of the review.
+        progress: Optional callback of the stages "extracting",
+            "recommendations" and "rendering". With `LLM_STREAM_PROGRESS`,
+            the sides call is streamed and reports every parsed side.
+        file_tag: Optional suffix of the PDF filename (the job passes its
+            input version, so a precomputed PDF is never overwritten by
+            another version).
+
+    Returns:
+        Report: The updated report row.
+
+    Errors:
+        ReviewNotFoundError: The review does not exist.
+    """
+    review = db.get(Review, review_id)
+    if not review:
+        raise ReviewNotFoundError(review_id)
+    matrix = load_answer_matrix(db, review_id)
+
+    subject = review.subject_user
+    subject_name = ' '.join(p for p in [
+        subject.last_name,
+        subject.first_name,
+        subject.middle_name,
+    ] if p) if subject else ''
+
+    score_stats = load_score_stats(db, review_id)
+    numeric_values = to_numeric_values(score_stats)
+    report = db.execute(select(Report).where(Report.review_id == review_id)).scalar()
+    if not report:
+        report = Report(review_id=review_id)
+        db.add(report)
+
+    digests = load_digests(db, review_id) if settings.SURVEY_DIGESTS_ENABLED else None
+    covered = _covered(report)
+    blocks = build_feedback_blocks(matrix, digests, labels={sid: c["label"] for sid, c in covered.items()})
+    if digests:
+        logger.info("Review %s: %d survey digest(s) available", review_id, len(digests))
+    hashes = {b.survey_id: source_hash(survey_feedback_text(matrix, b.survey_id)) for b in blocks}
+    new_blocks = incremental_plan(report, blocks, hashes)
+
+    mode = report.extraction_mode or settings.LLM_EXTRACTION_MODE
+    usage = UsageTracker()
+
+    async def verify(sides):
+        # the proofs of every path may quote any reviewer, persisted or new
+        return await _verify(sides, blocks, usage, review_id)
+    started = time.perf_counter()
+
+    if progress is not None:
+        progress("extracting", 0, 0)
+    assembled = assemble_feedback(blocks)
+    feedback_tokens = assembled.tokens
+    if new_blocks is not None and not new_blocks:
+        logger.info("Review %s: no new or changed surveys, re-rendering the stored output", review_id)
+        mode = "reuse"
+        sides = Sides.model_validate_json(report.sides_json)
+        rec = Recommendations.model_validate_json(report.recommendations_json)
+    elif new_blocks is not None:
+        logger.info("Review %s: %d new reviewer(s) of %d, updating the stored output",
+                    review_id, len(new_blocks), len(blocks))
+        mode = "incremental"
+        sides, rec = await _extract_incremental(report, new_blocks, usage, progress, verify)
+    elif feedback_tokens > settings.MAP_REDUCE_TOKEN_THRESHOLD and len(blocks) > 1:
+        logger.info("Review %s: %d reviewers, ~%d feedback tokens, using map-reduce extraction",
+                    review_id, len(blocks), feedback_tokens)
+        # a chunked extraction cannot produce recommendations in the same calls
+        mode = "map_reduce"
+        sides, rec = await _extract_map_reduce(blocks, report.prompt, usage, progress, verify)
+    else:
+        assembled = assemble_feedback(blocks, settings.FEEDBACK_TOKEN_BUDGET or None)
+        logger.info("Review %s feedback: %d answers, ~%d tokens (~%d saved by grouping by question), "
+                    "%d dropped, %d shortened to fit the budget%s",
+                    review_id, assembled.answers, assembled.tokens, assembled.saved_tokens,
+                    assembled.dropped_answers, assembled.shortened_answers,
+                    ", still over budget" if assembled.over_budget else "")
+        if mode == "combined":
+            sides, rec = await _extract_combined(assembled.text, report.prompt, usage, progress, verify)
+        else:
+            mode = "two_call"
+            sides, rec = await _extract_two_call(assembled.text, report.prompt, usage, progress, verify)
+    wall_s = time.perf_counter() - started
+    _persist_output(report, blocks, hashes, sides, rec)
+
+    for call in usage.calls:
+        logger.info("Review %s LLM call %s: %s, %.2fs", review_id, call.label, call.usage, call.latency_s)
+    totals = usage.totals()
+    EXTRACTION_STATS.record(mode, wall_s, totals)
+    logger.info("Review %s extraction mode=%s: %.2fs wall, usage %s", review_id, mode, wall_s, totals)
+    logger.info("Extraction modes so far: %s", EXTRACTION_STATS.summary())
+    if LLM_CACHE is not None:
+        logger.info("LLM cache after report %s: %s", review_id, LLM_CACHE.stats())
+    logger.info("LLM endpoints after report %s: %s", review_id, LLM_COMPLETER.metrics())
+    logger.info("LLM output repairs after report %s: %s", review_id, REPAIR_STATS.stats())
+
+    if progress is not None:
+        progress("rendering", len(getattr(sides, "parsed", sides).sides), 0)
+    # WeasyPrint rendering is CPU-bound; keep the event loop free for other jobs
+    path_to_file = await asyncio.to_thread(
+        create_report,
+        templates_dir='jinja_templates',
+        template_name='base.html.jinja',
+        sides_json=sides,
+        recommendations_json=rec,
+        numeric_values=numeric_values,
+        score_stats=score_stats,
+        employee_name=subject_name,
+        visualization_url=None,
+        quotes_layout="inline",
+        write_intermediate_html=True,
+        file_tag=file_tag,
+    )
+    report.file_path = path_to_file
+    db.commit()
+    db.refresh(report)
+    return report
@@ -0,0 +1,151 @@
+"""Numeric score statistics of a review computed in the database.
+
+Typed numeric answers (`Answer.numeric_value`, filled at write time for range
+sliders, numeric free text and numeric options) are aggregated with GROUP BY
+per question, split into the subject's self-assessment and everyone else's
+assessment, so the cost of the report grows with the number of questions
+rather than the number of answers.
+"""
+# app/services/score_stats.py
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import case, func, literal, select
+from sqlalchemy.orm import Session
+
+from src.db.models import Answer, Question, Review, Survey
+
+
+@dataclass
+class ScoreStats:
+    count: int
+    mean: float
+    median: float | None
+    stddev: float | None
+    min: float
+    max: float
+
+
+@dataclass
+class QuestionScores:
+    question_id: str
+    question_text: str
+    position: int
+    self: ScoreStats | None = None
+    others: ScoreStats | None = None
+
+
+def _values_subquery(review_id: str):
+    """One row per numeric answer: (question_id, is_self, value)."""
+    is_self = case((Survey.evaluator_user_id == Review.subject_user_id, literal(True)), else_=literal(False))
+    return (
+        select(
+            Answer.question_id.label("question_id"),
+            is_self.label("is_self"),
+            Answer.numeric_value.label("value"),
+        )
+        .join(Survey, Survey.survey_id == Answer.survey_id)
+        .join(Review, Review.review_id == Survey.review_id)
+        .where(Review.review_id == review_id, Answer.numeric_value.isnot(None))
+        .subquery("score_values")
+    )
+
+
+def _median(values: list[float]) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    mid = len(ordered) // 2
+    return ordered[mid] if len(ordered) % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+
+
+def load_score_stats(db: Session, review_id: str) -> list[QuestionScores]:
+    """Aggregate numeric answers of the review per question.
+
+    PostgreSQL computes every statistic including the median in one query;
+    other dialects get the median from a second query over the numeric values.
+
+    Args:
+        db: The DB session.
+        review_id: The ID of the review.
+
+    Returns:
+        list[QuestionScores]: Questions with numeric answers, in question order.
+    """
+    dialect_name = db.get_bind().dialect.name
+    values = _values_subquery(review_id)
+    value = values.c.value
+
+    columns = [
+        Question.question_id, Question.question_text, Question.position, values.c.is_self,
+        func.count(value).label("n"),
+        func.avg(value).label("mean"),
+        func.min(value).label("min"),
+        func.max(value).label("max"),
+        func.sum(value * value).label("sum_sq"),
+    ]
+    if dialect_name == "postgresql":
+        columns.append(func.percentile_cont(0.5).within_group(value).label("median"))
+
+    rows = db.execute(
+        select(*columns)
+        .join(Question, Question.question_id == values.c.question_id)
+        .where(value.isnot(None))
+        .group_by(Question.question_id, Question.question_text, Question.position, values.c.is_self)
+        .order_by(Question.position)
+    ).all()
+
+    medians: dict[tuple[str, bool], float | None] = {}
+    if dialect_name != "postgresql" and rows:
+        grouped: dict[tuple[str, bool], list[float]] = {}
+        for question_id, is_self, v in db.execute(
+            select(values.c.question_id, values.c.is_self, value).where(value.isnot(None))
+        ).all():
+            grouped.setdefault((question_id, bool(is_self)), []).append(float(v))
+        medians = {k: _median(v) for k, v in grouped.items()}
+
+    result: dict[str, QuestionScores] = {}
+    for r in rows:
+        n, mean = int(r.n), float(r.mean)
+        stddev = None
+        if n > 1:
+            variance = (float(r.sum_sq) - n * mean * mean) / (n - 1)
+            stddev = math.sqrt(max(variance, 0.0))
+        median = r.median if dialect_name == "postgresql" else medians.get((r.question_id, bool(r.is_self)))
+        stats = ScoreStats(
+            count=n,
+            mean=mean,
+            median=float(median) if median is not None else None,
+            stddev=stddev,
+            min=float(r.min),
+            max=float(r.max),
+        )
+        scores = result.setdefault(
+            r.question_id,
+            QuestionScores(question_id=r.question_id, question_text=r.question_text, position=r.position),
+        )
+        if r.is_self:
+            scores.self = stats
+        else:
+            scores.others = stats
+    return list(result.values())
+
+
+def to_numeric_values(scores: list[QuestionScores], ndigits: Optional[int] = 2) -> dict[str, dict[str, float]]:
+    """Convert score statistics into the `numeric_values` expected by `create_report`.
+
+    Args:
+        scores: Result of `load_score_stats`.
+        ndigits: Rounding of the means; None keeps full precision.
+
+    Returns:
+        dict: {"self-esteem": {question: mean}, "manage-esteem": {question: mean}}.
+    """
+    def _round(x: float) -> float:
+        return x if ndigits is None else round(x, ndigits)
+
+    return {
+        "self-esteem": {s.question_text: _round(s.self.mean) for s in scores if s.self},
+        "manage-esteem": {s.question_text: _round(s.others.mean) for s in scores if s.others},
+    }
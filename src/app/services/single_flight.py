@@ -0,0 +1,67 @@
+"""DB-backed single-flight locks shared by all worker processes.
+
+A lock is a row in `single_flight_locks` keyed by name. Acquiring inserts the
+row (the primary key rejects a second holder) or takes over a row whose lease
+has expired, so a crashed holder never blocks the key forever.
+"""
+# app/services/single_flight.py
+from datetime import datetime, timezone, timedelta
+
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.db.models import SingleFlightLock
+
+
+def acquire_lock(db: Session, key: str, owner: str, ttl_seconds: float) -> bool:
+    """Try to take the lock without waiting.
+
+    Args:
+        db: The DB session; committed.
+        key: The lock name, e.g. "report:<review_id>".
+        owner: An ID of the holder (used to release only one's own lock).
+        ttl_seconds: Lease duration after which others may take the lock over.
+
+    Returns:
+        bool: True if the lock is now held by `owner`.
+    """
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(seconds=ttl_seconds)
+
+    taken_over = db.execute(
+        update(SingleFlightLock)
+        .where(
+            SingleFlightLock.key == key,
+            (SingleFlightLock.expires_at < now) | (SingleFlightLock.owner == owner),
+        )
+        .values(owner=owner, expires_at=expires_at, acquired_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if taken_over:
+        db.commit()
+        return True
+
+    db.add(SingleFlightLock(key=key, owner=owner, expires_at=expires_at, acquired_at=now))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+    return True
+
+
+def release_lock(db: Session, key: str, owner: str) -> None:
+    """Release the lock if `owner` still holds it.
+
+    Args:
+        db: The DB session; committed.
+        key: The lock name.
+        owner: The holder ID passed to `acquire_lock`.
+    """
+    db.execute(
+        delete(SingleFlightLock)
+        .where(SingleFlightLock.key == key, SingleFlightLock.owner == owner)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
@@ -1,7 +1,9 @@
 """Scheduler for review statuses and notification distribution.
 
 Periodically transfers reviews between statuses, sends links to participants,
-reminds them of deadlines, and sends HR notifications and reports.
+reminds them of deadlines, queues report jobs and sends HR notifications and finished reports.
+Reports of reviews whose surveys are all finished before `end_at` are computed
+ahead of time and delivered as soon as the review ends.
 """
 # src/app/services/status_manager.py
 import asyncio
@@ -10,13 +12,14 @@ from typing import Optional, Tuple
 
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import FSInputFile
-import httpx
-from sqlalchemy import and_, select
+from sqlalchemy import and_, exists, func, select
 from sqlalchemy.orm import Session, selectinload
 
 from src.db.session import LocalSession
-from src.db.models import Review, Survey, ReviewStatus, SurveyStatus
+from src.db.models import Answer, Report, Review, Survey, ReviewStatus, SurveyStatus, ReportJob, ReportJobStatus, SurveyDigest
 from src.app.services.telegram_bot import get_telegram_bot_service
+from src.app.core.config import settings
+from src.app.services.report_jobs import enqueue_report_job, report_input_version
 from src.app.core.logging import get_logs_writer_logger
 
 from dotenv import dotenv_values
@@ -25,6 +28,9 @@ logger = get_logs_writer_logger()
 
 config = dotenv_values(".env")
 
+# review ID -> `_precompute_stamp` at the last precompute check (per process)
+_precompute_checked: dict[str, tuple] = {}
+
 def _minute_window(now: datetime) -> Tuple[datetime, datetime]:
     start = now.replace(second=0, microsecond=0)
     end = start + timedelta(minutes=1)
@@ -166,7 +172,7 @@ async def _process_start_reviews(db: Session, now: datetime) -> int:
 async def _process_end_reviews(db: Session, now: datetime) -> int:
     """
     Converts a review with the in_progress status to completed if end_at matches by the minute.
-    Marks incomplete surveys as expired and sends the "Report is ready" notification to the Review creator.
+    Marks incomplete surveys as expired and queues a report job that notifies the Review creator.
 
     Args:
         db: The DB session.
@@ -193,7 +199,7 @@ async def _process_end_reviews(db: Session, now: datetime) -> int:
     if not reviews:
         return 0
 
-    messages: list[tuple[int, str]] = []
+    jobs: list[tuple[str, int]] = []
 
     for review in reviews:
         review.status = ReviewStatus.completed
@@ -206,27 +212,108 @@ async def _process_end_reviews(db: Session, now: datetime) -> int:
         if creator:
             chat_id = creator.telegram_chat_id
             if chat_id:
-                async with httpx.AsyncClient(timeout=15.0) as client:
-                    params = {
-                        "review_id": review.review_id,
-                    }
-                    
-                    resp = await client.post(config.get("BACKEND_URL", "http://127.0.0.1:8000") + '/api/review/get_report', data=params)
-                    data = resp.json()
-                    path_to_report = data["path_to_file"]
-                text = f"📊 Отчет к ревью «{review.title}»"
-                messages.append((chat_id, text, path_to_report))
+                jobs.append((review.review_id, chat_id))
             else:
                 logger.debug("No telegram chat_id for creator %s (review %s)", creator.user_id, review.review_id)
 
     db.commit()
 
-    await _send_hrs(messages)
+    # the report is generated by the job worker (or was precomputed for these very
+    # answers) and sent by `_process_report_deliveries`
+    for review_id, chat_id in jobs:
+        enqueue_report_job(db, review_id, notify_chat_id=chat_id, reuse_finished=True)
 
     logger.info("Completed %d review(s) at %s", len(reviews), start.isoformat())
     return len(reviews)
 
 
+def _precompute_stamp(db: Session, review_id: str) -> tuple:
+    """A cheap stand-in for `report_input_version`: it changes whenever a survey is
+    submitted, the answers of completed surveys change, the prompt or mode changes
+    or a digest is written.
+
+    Draft saves of completed surveys are rejected, so their answers only change
+    with a final re-submission, which moves `submitted_at`; the answer count of
+    completed surveys also covers writes that bypass the survey form."""
+    submitted = db.execute(
+        select(func.count(), func.max(Survey.submitted_at))
+        .where(Survey.review_id == review_id, Survey.status == SurveyStatus.completed)
+    ).one()
+    answers = db.execute(
+        select(func.count(Answer.answer_id))
+        .join(Survey, Survey.survey_id == Answer.survey_id)
+        .where(Survey.review_id == review_id, Survey.status == SurveyStatus.completed)
+    ).scalar_one()
+    report = db.execute(
+        select(Report.prompt, Report.extraction_mode).where(Report.review_id == review_id)
+    ).first()
+    digests = None
+    if settings.SURVEY_DIGESTS_ENABLED:
+        digests = tuple(db.execute(
+            select(func.count(), func.max(func.coalesce(SurveyDigest.updated_at, SurveyDigest.created_at)))
+            .where(SurveyDigest.review_id == review_id)
+        ).one())
+    return tuple(submitted), answers, tuple(report or ()), digests, settings.MODEL_NAME, settings.LLM_EXTRACTION_MODE
+
+
+async def _process_report_precompute(db: Session, now: datetime) -> int:
+    """
+    Queues the report of in-progress reviews that have no pending surveys left.
+    Each input version (answers, prompt, model) is queued once; at `end_at` a
+    finished job of the then-current version is delivered without regeneration.
+    The version is only recomputed when `_precompute_stamp` of the review changed.
+
+    Args:
+        db: The DB session.
+        now: Current time (UTC).
+
+    Returns:
+        int: The number of queued precompute jobs.
+    """
+    if not settings.REPORT_PRECOMPUTE_ENABLED:
+        return 0
+
+    pending = exists().where(
+        Survey.review_id == Review.review_id,
+        Survey.status.in_([SurveyStatus.not_started, SurveyStatus.in_progress]),
+    )
+    completed = exists().where(
+        Survey.review_id == Review.review_id,
+        Survey.status == SurveyStatus.completed,
+    )
+    review_ids = db.execute(
+        select(Review.review_id).where(
+            Review.status == ReviewStatus.in_progress,
+            Review.end_at.isnot(None),
+            Review.end_at > now,
+            completed,
+            ~pending,
+        )
+    ).scalars().all()
+
+    for review_id in set(_precompute_checked) - set(review_ids):
+        # finished or reopened reviews; checked again if they come back
+        del _precompute_checked[review_id]
+
+    queued = 0
+    for review_id in review_ids:
+        stamp = _precompute_stamp(db, review_id)
+        if _precompute_checked.get(review_id) == stamp:
+            continue
+        version = report_input_version(db, review_id)
+        seen = db.execute(
+            select(ReportJob.job_id)
+            .where(ReportJob.review_id == review_id, ReportJob.answers_version == version)
+            .limit(1)
+        ).first()
+        if not seen:
+            job = enqueue_report_job(db, review_id)
+            logger.info("Precomputing report of review %s (job %s)", review_id, job.job_id)
+            queued += 1
+        _precompute_checked[review_id] = stamp
+    return queued
+
+
 async def _process_survey_reminders(db: Session, now: datetime) -> int:
     """
     Sends reminders for surveys that have a `notification_call'.
@@ -355,6 +442,52 @@ async def _process_hr_day_before_end(db: Session, now: datetime) -> int:
     return len(messages)
 
 
+async def _process_report_deliveries(db: Session, now: datetime) -> int:
+    """
+    Sends finished report jobs to the Telegram chat they were queued for.
+    A failed job is reported with a text message. Each job is delivered once.
+
+    Args:
+        db: The DB session.
+        now: Current time (UTC).
+
+    Returns:
+        int: The number of delivered jobs.
+    """
+    q = (
+        select(ReportJob)
+        .options(selectinload(ReportJob.review))
+        .where(
+            and_(
+                ReportJob.status.in_([ReportJobStatus.succeeded, ReportJobStatus.failed]),
+                ReportJob.notify_chat_id.isnot(None),
+                ReportJob.delivered_at.is_(None),
+            )
+        )
+    )
+    jobs = db.execute(q).scalars().all()
+    if not jobs:
+        return 0
+
+    documents: list[tuple[int, str, str]] = []
+    failures: list[tuple[int, str, str]] = []
+    for job in jobs:
+        title = job.review.title if job.review else job.review_id
+        if job.status == ReportJobStatus.succeeded and job.result_path:
+            documents.append((job.notify_chat_id, f"📊 Отчет к ревью «{title}»", job.result_path))
+        else:
+            failures.append((job.notify_chat_id, f"❌ Не удалось сформировать отчёт к ревью «{title}»", ""))
+        job.delivered_at = now
+
+    db.commit()
+
+    await _send_hrs(documents)
+    await _send_hr_text(failures)
+
+    logger.info("Delivered %d report job(s) at %s", len(jobs), now.isoformat())
+    return len(jobs)
+
+
 async def process_tick(now: Optional[datetime] = None) -> dict:
     """
     One "tick" of the scheduler: process the start/end of the review, send out notifications.
@@ -374,10 +507,14 @@ async def process_tick(now: Optional[datetime] = None) -> dict:
         reminders = await _process_survey_reminders(db, now)
         hr_day_before = await _process_hr_day_before_end(db, now)
         completed = await _process_end_reviews(db, now)
+        precomputed = await _process_report_precompute(db, now)
+        reports_delivered = await _process_report_deliveries(db, now)
 
         return {
             "reviews_started": started,
             "reviews_completed": completed,
+            "reports_delivered": reports_delivered,
+            "reports_precomputed": precomputed,
             "survey_reminders": reminders,
             "hr_day_before": hr_day_before,
             "timestamp": now.isoformat(),
@@ -396,7 +533,7 @@ async def run_status_manager_loop():
         try:
             now = datetime.now(timezone.utc)
             stats = await process_tick(now)
-            if stats["reviews_started"] or stats["reviews_completed"]:
+            if stats["reviews_started"] or stats["reviews_completed"] or stats["reports_delivered"] or stats["reports_precomputed"]:
                 logger.info("StatusManager stats: %s", stats)
         except Exception as e:
             logger.exception("StatusManager tick failed: %s", e)
@@ -0,0 +1,114 @@
+"""Per-survey digests of free-text feedback, made when a survey is submitted.
+
+A final submission queues a `survey_digest` job (see `report_jobs`). The job
+condenses the reviewer's textual answers into topics with verbatim quotes
+(`FeedbackDigest`) and stores it as a `SurveyDigest`, so the LLM work is
+spread over the review window. At report time a digest replaces the raw
+answers of its survey as long as those answers have not changed since.
+"""
+# app/services/survey_digest.py
+import hashlib
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.app.core.config import settings, LLM_CACHE, LLM_COMPLETER
+from src.app.core.logging import get_logs_writer_logger
+from src.app.services.answer_matrix import AnswerMatrix, load_answer_matrix
+from src.db.models import Survey, SurveyDigest
+
+from src.llm_agg.map_reduce import estimate_tokens
+from src.llm_agg.prompts import BASE_PROMPT_WO_TASK, SURVEY_DIGEST_PROMPT
+from src.llm_agg.schemas.digest import FeedbackDigest
+
+logger = get_logs_writer_logger()
+
+
+class SurveyNotFoundError(LookupError):
+    """The survey of a digest job does not exist (not worth retrying)."""
+
+
+def survey_feedback_text(matrix: AnswerMatrix, survey_id: str) -> str:
+    """The "question: answer" lines of the textual answers of one survey."""
+    return "\n".join(
+        f"{question.question_text}: {text}"
+        for question, cell in matrix.row(survey_id)
+        for text in cell.texts
+    )
+
+
+def source_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def render_digest(content: str, marker: str) -> str:
+    """Digest lines for the extraction prompt; every quote carries the reviewer marker.
+
+    Args:
+        content: `SurveyDigest.content` (FeedbackDigest JSON).
+        marker: The marker the extraction prompt expects for this reviewer,
+            e.g. "R2" or a full name.
+    """
+    digest = FeedbackDigest.model_validate_json(content)
+    return "\n".join(
+        f"{item.topic} ({item.polarity}): [{marker}] {quote}"
+        for item in digest.items
+        for quote in item.quotes
+    )
+
+
+def load_digests(db: Session, review_id: str) -> dict[str, SurveyDigest]:
+    """Stored digests of a review by survey ID."""
+    rows = db.execute(select(SurveyDigest).where(SurveyDigest.review_id == review_id)).scalars().all()
+    return {d.survey_id: d for d in rows}
+
+
+async def generate_survey_digest(db: Session, survey_id: str) -> Optional[SurveyDigest]:
+    """Create or refresh the digest of a submitted survey.
+
+    Args:
+        db: The DB session; committed.
+        survey_id: The ID of the survey.
+
+    Returns:
+        SurveyDigest | None: The digest; None if the feedback is shorter than
+            `SURVEY_DIGEST_MIN_TOKENS` (the raw answers are used as is).
+
+    Errors:
+        SurveyNotFoundError: The survey does not exist.
+    """
+    survey = db.get(Survey, survey_id)
+    if survey is None:
+        raise SurveyNotFoundError(survey_id)
+    matrix = load_answer_matrix(db, survey.review_id, survey_ids=[survey_id])
+    text = survey_feedback_text(matrix, survey_id) if matrix else ""
+    if estimate_tokens(text) < settings.SURVEY_DIGEST_MIN_TOKENS:
+        logger.info("Survey %s: feedback is short, no digest needed", survey_id)
+        return None
+
+    digest = db.execute(select(SurveyDigest).where(SurveyDigest.survey_id == survey_id)).scalar_one_or_none()
+    text_hash = source_hash(text)
+    if digest is not None and digest.source_hash == text_hash:
+        return digest
+
+    result = await LLM_COMPLETER.get_so_completion(
+        [
+            {"role": "system", "content": BASE_PROMPT_WO_TASK},
+            {"role": "user", "content": SURVEY_DIGEST_PROMPT.format(feedback=text)},
+        ],
+        FeedbackDigest,
+        cache=LLM_CACHE,
+    )
+    if digest is None:
+        digest = SurveyDigest(survey_id=survey_id, review_id=survey.review_id)
+        db.add(digest)
+    digest.source_hash = text_hash
+    digest.content = result.raw
+    digest.model_name = result.model_name
+    digest.updated_at = datetime.now(timezone.utc)
+    db.commit()
+    logger.info("Survey %s digest: ~%d -> ~%d tokens",
+                survey_id, estimate_tokens(text), estimate_tokens(render_digest(result.raw, "R")))
+    return digest
@@ -4,6 +4,7 @@ Implements registration, menus, work with reviews, uploading participants and re
 as well as auxiliary keyboards and rights verification.
 """
 # app/services/telegram_bot.py
+import asyncio
 import csv, io
 import pandas as pd
 from typing import Dict
@@ -65,6 +66,13 @@ class TelegramBotService:
     WELCOME_TEMPLATE = "👋 Привет, {first_name}!\n✅ Вы успешно зарегистрированы!"
     ADMIN_PANEL_MESSAGE = "👑 Вам доступна панель администратора"
     HR_KEY = "HR2025"
+    REPORT_POLL_INTERVAL = 3.0
+    REPORT_QUEUED_MESSAGE = "⏳ Отчёт в очереди на формирование…"
+    REPORT_PROGRESS_MESSAGES = {
+        "extracting": "🔎 Анализ отзывов: выделено качеств — {sides}",
+        "recommendations": "💡 Найдено качеств: {sides}. Формирование рекомендаций…",
+        "rendering": "📄 Сборка PDF-отчёта…",
+    }
 
     def __init__(self, bot_token: str, backend_url: str):
         self.bot = Bot(token=bot_token)
@@ -472,14 +480,54 @@ class TelegramBotService:
             "📎 Отправьте CSV или XLSX файл со столбцами: last_name, first_name, middle_name (опц.), job_title (опц.), department (опц.), telegram_username (без @), can_create_review (boolean)")
         await callback.answer()
 
+    def _report_progress_text(self, job: dict) -> str:
+        """Human-readable progress of a running report job."""
+        template = self.REPORT_PROGRESS_MESSAGES.get(job.get("progress_stage") or "")
+        if template is None:
+            return self.REPORT_QUEUED_MESSAGE
+        return template.format(sides=job.get("progress_sides") or 0)
+
+    async def _wait_report_job(self, client: httpx.AsyncClient, job_id: str, status_message: Message | None = None) -> dict:
+        """Poll the report job until it finishes or `REPORT_JOB_TIMEOUT` passes.
+
+        With `status_message`, its text is kept in sync with the job progress.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.REPORT_JOB_TIMEOUT
+        data: dict = {}
+        shown = status_message.text if status_message else None
+        while loop.time() < deadline:
+            resp = await client.get(self._url(f"/api/report-jobs/{job_id}"))
+            if resp.status_code != 200:
+                break
+            data = resp.json()
+            if data.get("status") in ("succeeded", "failed"):
+                break
+            if status_message is not None:
+                text = self._report_progress_text(data)
+                if text != shown:
+                    try:
+                        await status_message.edit_text(text)
+                        shown = text
+                    except Exception as e:
+                        logger.warning(f"Не удалось обновить прогресс отчёта: {e}")
+            await asyncio.sleep(self.REPORT_POLL_INTERVAL)
+        return data
+
     async def view_report_callback(self, callback: CallbackQuery, state: FSMContext):
         """Sending a report file with the Main Menu button."""
         review_id = callback.data.replace(f"{self.CB_VIEW_REPORT}_", "")
+        answered = False
         try:
-            async with httpx.AsyncClient(timeout=120.0) as client:
+            async with httpx.AsyncClient(timeout=30.0) as client:
                 rep = await client.get(self._url(f"/api/reviews/{review_id}/report"))
                 if rep.status_code != 200 or not rep.json().get('file_path'):
-                    await client.post(self._url("/api/review/get_report"), data={"review_id": review_id})
+                    await callback.answer("⏳ Отчёт формируется, это может занять несколько минут")
+                    answered = True
+                    job = await client.post(self._url("/api/review/get_report"), data={"review_id": review_id})
+                    if job.status_code == 202:
+                        status_message = await callback.message.answer(self._report_progress_text(job.json()))
+                        await self._wait_report_job(client, job.json()["job_id"], status_message)
                     rep = await client.get(self._url(f"/api/reviews/{review_id}/report"))
                 if rep.status_code == 200 and rep.json().get('file_path'):
                     dl = await client.get(self._url(f"/api/reviews/{review_id}/report/download"))
@@ -497,7 +545,8 @@ class TelegramBotService:
         except Exception as e:
             logger.error(f"Ошибка при отправке отчёта: {e}")
             await callback.message.answer("❌ Произошла ошибка при получении отчёта.")
-        await callback.answer()
+        if not answered:
+            await callback.answer()
 
     async def edit_report_callback(self, callback: CallbackQuery, state: FSMContext):
         """Request to upload an edited report."""
@@ -4,50 +4,73 @@ const saveBtn = document.querySelector('#btn-save');
 const submitBtn = document.querySelector('#btn-submit');
 
 /**
- * Собирает данные из формы в формате, который ожидает новый API.
- * @returns {Array<Object>} Массив объектов-ответов.
- * Пример: [{ question_id: '...', response_text: '...', selected_option_ids: [] }]
+ * Собирает ответ одного вопроса из его блока.
+ * @param {HTMLElement} bl Блок `.q-block`.
+ * @returns {Object} { question_id, response_text, selected_option_ids }
  */
-function collectPayload() {
-  const answers = []; // ИЗМЕНЕНИЕ: Раньше был объект `data = {}`, теперь массив `answers = []`
-  
-  document.querySelectorAll('.q-block').forEach(bl => {
-    const qid = bl.dataset.qid;
-    if (!qid) return;
+function collectAnswer(bl) {
+  const answer = {
+    question_id: bl.dataset.qid,
+    response_text: null,
+    selected_option_ids: [],
+  };
 
-    // Создаем шаблон объекта ответа для этого вопроса
-    const answer = {
-      question_id: qid,
-      response_text: null,
-      selected_option_ids: [],
-    };
+  // 1. Текстовые ответы (text, textarea, range)
+  const textInput = bl.querySelector('input[type="text"], input[type="range"], textarea');
+  if (textInput) {
+    answer.response_text = textInput.value;
+  }
 
-    // 1. Ищем текстовые ответы (text, textarea, range)
-    const textInput = bl.querySelector('input[type="text"], input[type="range"], textarea');
-    if (textInput) {
-      answer.response_text = textInput.value;
-    }
+  // 2. Radio button: API ожидает массив ID, даже для radio
+  const radioInput = bl.querySelector('input[type="radio"]:checked');
+  if (radioInput) {
+    answer.selected_option_ids.push(radioInput.value);
+  }
 
-    // 2. Ищем ответ для radio button
-    const radioInput = bl.querySelector('input[type="radio"]:checked');
-    if (radioInput) {
-      // API ожидает массив ID, даже для radio
-      answer.selected_option_ids.push(radioInput.value);
-    }
+  // 3. Checkbox'ы
+  bl.querySelectorAll('input[type="checkbox"]:checked')
+    .forEach(cb => answer.selected_option_ids.push(cb.value));
 
-    // 3. Ищем ответы для checkbox'ов
-    const checkboxInputs = bl.querySelectorAll('input[type="checkbox"]:checked');
-    if (checkboxInputs.length > 0) {
-      checkboxInputs.forEach(cb => answer.selected_option_ids.push(cb.value));
-    }
-    
-    // Добавляем собранный объект ответа в общий массив
-    answers.push(answer);
+  return answer;
+}
+
+/**
+ * Собирает данные из формы в формате, который ожидает API.
+ * @returns {Array<Object>} Массив объектов-ответов.
+ * Пример: [{ question_id: '...', response_text: '...', selected_option_ids: [] }]
+ */
+function collectPayload() {
+  const answers = [];
+  document.querySelectorAll('.q-block').forEach(bl => {
+    if (bl.dataset.qid) answers.push(collectAnswer(bl));
   });
-  
   return answers;
 }
 
+/**
+ * Автосохранение одного изменённого вопроса (PATCH, буферизуется на сервере).
+ * @param {HTMLElement} bl Блок `.q-block`.
+ */
+async function patchAnswer(bl) {
+  const payload = {
+    answer: collectAnswer(bl),
+    csrf_token: decodeURIComponent(window.__CSRF__ || '')
+  };
+  try {
+    const res = await fetch(form.dataset.api, {
+      method: 'PATCH',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(payload)
+    });
+    if (!res.ok) {
+      const errorData = await res.json().catch(() => ({ detail: 'Ошибка сохранения' }));
+      console.error('Autosave error:', errorData);
+    }
+  } catch (error) {
+    console.error('Network error:', error);
+  }
+}
+
 /**
  * @param {boolean} finalize
  */
@@ -91,6 +114,8 @@ saveBtn?.addEventListener('click', (e) => {
 submitBtn?.addEventListener('click', (e) => { 
   e.preventDefault(); 
   if (form.checkValidity()) {
+    autoSaveTimeouts.forEach(clearTimeout);
+    autoSaveTimeouts.clear();
     postAnswers(true);
   } else {
     form.reportValidity();
@@ -98,10 +123,16 @@ submitBtn?.addEventListener('click', (e) => {
   }
 });
 
-let autoSaveTimeout;
-form.addEventListener('input', () => {
-  clearTimeout(autoSaveTimeout);
-  autoSaveTimeout = setTimeout(() => postAnswers(false), 600);
+// Автосохранение: отдельный таймер на каждый вопрос, отправляется только изменённый ответ
+const autoSaveTimeouts = new Map();
+form.addEventListener('input', (e) => {
+  const bl = e.target.closest('.q-block');
+  if (!bl || !bl.dataset.qid) return;
+  clearTimeout(autoSaveTimeouts.get(bl.dataset.qid));
+  autoSaveTimeouts.set(bl.dataset.qid, setTimeout(() => {
+    autoSaveTimeouts.delete(bl.dataset.qid);
+    patchAnswer(bl);
+  }, 600));
 });
 
 document.querySelectorAll('input[type=range]').forEach(r => {
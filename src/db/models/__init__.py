@@ -4,4 +4,7 @@ from .question_bank import QuestionBlock, QuestionTemplate, QuestionTemplateOpti
 from .survey import Survey, SurveyStatus
 from .answer import Answer, AnswerSelection
 from .report import Report
+from .report_job import ReportJob, ReportJobKind, ReportJobStatus
+from .survey_digest import SurveyDigest
+from .single_flight import SingleFlightLock
 from .user import User
\ No newline at end of file
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, Text, ForeignKey, PrimaryKeyConstraint
+from sqlalchemy import String, Text, Float, ForeignKey, PrimaryKeyConstraint
 from src.db import Base
 import uuid
 
@@ -17,6 +17,7 @@ class Answer(Base):
     survey_id: Mapped[str] = mapped_column(String, ForeignKey("surveys.survey_id"), nullable=False, index=True)
 
     response_text: Mapped[str | None] = mapped_column(Text, nullable=True)
+    numeric_value: Mapped[float | None] = mapped_column(Float, nullable=True, index=True)
 
     question = relationship("Question", back_populates="answers")
     survey = relationship("Survey", back_populates="answers")
@@ -17,5 +17,14 @@ class Report(Base):
     analytics_for_reviewers: Mapped[str | None] = mapped_column(Text, nullable=True)
     recommendations: Mapped[str | None] = mapped_column(Text, nullable=True)
     file_path: Mapped[str | None] = mapped_column(String, nullable=True)
+    # "two_call" or "combined"; None uses settings.LLM_EXTRACTION_MODE
+    extraction_mode: Mapped[str | None] = mapped_column(String, nullable=True)
+    # structured LLM output of the last generation, for incremental updates
+    sides_json: Mapped[str | None] = mapped_column(Text, nullable=True)
+    recommendations_json: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # JSON {survey_id: {"label": reviewer label, "hash": hash of the feedback text}}
+    covered_surveys: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # hash of the model, prompt and extraction mode the output was made with
+    llm_config_hash: Mapped[str | None] = mapped_column(String, nullable=True)
 
     review = relationship("Review", back_populates="report")
\ No newline at end of file
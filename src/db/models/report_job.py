@@ -0,0 +1,51 @@
+# db/models/report_job.py
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import String, Text, DateTime, Enum, ForeignKey, Integer, BigInteger, func
+from src.db import Base
+import enum
+import uuid
+
+
+class ReportJobStatus(str, enum.Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+
+class ReportJobKind(str, enum.Enum):
+    report = "report"
+    survey_digest = "survey_digest"
+
+
+class ReportJob(Base):
+    __tablename__ = "report_jobs"
+
+    job_id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    review_id: Mapped[str] = mapped_column(String, ForeignKey("reviews.review_id"), nullable=False, index=True)
+    # a ReportJobKind value; a plain string so the column can be added to an existing table
+    # (NULL on rows created before job kinds existed means `report`)
+    kind: Mapped[str | None] = mapped_column(String, default=ReportJobKind.report.value, nullable=True)
+    survey_id: Mapped[str | None] = mapped_column(String, ForeignKey("surveys.survey_id"), nullable=True)
+    status: Mapped[ReportJobStatus] = mapped_column(Enum(ReportJobStatus), default=ReportJobStatus.queued, nullable=False, index=True)
+    # hash of the answers, prompt and model the report is computed from
+    answers_version: Mapped[str | None] = mapped_column(String, nullable=True)
+    # "<review_id>:<answers_version>" while queued/running, NULL once finished;
+    # the unique constraint makes concurrent identical requests share one job
+    active_key: Mapped[str | None] = mapped_column(String, unique=True, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    next_attempt_at: Mapped["DateTime | None"] = mapped_column(DateTime(timezone=True), nullable=True)
+    lease_until: Mapped["DateTime | None"] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    result_path: Mapped[str | None] = mapped_column(String, nullable=True)
+    # live progress of the running attempt: stage, sides parsed so far, tokens received
+    progress_stage: Mapped[str | None] = mapped_column(String, nullable=True)
+    progress_sides: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    progress_tokens: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    notify_chat_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    delivered_at: Mapped["DateTime | None"] = mapped_column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    started_at: Mapped["DateTime | None"] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped["DateTime | None"] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    review = relationship("Review")
@@ -0,0 +1,13 @@
+# db/models/single_flight.py
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, DateTime, func
+from src.db import Base
+
+
+class SingleFlightLock(Base):
+    __tablename__ = "single_flight_locks"
+
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    owner: Mapped[str] = mapped_column(String, nullable=False)
+    expires_at: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), nullable=False)
+    acquired_at: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), server_default=func.now())
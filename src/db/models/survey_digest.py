@@ -0,0 +1,19 @@
+# db/models/survey_digest.py
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, Text, DateTime, ForeignKey, func
+from src.db import Base
+import uuid
+
+
+class SurveyDigest(Base):
+    __tablename__ = "survey_digests"
+
+    digest_id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    survey_id: Mapped[str] = mapped_column(String, ForeignKey("surveys.survey_id"), unique=True, nullable=False)
+    review_id: Mapped[str] = mapped_column(String, ForeignKey("reviews.review_id"), nullable=False, index=True)
+    # hash of the survey feedback text the digest was made from; a mismatch means the answers changed
+    source_hash: Mapped[str] = mapped_column(String, nullable=False)
+    content: Mapped[str] = mapped_column(Text, nullable=False)  # FeedbackDigest JSON
+    model_name: Mapped[str | None] = mapped_column(String, nullable=True)
+    created_at: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped["DateTime | None"] = mapped_column(DateTime(timezone=True), nullable=True)
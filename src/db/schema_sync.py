@@ -0,0 +1,84 @@
+"""Add columns introduced by newer models to an existing database.
+
+`Base.metadata.create_all` creates missing tables but never alters existing
+ones. New nullable columns (and their indexes) are added here so a deployed
+database keeps working after an update without being recreated. Unique
+columns also get a unique index, which SQLite cannot add as a constraint
+to an existing table but enforces the same way.
+"""
+# db/schema_sync.py
+from sqlalchemy import Engine, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from src.db import Base
+
+
+def add_missing_columns(engine: Engine) -> list[str]:
+    """Add nullable model columns missing from existing tables.
+
+    Args:
+        engine: The engine of the database to update.
+
+    Returns:
+        list[str]: "table.column" of every added column. Non-nullable
+            columns are never added (they need a data migration).
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        columns = {c["name"] for c in inspector.get_columns(table.name)}
+        missing = [c for c in table.columns if c.name not in columns and c.nullable]
+        if not missing:
+            continue
+        with engine.begin() as conn:
+            for column in missing:
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                added.append(f"{table.name}.{column.name}")
+        names = {c.name for c in missing}
+        for index in table.indexes:
+            if names & {c.name for c in index.columns}:
+                index.create(bind=engine, checkfirst=True)
+    return added
+
+
+def add_missing_unique_indexes(engine: Engine) -> list[str]:
+    """Create a unique index for every `unique=True` column of an existing table that lacks one.
+
+    Covers columns added by `add_missing_columns` (an added column loses its
+    UNIQUE constraint) and databases upgraded before the index was created
+    here. Rows with NULL in the column do not conflict.
+
+    Args:
+        engine: The engine of the database to update.
+
+    Returns:
+        list[str]: "table.column" of every column that got a unique index.
+
+    Errors:
+        RuntimeError: The column already holds duplicate values.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        unique_sets = [set(c["column_names"]) for c in inspector.get_unique_constraints(table.name)]
+        unique_sets += [set(i["column_names"]) for i in inspector.get_indexes(table.name) if i.get("unique")]
+        for column in table.columns:
+            if not column.unique or column.primary_key or {column.name} in unique_sets:
+                continue
+            name = f"uq_{table.name}_{column.name}"
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table.name} ({column.name})"))
+            except IntegrityError as e:
+                raise RuntimeError(
+                    f"Cannot create unique index {name}: {table.name}.{column.name} has duplicate values"
+                ) from e
+            added.append(f"{table.name}.{column.name}")
+    return added
@@ -0,0 +1,114 @@
+"""Content-addressed on-disk cache of structured LLM completions.
+
+The key is a hash of the provider, model name, messages and the JSON schema
+of the response model, so re-running a report over unchanged answers (or a
+retry after a render failure) does not call the provider again. Entries
+expire after a TTL and the least recently used ones are evicted once the
+cache holds more than `max_entries`.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class CompletionCache:
+    """SQLite-backed LRU cache with TTL and hit/miss counters."""
+
+    def __init__(self, path: str | Path, ttl_seconds: Optional[float] = 7 * 24 * 3600, max_entries: int = 1000):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_completions_last_used ON completions (last_used_at)")
+
+    @staticmethod
+    def make_key(log: list, model_name: str, pydantic_model: type[BaseModel], provider_name: str) -> str:
+        """Hash everything that determines the completion.
+
+        Args:
+            log: Chat messages.
+            model_name: The model name.
+            pydantic_model: The structured output model.
+            provider_name: The provider; it decides the type of the returned value.
+
+        Returns:
+            str: Hex SHA-256 digest.
+        """
+        payload = json.dumps(
+            {
+                "provider": provider_name,
+                "model": model_name,
+                "messages": log,
+                "schema_name": pydantic_model.__name__,
+                "schema": pydantic_model.model_json_schema(),
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached raw completion and refresh its LRU position, or None."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE completions SET last_used_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        """Store a raw completion and evict expired and least recently used entries."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, value, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            if self.ttl_seconds is not None:
+                self._conn.execute("DELETE FROM completions WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._conn.execute(
+                "DELETE FROM completions WHERE key IN ("
+                " SELECT key FROM completions ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM completions")
+
+    def stats(self) -> dict:
+        """Hit/miss counters of this process and the number of stored entries."""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": size,
+        }
@@ -0,0 +1,309 @@
+"""Fake OpenAI-compatible LLM server for offline load and latency testing.
+
+Serves `POST /v1/chat/completions` the way the providers do for
+`chat.completions.create` and `beta.chat.completions.parse`: with a
+`json_schema` response format it answers with a random instance of the
+schema (so `Sides`, `Recommendations` or any other model validates), without
+one with plain text. Latency, error rates, token usage and streaming are
+configurable, so report throughput can be measured without a network:
+
+    python -m src.llm_agg.fake_server --port 9001 --latency-mean 0.8 --error-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:9001/v1 uvicorn src.app.main:app
+
+`FakeServerThread` runs one in the background of a script or benchmark.
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Literal, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from src.llm_agg.usage import estimate_tokens
+
+WORDS = (
+    "пишет понятные SQL запросы быстро разбирается в задачах помогает коллегам "
+    "иногда срывает сроки хорошо знает предметную область аккуратно ведёт документацию "
+    "редко задаёт вопросы берёт ответственность за результат предлагает улучшения процесса"
+).split()
+
+
+@dataclass
+class FakeLLMConfig:
+    latency: Literal["fixed", "uniform", "lognormal"] = "lognormal"
+    latency_mean: float = 0.5  # seconds before the first token
+    latency_sigma: float = 0.3  # lognormal sigma / half-width of the uniform range
+    per_token_s: float = 0.0  # added per completion token (the pace of a stream)
+    error_rate: float = 0.0  # share of 500 answers
+    rate_limit_rate: float = 0.0  # share of 429 answers
+    hang_rate: float = 0.0  # share of requests that do not answer for `hang_s`
+    hang_s: float = 600.0
+    cached_ratio: float = 0.0  # share of prompt tokens reported as cached
+    reviewers: int = 5  # proofs get markers [R1]..[R<reviewers>]
+    max_items: int = 5  # upper bound of generated array lengths
+    stream_chunk_chars: int = 12
+    seed: Optional[int] = None
+
+
+@dataclass
+class FakeServerStats:
+    requests: int = 0
+    streamed: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    hung: int = 0
+    by_schema: dict[str, int] = field(default_factory=dict)
+
+
+def _resolve(schema: dict, root: dict) -> dict:
+    while "$ref" in schema:
+        schema = root["$defs"][schema["$ref"].rsplit("/", 1)[-1]]
+    return schema
+
+
+def _text(rng: random.Random, name: str, config: FakeLLMConfig, max_len: Optional[int]) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12)))
+    if name.startswith("proof"):
+        text = f"[R{rng.randint(1, config.reviewers)}] {text}"
+    return text[:max_len].rstrip() if max_len else text
+
+
+def sample_instance(
+    schema: dict, rng: random.Random, config: FakeLLMConfig, root: Optional[dict] = None, name: str = ""
+) -> Any:
+    """A random instance of a JSON schema as pydantic emits it (refs, unions, consts, bounds)."""
+    root = root if root is not None else schema
+    schema = _resolve(schema, root)
+    if "const" in schema:
+        return schema["const"]
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    for union in ("anyOf", "oneOf"):
+        if union in schema:
+            options = [o for o in schema[union] if _resolve(o, root).get("type") != "null"] or schema[union]
+            return sample_instance(rng.choice(options), rng, config, root, name)
+
+    kind = schema.get("type", "object")
+    if isinstance(kind, list):
+        kind = next((k for k in kind if k != "null"), "null")
+    if kind == "object":
+        return {
+            key: sample_instance(sub, rng, config, root, key)
+            for key, sub in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        low = schema.get("minItems", 0)
+        high = max(low, min(schema.get("maxItems", config.max_items), config.max_items))
+        count = rng.randint(min(max(low, 1), high), high)
+        return [sample_instance(schema.get("items", {}), rng, config, root, name) for _ in range(count)]
+    if kind == "string":
+        return _text(rng, name, config, schema.get("maxLength"))
+    if kind == "integer":
+        low = schema.get("minimum", schema.get("exclusiveMinimum", -1) + 1)
+        return rng.randint(low, min(schema.get("maximum", low + 4), low + 4))
+    if kind == "number":
+        return round(rng.uniform(schema.get("minimum", 0.0), schema.get("maximum", 10.0)), 2)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    return None
+
+
+def _prompt_text(messages: list[dict]) -> str:
+    parts = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            content = "".join(p.get("text", "") for p in content if isinstance(p, dict))
+        parts.append(content or "")
+    return "".join(parts)
+
+
+def _error(status: int, message: str, kind: str) -> JSONResponse:
+    return JSONResponse(status_code=status, content={"error": {"message": message, "type": kind, "code": status}})
+
+
+def create_app(config: Optional[FakeLLMConfig] = None) -> FastAPI:
+    """The fake provider app; `app.state.stats` counts what it served."""
+    config = config or FakeLLMConfig()
+    app = FastAPI(title="Fake LLM")
+    rng = random.Random(config.seed)
+    stats = FakeServerStats()
+    app.state.stats = stats
+    app.state.config = config
+
+    def _latency() -> float:
+        if config.latency == "fixed":
+            return config.latency_mean
+        if config.latency == "uniform":
+            return max(0.0, rng.uniform(config.latency_mean - config.latency_sigma, config.latency_mean + config.latency_sigma))
+        # lognormal with the given mean
+        mu = -config.latency_sigma ** 2 / 2
+        return config.latency_mean * rng.lognormvariate(mu, config.latency_sigma)
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "fake"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return {"config": asdict(config), "stats": asdict(stats)}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats.requests += 1
+        roll = rng.random()
+        if roll < config.hang_rate:
+            stats.hung += 1
+            await asyncio.sleep(config.hang_s)
+        elif roll < config.hang_rate + config.error_rate:
+            stats.errors += 1
+            await asyncio.sleep(_latency())
+            return _error(500, "Fake server error", "server_error")
+        elif roll < config.hang_rate + config.error_rate + config.rate_limit_rate:
+            stats.rate_limited += 1
+            return _error(429, "Fake rate limit", "rate_limit_exceeded")
+
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            json_schema = response_format["json_schema"]
+            schema_name = json_schema.get("name", "schema")
+            content = json.dumps(sample_instance(json_schema["schema"], rng, config), ensure_ascii=False)
+        else:
+            schema_name = "text"
+            content = " ".join(rng.choice(WORDS) for _ in range(20))
+        stats.by_schema[schema_name] = stats.by_schema.get(schema_name, 0) + 1
+
+        prompt_tokens = estimate_tokens(_prompt_text(body.get("messages", [])))
+        completion_tokens = estimate_tokens(content)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": int(prompt_tokens * config.cached_ratio)},
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        model = body.get("model", "fake")
+        first_token = _latency()
+
+        if body.get("stream"):
+            stats.streamed += 1
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+            return StreamingResponse(
+                _stream(content, usage if include_usage else None, completion_id, created, model, first_token),
+                media_type="text/event-stream",
+            )
+
+        await asyncio.sleep(first_token + completion_tokens * config.per_token_s)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content, "refusal": None},
+                "finish_reason": "stop",
+                "logprobs": None,
+            }],
+            "usage": usage,
+        }
+
+    async def _stream(content, usage, completion_id, created, model, first_token):
+        def chunk(delta: dict, finish_reason=None, choices=True, **extra) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if choices else [],
+                **extra,
+            }
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        await asyncio.sleep(first_token)
+        yield chunk({"role": "assistant", "content": ""})
+        step = max(1, config.stream_chunk_chars)
+        for start in range(0, len(content), step):
+            piece = content[start:start + step]
+            if config.per_token_s:
+                await asyncio.sleep(estimate_tokens(piece) * config.per_token_s)
+            yield chunk({"content": piece})
+        yield chunk({}, finish_reason="stop")
+        if usage is not None:
+            yield chunk({}, choices=False, usage=usage)
+        yield "data: [DONE]\n\n"
+
+    return app
+
+
+class FakeServerThread:
+    """A fake server on a background thread (port 0 picks a free port).
+
+    Usage:
+        with FakeServerThread(FakeLLMConfig(latency_mean=0.2)) as server:
+            client = AsyncOpenAI(base_url=server.base_url, api_key="fake")
+    """
+
+    def __init__(self, config: Optional[FakeLLMConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.app = create_app(config)
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self.host = host
+        self.port = port
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    @property
+    def stats(self) -> FakeServerStats:
+        return self.app.state.stats
+
+    def start(self) -> "FakeServerThread":
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("Fake LLM server did not start")
+            time.sleep(0.01)
+        self.port = self._server.servers[0].sockets[0].getsockname()[1]
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=10)
+
+    def __enter__(self) -> "FakeServerThread":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001)
+    defaults = FakeLLMConfig()
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default=defaults.latency)
+    for name in ("latency_mean", "latency_sigma", "per_token_s", "error_rate", "rate_limit_rate",
+                 "hang_rate", "hang_s", "cached_ratio"):
+        parser.add_argument(f"--{name.replace('_', '-')}", type=float, default=getattr(defaults, name))
+    for name in ("reviewers", "max_items", "stream_chunk_chars", "seed"):
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=getattr(defaults, name))
+    args = vars(parser.parse_args())
+    host, port = args.pop("host"), args.pop("port")
+    uvicorn.run(create_app(FakeLLMConfig(**args)), host=host, port=port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Assembly of the feedback text of the extraction prompt.
+
+Rendering every reviewer as "question: answer" lines repeats each question
+text once per reviewer, which on large reviews is most of the prompt. Here
+answers are grouped by question instead: every question is written once,
+followed by the answers of all reviewers, each starting with the reviewer
+marker the prompt asks to quote ([R1], [R2], ... or the full name). Empty
+and repeated answers are dropped. With a token budget, the longest answers
+are shortened (all to the same length) until the text fits.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+from src.llm_agg.map_reduce import ReviewerFeedback, estimate_tokens, render_feedback
+
+QUESTION_HEADER = "Question: {question}\n"
+DIGEST_HEADER = "Condensed feedback:\n"
+ELLIPSIS = "…"
+MIN_ANSWER_CHARS = 80
+
+
+@dataclass
+class AssembledFeedback:
+    text: str
+    tokens: int
+    baseline_tokens: int  # the same feedback rendered per reviewer (`render_feedback`)
+    answers: int
+    dropped_answers: int = 0  # empty or repeated
+    shortened_answers: int = 0  # cut to fit the budget
+    over_budget: bool = False  # does not fit even with every answer at `MIN_ANSWER_CHARS`
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.baseline_tokens - self.tokens
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _group(blocks: list[ReviewerFeedback]) -> tuple[dict[str, list[tuple[str, str]]], list[str], int]:
+    """Answers by question in first-seen order, digest lines, and the number of dropped answers."""
+    questions: dict[str, list[tuple[str, str]]] = {}
+    digests: list[str] = []
+    seen: set[tuple[str, str, str]] = set()
+    dropped = 0
+    for block in blocks:
+        if not block.answers:
+            # a digest: its lines already carry the marker
+            if block.text.strip():
+                digests.append(block.text.strip())
+            continue
+        for question, answer in block.answers:
+            answer = _normalize(answer)
+            key = (question, block.marker, answer.lower())
+            if not answer or key in seen:
+                dropped += 1
+                continue
+            seen.add(key)
+            questions.setdefault(question, []).append((block.marker, answer))
+    return questions, digests, dropped
+
+
+def _render(questions: dict[str, list[tuple[str, str]]], digests: list[str], cap: Optional[int]) -> tuple[str, int]:
+    parts = []
+    shortened = 0
+    for question, answers in questions.items():
+        parts.append(QUESTION_HEADER.format(question=_normalize(question)))
+        for marker, answer in answers:
+            if cap is not None and len(answer) > cap:
+                answer = answer[:cap].rstrip() + ELLIPSIS
+                shortened += 1
+            parts.append(f"[{marker}] {answer}\n")
+        parts.append("\n")
+    if digests:
+        parts.append(DIGEST_HEADER)
+        parts.extend(f"{lines}\n" for lines in digests)
+    return "".join(parts), shortened
+
+
+def assemble_feedback(blocks: list[ReviewerFeedback], token_budget: Optional[int] = None) -> AssembledFeedback:
+    """Render the feedback of reviewers grouped by question.
+
+    Args:
+        blocks: Per-reviewer feedback; blocks without `answers` (digests)
+            are appended as they are.
+        token_budget: Optional maximum of estimated tokens; the longest
+            answers are shortened to fit.
+
+    Returns:
+        AssembledFeedback: The text with its token estimate and the
+            estimate of the per-reviewer rendering it replaces.
+    """
+    questions, digests, dropped = _group(blocks)
+    text, shortened = _render(questions, digests, None)
+    over_budget = False
+
+    if token_budget is not None and estimate_tokens(text) > token_budget:
+        longest = max((len(a) for answers in questions.values() for _, a in answers), default=0)
+        # the largest common answer length that fits
+        low, high = MIN_ANSWER_CHARS, longest
+        while low < high:
+            cap = (low + high + 1) // 2
+            if estimate_tokens(_render(questions, digests, cap)[0]) <= token_budget:
+                low = cap
+            else:
+                high = cap - 1
+        text, shortened = _render(questions, digests, low)
+        over_budget = estimate_tokens(text) > token_budget
+
+    return AssembledFeedback(
+        text=text,
+        tokens=estimate_tokens(text),
+        baseline_tokens=estimate_tokens(render_feedback(blocks)),
+        answers=sum(len(answers) for answers in questions.values()),
+        dropped_answers=dropped,
+        shortened_answers=shortened,
+        over_budget=over_budget,
+    )
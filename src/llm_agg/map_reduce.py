@@ -0,0 +1,291 @@
+"""Chunked (map-reduce) extraction of strong and weak sides.
+
+Large reviews do not fit one `SIDES_EXTRACTING_PROMPT` call. Reviewers are
+packed into groups under a token budget, every group is processed by a
+separate structured call (map, in parallel with bounded concurrency) and the
+partial `Sides` are merged deterministically (reduce): items are grouped by a
+canonical `side_description`, quotes are deduplicated and respondent counts
+are recounted from the reviewer markers of the proofs. Only when the merged
+result still contains near-duplicate subjects is a final LLM consolidation
+pass made.
+"""
+import asyncio
+import json
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Literal, Optional
+
+from openai import AsyncOpenAI
+
+from src.llm_agg.cache import CompletionCache
+from src.llm_agg.policy import ResilientCompleter
+from src.llm_agg.prompts import SIDES_CONSOLIDATION_PROMPT
+from src.llm_agg.response import CompletionResult, get_so_completion
+from src.llm_agg.schemas.sides import AmbiguousSide, Side, Sides
+from src.llm_agg.usage import TokenUsage, UsageTracker, estimate_tokens
+
+MARKER_RE = re.compile(r"^\s*\[([^\]]+)\]")
+REVIEWER_RE = re.compile(r"^(?:reviewer|r)\s*(\d+)$", re.IGNORECASE)
+WORD_RE = re.compile(r"\w+")
+
+SUMMARY_MAX_LEN = 120
+NEAR_DUPLICATE_JACCARD = 0.6
+
+
+@dataclass
+class ReviewerFeedback:
+    """Feedback of one reviewer, rendered as one block of the prompt."""
+    label: str
+    text: str
+    survey_id: Optional[str] = None
+    # (question, answer) pairs behind `text`; empty if `text` is a digest
+    answers: list[tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def marker(self) -> str:
+        """The marker of this reviewer's proofs: "R3" for "Reviewer 3", else the label."""
+        numbered = REVIEWER_RE.match(self.label)
+        return f"R{int(numbered.group(1))}" if numbered else self.label
+
+    def render(self) -> str:
+        return f"Feedback from {self.label}: \n{self.text}\n"
+
+
+def render_feedback(blocks: list[ReviewerFeedback]) -> str:
+    return "".join(block.render() for block in blocks)
+
+
+def chunk_feedback(blocks: list[ReviewerFeedback], max_tokens: int) -> list[list[ReviewerFeedback]]:
+    """Pack whole reviewers into groups of at most `max_tokens` (a larger reviewer gets its own group)."""
+    chunks: list[list[ReviewerFeedback]] = []
+    current: list[ReviewerFeedback] = []
+    size = 0
+    for block in blocks:
+        tokens = estimate_tokens(block.render())
+        if current and size + tokens > max_tokens:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(block)
+        size += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def canonical_subject(description: str) -> str:
+    """Normalize a side description for grouping: case, ё, punctuation and spacing."""
+    words = WORD_RE.findall(description.lower().replace("ё", "е"))
+    return " ".join(words)
+
+
+def reviewer_marker(proof: str) -> Optional[str]:
+    """The normalized reviewer marker a proof starts with: "R3" for [R3]/[Reviewer 3], else the name."""
+    match = MARKER_RE.match(proof)
+    if not match:
+        return None
+    marker = " ".join(match.group(1).split())
+    numbered = REVIEWER_RE.match(marker)
+    if numbered:
+        return f"R{int(numbered.group(1))}"
+    return marker.lower()
+
+
+def _unique(items: list[str]) -> list[str]:
+    seen: set[str] = set()
+    out = []
+    for item in items:
+        key = " ".join(item.split())
+        if key not in seen:
+            seen.add(key)
+            out.append(item)
+    return out
+
+
+def _count(proofs: list[str], fallback: int) -> int:
+    markers = {m for m in map(reviewer_marker, proofs) if m}
+    return len(markers) if markers else max(fallback, 1)
+
+
+@dataclass
+class _Group:
+    description: str
+    explanations: list[str]
+    strong: list[str]
+    weak: list[str]
+    strong_hint: int = 0
+    weak_hint: int = 0
+
+
+def _proof_count(sides: Sides) -> int:
+    return sum(
+        len(s.proofs_strong) + len(s.proofs_weak) if isinstance(s, AmbiguousSide) else len(s.proofs)
+        for s in sides.sides
+    )
+
+
+def reduce_sides(partials: list[Sides]) -> Sides:
+    """Merge partial results by canonical subject and recount respondents from proof markers.
+
+    Args:
+        partials: Per-chunk extraction results.
+
+    Returns:
+        Sides: One item per subject; a subject with both strong and weak
+            proofs becomes an `AmbiguousSide`.
+    """
+    groups: dict[str, _Group] = {}
+    for partial in partials:
+        for item in partial.sides:
+            key = canonical_subject(item.side_description)
+            group = groups.setdefault(key, _Group(item.side_description, [], [], []))
+            group.explanations.append(item.side_pick_explanation)
+            if isinstance(item, AmbiguousSide):
+                group.strong.extend(item.proofs_strong)
+                group.weak.extend(item.proofs_weak)
+                group.strong_hint = max(group.strong_hint, item.strong_count)
+                group.weak_hint = max(group.weak_hint, item.weak_count)
+            elif item.side == "strong":
+                group.strong.extend(item.proofs)
+                group.strong_hint = max(group.strong_hint, item.respondents_count)
+            else:
+                group.weak.extend(item.proofs)
+                group.weak_hint = max(group.weak_hint, item.respondents_count)
+
+    sides = []
+    for group in groups.values():
+        strong, weak = _unique(group.strong), _unique(group.weak)
+        explanation = " ".join(_unique(group.explanations))
+        if strong and weak:
+            sides.append(AmbiguousSide(
+                side_description=group.description,
+                side_pick_explanation=explanation,
+                strong_count=_count(strong, group.strong_hint),
+                weak_count=_count(weak, group.weak_hint),
+                proofs_strong=strong,
+                proofs_weak=weak,
+            ))
+        elif strong or weak:
+            proofs = strong or weak
+            sides.append(Side(
+                side="strong" if strong else "weak",
+                side_description=group.description,
+                side_pick_explanation=explanation,
+                respondents_count=_count(proofs, group.strong_hint if strong else group.weak_hint),
+                proofs=proofs,
+            ))
+
+    # the summary of the partial that saw the most evidence represents the whole best
+    richest = max(partials, key=_proof_count)
+    return Sides(sides=sides, summary=richest.summary[:SUMMARY_MAX_LEN])
+
+
+def recount_sides(sides: Sides) -> Sides:
+    """Make respondent counts equal the number of unique reviewer markers in the proofs."""
+    items = []
+    for item in sides.sides:
+        if isinstance(item, AmbiguousSide):
+            item = item.model_copy(update={
+                "strong_count": _count(item.proofs_strong, item.strong_count),
+                "weak_count": _count(item.proofs_weak, item.weak_count),
+            })
+        else:
+            item = item.model_copy(update={"respondents_count": _count(item.proofs, item.respondents_count)})
+        items.append(item)
+    return Sides(sides=items, summary=sides.summary[:SUMMARY_MAX_LEN])
+
+
+def needs_consolidation(sides: Sides) -> bool:
+    """True if two subjects look like paraphrases the deterministic reducer could not merge."""
+    word_sets = [set(canonical_subject(s.side_description).split()) for s in sides.sides]
+    for i, a in enumerate(word_sets):
+        for b in word_sets[i + 1:]:
+            if a and b and len(a & b) / len(a | b) >= NEAR_DUPLICATE_JACCARD:
+                return True
+    return False
+
+
+async def extract_sides_map_reduce(
+    blocks: list[ReviewerFeedback],
+    build_messages: Callable[[str], list[dict]],
+    model_name: str,
+    client: AsyncOpenAI,
+    provider_name: Literal['openai', 'openrouter', 'local'],
+    system_prompt: Optional[str] = None,
+    chunk_tokens: int = 6000,
+    concurrency: int = 4,
+    cache: Optional[CompletionCache] = None,
+    usage_tracker: Optional[UsageTracker] = None,
+    completer: Optional[ResilientCompleter] = None,
+    render: Callable[[list[ReviewerFeedback]], str] = render_feedback,
+) -> CompletionResult[Sides]:
+    """Extract sides from reviewer groups in parallel and merge the results.
+
+    Args:
+        blocks: Per-reviewer feedback with globally unique labels.
+        build_messages: Builds the extraction request for rendered feedback
+            (e.g. `PromptLayout.messages` over `sides_variable_part`).
+        model_name: The model name.
+        client: The OpenAI-compatible client.
+        provider_name: The provider, as for `get_so_completion`.
+        system_prompt: Optional system message of the consolidation request.
+        chunk_tokens: Token budget of one group of reviewers.
+        concurrency: Maximum number of simultaneous map calls.
+        cache: Optional completion cache.
+        usage_tracker: Optional recorder of token usage per call.
+        completer: Optional call policy; when given, calls go through it
+            instead of `client`/`provider_name`.
+        render: Renders the feedback of a group (e.g. `assemble_feedback`).
+
+    Returns:
+        CompletionResult: The merged `Sides` with the summed usage of all calls,
+            the same type a single extraction call returns.
+    """
+    slots = asyncio.Semaphore(concurrency)
+    results: list[CompletionResult] = []
+    started = time.perf_counter()
+
+    async def _complete(log: list[dict]) -> Sides:
+        async with slots:
+            if completer is not None:
+                result = await completer.get_so_completion(
+                    log, Sides, cache=cache, usage_tracker=usage_tracker
+                )
+            else:
+                result = await get_so_completion(
+                    log=log,
+                    model_name=model_name,
+                    client=client,
+                    pydantic_model=Sides,
+                    provider_name=provider_name,
+                    cache=cache,
+                    usage_tracker=usage_tracker,
+                )
+        results.append(result)
+        return result.parsed
+
+    chunks = chunk_feedback(blocks, chunk_tokens)
+    partials = await asyncio.gather(*(_complete(build_messages(render(chunk))) for chunk in chunks))
+    merged = reduce_sides(list(partials))
+
+    if needs_consolidation(merged):
+        log = [{"role": "system", "content": system_prompt}] if system_prompt else []
+        log.append({"role": "user", "content": SIDES_CONSOLIDATION_PROMPT.format(
+            sides=json.dumps(merged.model_dump(), ensure_ascii=False, indent=2)
+        )})
+        consolidated = await _complete(log)
+        merged = recount_sides(consolidated)
+
+    raw = merged.model_dump_json()
+    return CompletionResult(
+        raw=raw,
+        parsed=merged,
+        usage=TokenUsage(
+            prompt_tokens=sum(r.usage.prompt_tokens for r in results),
+            cached_tokens=sum(r.usage.cached_tokens for r in results),
+            completion_tokens=sum(r.usage.completion_tokens for r in results),
+        ),
+        latency_s=time.perf_counter() - started,
+        model_name=model_name,
+        cached=all(r.cached for r in results),
+    )
@@ -0,0 +1,348 @@
+"""Call policy of structured completions: deadlines, retries, hedging and failover.
+
+Every attempt runs under a deadline. Transient failures (timeouts, connection
+errors, 429/5xx, malformed output) are retried with exponential backoff and
+full jitter. Once an endpoint has enough latency samples, an attempt that is
+still running after the observed p95 gets a hedged duplicate and the first
+answer wins. Each endpoint has a circuit breaker: after consecutive failures
+it is skipped and the next endpoint (e.g. `openrouter` -> `local`) is used
+until the breaker lets a probe through again. With routes (`ranked`), the
+order is chosen per request by `llm_agg.routing` (prompt size, free
+concurrency slots, cost, recent latency); otherwise the endpoints are tried
+in the configured order, so a fallback only answers when the primary fails.
+"""
+import asyncio
+import contextlib
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Literal, Optional
+
+import openai
+from openai import AsyncOpenAI
+from pydantic import ValidationError
+
+from src.llm_agg.cache import CompletionCache
+from src.llm_agg.prompts.builder import plain_messages
+from src.llm_agg.response import CompletionResult, ModelT, get_so_completion
+from src.llm_agg.routing import RouteLoad, prompt_tokens, rank_routes
+from src.llm_agg.streaming import ProgressCallback, stream_so_completion
+from src.llm_agg.usage import UsageTracker
+
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+    ValidationError,
+)
+
+LATENCY_WINDOW = 200
+
+
+class LLMUnavailableError(RuntimeError):
+    """Every endpoint failed or has an open circuit breaker."""
+
+
+class BreakerState(str, Enum):
+    closed = "closed"
+    open = "open"
+    half_open = "half_open"
+
+
+@dataclass(frozen=True)
+class CallPolicy:
+    attempt_timeout: float = 120.0  # seconds per attempt
+    max_attempts: int = 3  # per endpoint
+    backoff_base: float = 1.0
+    backoff_max: float = 20.0
+    hedge: bool = True
+    hedge_min_delay: float = 5.0  # never hedge sooner, whatever the p95
+    hedge_min_samples: int = 20  # latencies needed before the p95 is trusted
+    breaker_failures: int = 5  # consecutive failures that open the breaker
+    breaker_reset: float = 60.0  # seconds before an open breaker lets a probe through
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retry number `attempt` (0-based)."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+
+@dataclass
+class CircuitBreaker:
+    failure_threshold: int = 5
+    reset_after: float = 60.0
+    state: BreakerState = BreakerState.closed
+    failures: int = 0
+    opened_at: float = 0.0
+
+    def allow(self) -> bool:
+        if self.state is BreakerState.open and time.monotonic() - self.opened_at >= self.reset_after:
+            self.state = BreakerState.half_open
+        return self.state is not BreakerState.open
+
+    def record_success(self) -> None:
+        self.state = BreakerState.closed
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state is BreakerState.half_open or self.failures >= self.failure_threshold:
+            self.state = BreakerState.open
+            self.opened_at = time.monotonic()
+
+
+@dataclass
+class ProviderMetrics:
+    attempts: int = 0
+    successes: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    hedges: int = 0
+    hedges_won: int = 0
+    failovers: int = 0  # requests this endpoint served after another one failed
+    latencies: deque = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+
+    def p95(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+@dataclass
+class LLMEndpoint:
+    """An OpenAI-compatible endpoint, the model served by it and its routing limits."""
+    provider_name: Literal['openai', 'openrouter', 'local']
+    client: AsyncOpenAI
+    model_name: str
+    name: str = ""  # the key of its metrics; the provider name by default
+    max_prompt_tokens: int = 0  # 0: no limit
+    max_concurrency: int = 0  # 0: no limit
+    cost_per_1k_tokens: float = 0.0
+    cache_hints: bool = False  # keep `cache_control` content parts; otherwise they are sent as plain strings
+
+    def __post_init__(self):
+        if not self.name:
+            self.name = self.provider_name
+
+
+@dataclass
+class _EndpointState:
+    endpoint: LLMEndpoint
+    breaker: CircuitBreaker
+    metrics: ProviderMetrics = field(default_factory=ProviderMetrics)
+    load: RouteLoad = field(default_factory=RouteLoad)
+    slots: Optional[asyncio.Semaphore] = None
+
+    def __post_init__(self):
+        if self.endpoint.max_concurrency:
+            self.slots = asyncio.Semaphore(self.endpoint.max_concurrency)
+
+
+class ResilientCompleter:
+    """Structured completions over routed endpoints with failover.
+
+    Keeps breaker state and metrics for the life of the process, so one
+    instance is shared by all reports. With `ranked`, endpoints are ordered
+    per request by `rank_routes`; without it, in the given order.
+    """
+
+    def __init__(self, endpoints: list[LLMEndpoint], policy: CallPolicy = CallPolicy(), ranked: bool = True):
+        if not endpoints:
+            raise ValueError("At least one LLM endpoint is required")
+        names = [e.name for e in endpoints]
+        if len(set(names)) != len(names):
+            raise ValueError(f"LLM endpoint names must be unique: {names}")
+        self.policy = policy
+        self.ranked = ranked
+        self._states = [
+            _EndpointState(e, CircuitBreaker(policy.breaker_failures, policy.breaker_reset))
+            for e in endpoints
+        ]
+
+    @property
+    def primary(self) -> LLMEndpoint:
+        return self._states[0].endpoint
+
+    async def get_so_completion(
+        self,
+        log: list,
+        pydantic_model: type[ModelT],
+        cache: Optional[CompletionCache] = None,
+        usage_tracker: Optional[UsageTracker] = None,
+        on_progress: Optional[ProgressCallback] = None,
+        sides_path: tuple[str, ...] = ("sides",),
+    ) -> CompletionResult[ModelT]:
+        """`get_so_completion` on the first endpoint that answers.
+
+        Endpoints are tried in the order `rank_routes` gives for the prompt
+        (those whose context is too small for it are not tried), or in the
+        configured order if the completer is not `ranked`. With `on_progress`, the completion is streamed (`stream_so_completion`)
+        and attempts are not hedged, so progress comes from one attempt at a time.
+
+        Errors:
+            LLMUnavailableError: All endpoints failed or are open; the last
+                error is chained.
+            Non-transient provider errors (e.g. authentication) propagate as is.
+        """
+        last_error: Optional[BaseException] = None
+        failed_over = False
+        states = self.route(log)
+        states[0].load.routed += 1
+        for state in states:
+            if not state.breaker.allow():
+                failed_over = True
+                continue
+            # counted before the first await, so concurrent requests see each other when routed
+            state.load.in_flight += 1
+            try:
+                result = await self._call(state, log, pydantic_model, cache, usage_tracker, on_progress, sides_path)
+            except RETRYABLE_ERRORS as e:
+                last_error = e
+                failed_over = True
+                continue
+            finally:
+                state.load.in_flight -= 1
+            if failed_over:
+                state.metrics.failovers += 1
+            return result
+        raise LLMUnavailableError(
+            f"No LLM endpoint answered ({', '.join(s.endpoint.name for s in states)})"
+        ) from last_error
+
+    def route(self, log: list) -> list[_EndpointState]:
+        """The endpoints to try for a request, best first."""
+        if not self.ranked:
+            return list(self._states)
+        order = rank_routes(
+            [s.endpoint for s in self._states],
+            [s.load for s in self._states],
+            prompt_tokens(log),
+        )
+        return [self._states[i] for i in order]
+
+    async def _call(self, state, log, pydantic_model, cache, usage_tracker, on_progress, sides_path) -> CompletionResult:
+        for attempt in range(self.policy.max_attempts):
+            try:
+                if on_progress is not None:
+                    result = await self._attempt(
+                        state, log, pydantic_model, cache, usage_tracker, on_progress, sides_path
+                    )
+                else:
+                    result = await self._hedged(state, log, pydantic_model, cache, usage_tracker)
+            except RETRYABLE_ERRORS:
+                state.breaker.record_failure()
+                if attempt + 1 >= self.policy.max_attempts or not state.breaker.allow():
+                    raise
+                await asyncio.sleep(self.policy.backoff(attempt))
+                continue
+            state.breaker.record_success()
+            return result
+
+    def _hedge_delay(self, metrics: ProviderMetrics) -> Optional[float]:
+        if not self.policy.hedge or len(metrics.latencies) < self.policy.hedge_min_samples:
+            return None
+        return max(self.policy.hedge_min_delay, metrics.p95())
+
+    async def _hedged(self, state, log, pydantic_model, cache, usage_tracker) -> CompletionResult:
+        primary = asyncio.create_task(self._attempt(state, log, pydantic_model, cache, usage_tracker))
+        delay = self._hedge_delay(state.metrics)
+        if delay is None:
+            return await primary
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+
+        state.metrics.hedges += 1
+        hedge = asyncio.create_task(self._attempt(state, log, pydantic_model, cache, usage_tracker))
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            state.metrics.hedges_won += 1
+                        return task.result()
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise error
+
+    async def _attempt(
+        self, state, log, pydantic_model, cache, usage_tracker, on_progress=None, sides_path=("sides",)
+    ) -> CompletionResult:
+        endpoint, metrics = state.endpoint, state.metrics
+        metrics.attempts += 1
+        if not endpoint.cache_hints:
+            log = plain_messages(log)
+        if on_progress is not None:
+            call = stream_so_completion(
+                log=log,
+                model_name=endpoint.model_name,
+                client=endpoint.client,
+                pydantic_model=pydantic_model,
+                provider_name=endpoint.provider_name,
+                on_progress=on_progress,
+                sides_path=sides_path,
+                cache=cache,
+                usage_tracker=usage_tracker,
+            )
+        else:
+            call = get_so_completion(
+                log=log,
+                model_name=endpoint.model_name,
+                client=endpoint.client,
+                pydantic_model=pydantic_model,
+                provider_name=endpoint.provider_name,
+                cache=cache,
+                usage_tracker=usage_tracker,
+            )
+        async with state.slots or contextlib.nullcontext():
+            try:
+                result = await asyncio.wait_for(call, timeout=self.policy.attempt_timeout)
+            except asyncio.TimeoutError:
+                metrics.timeouts += 1
+                metrics.failures += 1
+                raise
+            except RETRYABLE_ERRORS:
+                metrics.failures += 1
+                raise
+        metrics.successes += 1
+        if not result.cached:
+            metrics.latencies.append(result.latency_s)
+            state.load.observe(result.latency_s)
+        return result
+
+    def metrics(self) -> dict:
+        """Per-endpoint counters, p95 latency, routing load and breaker state."""
+        out = {}
+        for state in self._states:
+            m, load = state.metrics, state.load
+            p95 = m.p95()
+            out[state.endpoint.name] = {
+                "provider_name": state.endpoint.provider_name,
+                "model_name": state.endpoint.model_name,
+                "breaker": state.breaker.state.value,
+                "consecutive_failures": state.breaker.failures,
+                "attempts": m.attempts,
+                "successes": m.successes,
+                "failures": m.failures,
+                "timeouts": m.timeouts,
+                "hedges": m.hedges,
+                "hedges_won": m.hedges_won,
+                "failovers": m.failovers,
+                "p95_latency_s": round(p95, 3) if p95 is not None else None,
+                "routed": load.routed,
+                "in_flight": load.in_flight,
+                "latency_ewma_s": round(load.latency_ewma, 3) if load.latency_ewma is not None else None,
+            }
+        return out
@@ -1,4 +1,9 @@
+import asyncio
 import os
+from dataclasses import dataclass
+from typing import Any, Optional, Sequence
+
+from src.llm_agg.cache import CompletionCache
 from src.llm_agg.response import (
     get_default_completion,
     get_so_completion,
@@ -13,14 +18,28 @@ from src.llm_agg.prompts.base import BASE_PROMPT_WO_TASK
 from src.llm_agg.prompts.eval import RECOMMENDATIONS_PROMPT as REC_PROMPT
 
 
-def user_feedback_agg(
+@dataclass
+class AggregationResult:
+    """Outcome of one review in `aggregate_many`: the results or the error."""
+    index: int
+    sides: Any = None
+    recommendations: Any = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+async def user_feedback_agg(
     client,
     model_name: str,
     composite_review: str,
     SIDES_EXTRACTING_PROMPT: str,
     provider: str | None = None,
     RECOMMENDATIONS_PROMPT: str | None = REC_PROMPT,
-    SYSTEM_PROMPT: str | None = BASE_PROMPT_WO_TASK
+    SYSTEM_PROMPT: str | None = BASE_PROMPT_WO_TASK,
+    cache: Optional[CompletionCache] = None,
 ) -> tuple:
     if provider is None:
         provider = get_provider(os.getenv("OPENAI_BASE_URL"))
@@ -36,12 +55,13 @@ def user_feedback_agg(
         "content": SIDES_EXTRACTING_PROMPT.format(feedback=composite_review)
     })
 
-    user_analytics = get_so_completion(
+    user_analytics = await get_so_completion(
         log=log,
         model_name=model_name,
         client=client,
         pydantic_model=Sides,
-        provider_name=provider
+        provider_name=provider,
+        cache=cache,
     )
 
     if RECOMMENDATIONS_PROMPT is not None:
@@ -54,13 +74,53 @@ def user_feedback_agg(
             "content": RECOMMENDATIONS_PROMPT
         })
 
-        recs = get_so_completion(
+        recs = await get_so_completion(
             log=log,
             model_name=model_name,
             client=client,
             pydantic_model=Recommendations,
-            provider_name=provider
+            provider_name=provider,
+            cache=cache,
         )
 
         return user_analytics, recs
-    return user_analytics, None
\ No newline at end of file
+    return user_analytics, None
+
+
+async def aggregate_many(
+    client,
+    model_name: str,
+    reviews: Sequence[str],
+    SIDES_EXTRACTING_PROMPT: str,
+    concurrency: int = 8,
+    **kwargs,
+) -> list[AggregationResult]:
+    """Run `user_feedback_agg` for many composite reviews concurrently.
+
+    At most `concurrency` reviews are in flight at once. A failing review does
+    not cancel the others: its `AggregationResult.error` is set instead.
+
+    Args:
+        client: The AsyncOpenAI client.
+        model_name: The model name.
+        reviews: Composite reviews (see `utils.composite_review`).
+        SIDES_EXTRACTING_PROMPT: The extraction prompt with a `{feedback}` placeholder.
+        concurrency: Maximum number of reviews processed simultaneously.
+        **kwargs: Passed to `user_feedback_agg` (provider, prompts, cache).
+
+    Returns:
+        list[AggregationResult]: One result per review, in input order.
+    """
+    slots = asyncio.Semaphore(concurrency)
+
+    async def _one(index: int, review: str) -> AggregationResult:
+        async with slots:
+            try:
+                sides, recs = await user_feedback_agg(
+                    client, model_name, review, SIDES_EXTRACTING_PROMPT, **kwargs
+                )
+            except Exception as e:
+                return AggregationResult(index=index, error=e)
+        return AggregationResult(index=index, sides=sides, recommendations=recs)
+
+    return list(await asyncio.gather(*(_one(i, review) for i, review in enumerate(reviews))))
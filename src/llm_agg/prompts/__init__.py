@@ -1,5 +1,10 @@
 from .eval import (
     SIDES_EXTRACTING_PROMPT,
+    SIDES_CONSOLIDATION_PROMPT,
+    COMBINED_RECOMMENDATIONS_RULES,
+    SURVEY_DIGEST_PROMPT,
+    JSON_CONTINUE_PROMPT,
+    PROOF_REPAIR_PROMPT,
     RECOMMENDATIONS_PROMPT
 ) 
 from .base import BASE_PROMPT_WO_TASK
\ No newline at end of file
@@ -0,0 +1,123 @@
+"""Prompt layout that keeps the constant part of a request a cacheable prefix.
+
+Providers cache prompt prefixes: OpenAI automatically, OpenRouter-routed
+Anthropic/Gemini models when the prefix carries a `cache_control` hint. A
+prefix only hits the cache if it is byte-identical between requests, so the
+system prompt and the extraction rules always come first and unchanged, and
+everything that varies per report - the HR override of `Report.prompt` and
+the feedback itself - comes after them. The hints are only understood by
+OpenRouter; `plain_messages` turns a hinted request back into plain string
+contents for the other endpoints.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+from .base import BASE_PROMPT_WO_TASK
+from .eval import COMBINED_RECOMMENDATIONS_RULES, SIDES_EXTRACTING_RULES, SIDES_FEEDBACK_SECTION, SIDES_UPDATE_SECTION
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+OVERRIDE_HEADER = "Additional instructions for this report (they take precedence over the rules above):\n"
+
+
+@dataclass(frozen=True)
+class PromptLayout:
+    """A static system prompt and user prefix followed by a variable tail."""
+    system: Optional[str]
+    static_prefix: str
+    cache_hints: bool = False
+
+    def messages(self, variable: str) -> list[dict]:
+        """Chat messages with the static content first and `variable` last.
+
+        With `cache_hints`, the static parts are sent as separate content
+        parts marked with `cache_control` so providers that support explicit
+        prompt caching cache exactly them.
+        """
+        log = []
+        if self.system is not None:
+            if self.cache_hints:
+                log.append({"role": "system", "content": [
+                    {"type": "text", "text": self.system, "cache_control": CACHE_CONTROL},
+                ]})
+            else:
+                log.append({"role": "system", "content": self.system})
+        if self.cache_hints:
+            log.append({"role": "user", "content": [
+                {"type": "text", "text": self.static_prefix, "cache_control": CACHE_CONTROL},
+                {"type": "text", "text": variable},
+            ]})
+        else:
+            log.append({"role": "user", "content": self.static_prefix + variable})
+        return log
+
+
+def plain_messages(log: list[dict]) -> list[dict]:
+    """The messages with text content parts joined into strings (no `cache_control` hints)."""
+    plain = []
+    for message in log:
+        content = message.get("content")
+        if isinstance(content, list) and all(isinstance(p, dict) and p.get("type") == "text" for p in content):
+            message = {**message, "content": "".join(p["text"] for p in content)}
+        plain.append(message)
+    return plain
+
+
+def sides_layout(cache_hints: bool = False, system: Optional[str] = BASE_PROMPT_WO_TASK) -> PromptLayout:
+    """The layout of the side extraction request: system prompt + extraction rules."""
+    return PromptLayout(system=system, static_prefix=SIDES_EXTRACTING_RULES, cache_hints=cache_hints)
+
+
+def combined_layout(cache_hints: bool = False, system: Optional[str] = BASE_PROMPT_WO_TASK) -> PromptLayout:
+    """The layout of the single-call request: extraction rules + recommendation rules.
+
+    The variable part is the same as for `sides_layout` (`sides_variable_part`).
+    """
+    return PromptLayout(
+        system=system,
+        static_prefix=SIDES_EXTRACTING_RULES + COMBINED_RECOMMENDATIONS_RULES,
+        cache_hints=cache_hints,
+    )
+
+
+def sides_variable_part(feedback: str, override: Optional[str] = None) -> str:
+    """The per-report tail of the side extraction request.
+
+    Args:
+        feedback: Rendered reviewer feedback.
+        override: `Report.prompt` set by HR. It is appended after the static
+            rules instead of replacing them; if it contains `{feedback}`, the
+            feedback is placed there.
+
+    Returns:
+        str: The text that follows the static prefix.
+    """
+    if not override:
+        return SIDES_FEEDBACK_SECTION.replace("{feedback}", feedback)
+    if "{feedback}" in override:
+        return OVERRIDE_HEADER + override.replace("{feedback}", feedback)
+    return OVERRIDE_HEADER + override + "\n\n" + SIDES_FEEDBACK_SECTION.replace("{feedback}", feedback)
+
+
+def sides_update_variable_part(sides: str, feedback: str, override: Optional[str] = None) -> str:
+    """The tail of an incremental update request, after the same static prefix as `sides_layout`.
+
+    Args:
+        sides: JSON of the persisted `Sides`.
+        feedback: Rendered feedback of the reviewers not covered by `sides`.
+        override: `Report.prompt` set by HR, placed before the update section.
+            An override with a `{feedback}` placeholder is a template of a
+            full extraction request and cannot be used for an update.
+
+    Returns:
+        str: The text that follows the static prefix.
+
+    Errors:
+        ValueError: The override contains `{feedback}`.
+    """
+    if override and "{feedback}" in override:
+        raise ValueError("An override with a {feedback} placeholder needs a full extraction request")
+    section = SIDES_UPDATE_SECTION.replace("{sides}", sides).replace("{feedback}", feedback)
+    if not override:
+        return section
+    return OVERRIDE_HEADER + override + "\n\n" + section
@@ -1,4 +1,4 @@
-SIDES_EXTRACTING_PROMPT = """
+SIDES_EXTRACTING_RULES = """
 You are working on a task of collecting feedback and evaluating employees.  
 Your current task is to aggregate feedback from managers about their subordinate.  
 Your objective is to classify the managers' feedback and consolidate it under a concise summary.  
@@ -50,12 +50,36 @@ Quality control before output:
 - No quote is reused in different items.
 - Answer in Russian.
 
-Now proceed with the task.  
+"""
+
+# variable tail of the extraction prompt; everything before it is a static, cacheable prefix
+SIDES_FEEDBACK_SECTION = """Now proceed with the task.  
 Feedback from managers:  
 
 {feedback}
 """
 
+SIDES_EXTRACTING_PROMPT = SIDES_EXTRACTING_RULES + SIDES_FEEDBACK_SECTION
+
+# variable tail of an incremental update: the persisted classification plus only the new feedback
+SIDES_UPDATE_SECTION = """Now proceed with the task, updating an earlier classification.
+The classification below was made from the feedback of other reviewers; their feedback is not repeated.
+Update it with the feedback of the new reviewers:
+- Keep every existing item, and keep its proofs EXACTLY as given, including the reviewer markers.
+- Add proofs from the new reviewers to the items with the same subject; add new items for new subjects.
+- If a subject now has both strong and weak proofs, turn it into a single AmbiguousSide.
+- Respondent counts MUST equal the number of UNIQUE reviewer markers in the respective proofs.
+- Rewrite the summary if the new feedback changes the picture.
+
+Current classification:
+
+{sides}
+
+Feedback from new reviewers:
+
+{feedback}
+"""
+
 SIDES_EXTRACTING_PROMPT_WO_EXAMPLES_AND_RULES = """
 You are working on a task of collecting feedback and evaluating employees.  
 Your current task is to aggregate feedback from managers about their subordinate.  
@@ -131,6 +155,88 @@ Feedback from managers:
 {feedback}
 """
 
+# промпт для финального объединения частичных результатов map-reduce извлечения сторон
+SIDES_CONSOLIDATION_PROMPT = """
+You are working on a task of collecting feedback and evaluating employees.
+The feedback of many reviewers was processed in several parts, and the qualities extracted from each part were merged.
+Some items below may still describe the same subject in different words.
+
+Your task is to produce the final classification:
+- Merge items that describe the SAME competency and subject into one item with a single canonical name; do not merge different subjects.
+- If a merged subject has both strong and weak proofs, output a single AmbiguousSide (kind="ambiguous").
+- Keep every proof EXACTLY as given, including its reviewer marker in square brackets; do not invent, rephrase or drop quotes.
+- Respondent counts MUST equal the number of UNIQUE reviewer markers in the respective proofs.
+- Write a concise summary of the candidate (up to 120 characters) based on the non-ambiguous sides.
+- Answer in Russian.
+
+Items:
+
+{sides}
+"""
+
+# правила рекомендаций для режима с одним запросом (стороны и рекомендации в одном ответе);
+# идут после SIDES_EXTRACTING_RULES в статичном префиксе
+COMBINED_RECOMMENDATIONS_RULES = """
+In the same answer, also provide recommendations on how to work with the classified qualities.
+Output structure:
+- `sides`: the classification described above.
+- `recommendations`: one item per UNAMBIGUOUS item of `sides`; do not recommend on ambiguous sides.
+  The `side_ref` of an item MUST repeat the `side_description` and `side` of its quality exactly.
+
+Recommendation rules:
+- Craft recommendations not only from the classification but also from the original reviewers' feedback; it helps elaborate specific aspects of the person's qualities.
+- For each quality, produce:
+  - brief_explanation: 1–2 sentences explaining why this recommendation is relevant, referencing observed behaviors/evidence.
+  - recommendation: 1–2 sentences starting with a verb, specifying the next step and a target outcome/metric; include a timeframe or stakeholder if applicable.
+- Avoid generic advice; tailor recommendations to the employee's role, domain, and context found in the feedback.
+- For a strength: address minor gaps/risks mentioned in the feedback first; if it is consistently praised, suggest ways to leverage it (mentoring, leading an initiative, knowledge sharing, stretch goals).
+- For a weakness: focus on the most impactful root cause and propose the first concrete step for the near term (the next sprint/month).
+- Keep a supportive, professional tone; be specific and concise.
+- Answer in Russian.
+
+"""
+
+# промпт для сжатия ответов одного респондента сразу после отправки опроса
+SURVEY_DIGEST_PROMPT = """
+You are working on a task of collecting feedback and evaluating employees.
+Below are the answers of ONE reviewer about an employee, as "question: answer" lines.
+
+Your task is to condense them into a compact digest that keeps the evidence:
+- Group the statements by the quality/subject they are about; one item per subject, with a short topic name.
+- Set polarity: strong, weak, mixed (both in this feedback) or neutral.
+- For each item, copy 1–3 quotes VERBATIM (6–25 words each) from the answers; do not rephrase, translate or shorten words inside a quote.
+- Drop greetings, filler and statements unrelated to the employee's work.
+- Do not invent anything that is not in the answers.
+- Answer in Russian.
+
+Answers:
+
+{feedback}
+"""
+
+# промпт для исправления доказательств, которые не являются дословными цитатами
+PROOF_REPAIR_PROMPT = """The proofs of the classification items below were checked against the feedback, and some of them are not verbatim quotes of the reviewer named in their marker.
+Return the SAME items in the SAME order (do not add, merge or drop items, keep every side_description):
+- Replace every proof with an exact, verbatim quote (6–25 words) from the feedback of the reviewer in its marker; copy the text character by character.
+- Keep the reviewer marker in square brackets at the start of every proof; the marker must name the reviewer the quote comes from.
+- If no verbatim quote supports a proof, leave that proof out.
+- Respondent counts MUST equal the number of UNIQUE reviewer markers in the respective proofs.
+- Keep the summary as given.
+
+Items:
+
+{items}
+
+Feedback:
+
+{feedback}
+"""
+
+# промпт для продолжения ответа, оборванного посреди JSON (до повторного запроса целиком)
+JSON_CONTINUE_PROMPT = """Your previous answer was cut off and is not valid JSON.
+Continue it exactly from the last character: output ONLY the missing remainder of the JSON, without repeating anything and without any explanations or code fences.
+"""
+
 # промпт для генерации рекомендаций по работе с точками роста
 RECOMMENDATIONS_PROMPT = """
 You are working on improving the qualities of your company’s employees.
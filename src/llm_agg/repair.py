@@ -0,0 +1,222 @@
+"""Local repair of malformed structured outputs.
+
+`openrouter`/`local` providers return the JSON as plain text, and a reply
+cut off by the token limit or wrapped in a code fence fails validation even
+though almost all of it is usable. Before the call is treated as failed the
+text is repaired locally: code fences and prose around the JSON are
+stripped, trailing commas dropped, open strings and brackets closed,
+misspelled field names (e.g. `king` for `kind`) mapped to the schema, and,
+if the last array item was cut off mid-way, that item is dropped. Only when
+this does not give a valid model is the model asked to continue its answer.
+"""
+import difflib
+import json
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL | re.IGNORECASE)
+TRAILING_COMMA_RE = re.compile(r",(\s*)$")
+# a key (with or without its colon) left dangling at the end of an object
+DANGLING_KEY_RE = re.compile(r'(?:(?<=\{)|,)\s*"(?:[^"\\]|\\.)*"\s*:?\s*$')
+
+FIELD_NAME_CUTOFF = 0.75
+MAX_PRUNES = 3
+
+
+@dataclass
+class RepairStats:
+    """How malformed outputs were handled since the process started."""
+    valid: int = 0  # valid as returned
+    repaired: int = 0  # fixed locally
+    continued: int = 0  # fixed after a "continue" call
+    failed: int = 0  # still invalid; the call fails and the policy retries it
+
+    def stats(self) -> dict:
+        return {
+            "valid": self.valid,
+            "repaired": self.repaired,
+            "continued": self.continued,
+            "failed": self.failed,
+        }
+
+
+REPAIR_STATS = RepairStats()
+
+
+def strip_code_fences(text: str) -> str:
+    """The JSON inside a ```json fence, without prose before the first bracket."""
+    fenced = FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    return text[min(starts):].strip() if starts else text.strip()
+
+
+def _close(text: str) -> tuple[str, list[int]]:
+    """Drop trailing commas and close what is open.
+
+    Returns:
+        tuple[str, list[int]]: The balanced text and the offsets (in the
+            input) right after every array item that was complete.
+    """
+    out: list[str] = []
+    stack: list[str] = []
+    item_ends: list[int] = []
+    in_string = escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if not stack or stack[-1] != ch:
+                continue  # a stray closer
+            # `[1, 2,]` / `{"a": 1,}`
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            stack.pop()
+            if stack and stack[-1] == "]":
+                item_ends.append(i + 1)
+        out.append(ch)
+
+    if escape:
+        out.pop()
+    if in_string:
+        out.append('"')
+    tail = "".join(out).rstrip()
+    if stack and stack[-1] == "}":
+        tail = DANGLING_KEY_RE.sub("", tail)
+    tail = TRAILING_COMMA_RE.sub(r"\1", tail).rstrip()
+    if tail.endswith(":"):
+        tail += " null"
+    return tail + "".join(reversed(stack)), item_ends
+
+
+def repair_json(text: str) -> str:
+    """Strip fences, drop trailing commas and close open strings and brackets."""
+    return _close(strip_code_fences(text))[0]
+
+
+@lru_cache(maxsize=None)
+def _field_names(pydantic_model: type[BaseModel]) -> frozenset[str]:
+    names: set[str] = set()
+
+    def _walk(node: Any) -> None:
+        if isinstance(node, dict):
+            names.update(node.get("properties", {}).keys())
+            for value in node.values():
+                _walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                _walk(value)
+
+    _walk(pydantic_model.model_json_schema())
+    return frozenset(names)
+
+
+def fix_field_names(data: Any, known: frozenset[str]) -> Any:
+    """Rename keys that are not in the schema to the closest schema field name."""
+    if isinstance(data, list):
+        return [fix_field_names(item, known) for item in data]
+    if not isinstance(data, dict):
+        return data
+    fixed = {}
+    for key, value in data.items():
+        if key not in known and isinstance(key, str):
+            match = difflib.get_close_matches(key, known, n=1, cutoff=FIELD_NAME_CUTOFF)
+            if match and match[0] not in data:
+                key = match[0]
+        fixed[key] = fix_field_names(value, known)
+    return fixed
+
+
+def _validate(text: str, pydantic_model: type[ModelT]) -> Optional[ModelT]:
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    try:
+        return pydantic_model.model_validate(fix_field_names(data, _field_names(pydantic_model)))
+    except ValidationError:
+        return None
+
+
+def repair_completion(raw: str, pydantic_model: type[ModelT]) -> Optional[tuple[str, ModelT]]:
+    """Repair `raw` locally into a valid `pydantic_model`.
+
+    Returns:
+        tuple[str, ModelT] | None: The canonical JSON and the model, or None
+            if the text cannot be repaired without the LLM.
+    """
+    text = strip_code_fences(raw)
+    closed, item_ends = _close(text)
+    parsed = _validate(closed, pydantic_model)
+    # a cut-off last item usually misses required fields: drop it, then the one before
+    for end in list(reversed(item_ends))[:MAX_PRUNES]:
+        if parsed is not None:
+            break
+        parsed = _validate(_close(text[:end])[0], pydantic_model)
+    if parsed is None:
+        return None
+    return parsed.model_dump_json(), parsed
+
+
+async def parse_with_repair(
+    raw: str,
+    pydantic_model: type[ModelT],
+    continue_call: Optional[Callable[[str], Awaitable[str]]] = None,
+    stats: RepairStats = REPAIR_STATS,
+) -> tuple[str, ModelT]:
+    """Validate a structured output, repairing it locally or by a "continue" call if needed.
+
+    Args:
+        raw: The text returned by the provider.
+        pydantic_model: The response model.
+        continue_call: Asks the model to continue `raw` and returns the
+            continuation; used only if the local repair fails.
+        stats: Outcome counters.
+
+    Returns:
+        tuple[str, ModelT]: The (possibly repaired) JSON text and the model.
+
+    Errors:
+        ValidationError: Neither repair gave a valid model.
+    """
+    try:
+        parsed = pydantic_model.model_validate_json(raw)
+    except ValidationError as error:
+        repaired = repair_completion(raw, pydantic_model)
+        if repaired is not None:
+            stats.repaired += 1
+            return repaired
+        if continue_call is not None:
+            continuation = await continue_call(raw)
+            # the model may append the missing tail or start the JSON over
+            repaired = (
+                repair_completion(raw + continuation, pydantic_model)
+                or repair_completion(continuation, pydantic_model)
+            )
+            if repaired is not None:
+                stats.continued += 1
+                return repaired
+        stats.failed += 1
+        raise error
+    stats.valid += 1
+    return raw, parsed
@@ -5,6 +5,7 @@ from typing import Any, Mapping, Literal
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 from weasyprint import HTML
 
+from src.llm_agg.response import CompletionResult
 from src.llm_agg.reports.plots import plot_180_radar, plot_360_radar
 
 
@@ -58,6 +59,7 @@ def _as_dict(obj: Any):
     Normalize a JSON‑like object into a plain Python dict.
 
     Accepted inputs:
+    - CompletionResult: its already validated `parsed` model is dumped.
     - dict/Mapping: returned as a new dict copy.
     - Pydantic BaseModel: converted via `.model_dump()` (v2) or `.dict()` (v1).
     - JSON string: parsed via `json.loads()`.
@@ -67,6 +69,8 @@ def _as_dict(obj: Any):
     """
     if obj is None:
         return {}
+    if isinstance(obj, CompletionResult):
+        return obj.parsed.model_dump()
     if isinstance(obj, str):
         return json.loads(obj)
     if isinstance(obj, Mapping):
@@ -105,6 +109,41 @@ def _append_unique_side(bucket: list[dict], description: str, proofs: list[str])
     bucket.append({"side_description": description, "proofs": cleaned})
 
 
+def _score_rows(score_stats: Any) -> list[dict]:
+    """
+    Flatten per-question score statistics into template rows.
+
+    Accepts a sequence of objects (or mappings) with `question_text` and
+    optional `self` / `others` statistics exposing `count`, `mean`, `median`,
+    `stddev`, `min` and `max`.
+
+    Parameters:
+        score_stats: Sequence of per-question statistics, or None.
+    """
+    def _get(obj: Any, key: str):
+        if obj is None:
+            return None
+        return obj.get(key) if isinstance(obj, Mapping) else getattr(obj, key, None)
+
+    def _fmt(value: Any) -> str:
+        return "—" if value is None else f"{float(value):.2f}".rstrip("0").rstrip(".")
+
+    rows = []
+    for item in score_stats or []:
+        self_stats = _get(item, "self")
+        others = _get(item, "others")
+        rows.append({
+            "question_text": str(_get(item, "question_text") or ""),
+            "self_mean": _fmt(_get(self_stats, "mean")),
+            "count": _get(others, "count") or 0,
+            "mean": _fmt(_get(others, "mean")),
+            "median": _fmt(_get(others, "median")),
+            "stddev": _fmt(_get(others, "stddev")),
+            "range": "—" if others is None else f"{_fmt(_get(others, 'min'))}–{_fmt(_get(others, 'max'))}",
+        })
+    return rows
+
+
 def build_context_from_jsons(
     sides_json: Any,
     recommendations_json: Any,
@@ -113,6 +152,7 @@ def build_context_from_jsons(
     employee_name: str,
     visualization_url: str = "",
     quotes_layout: Literal["inline", "sublist"] = "inline",
+    score_stats: Any = None,
 ):
     """
     Convert Sides and Recommendations payloads to a Jinja template context.
@@ -123,14 +163,15 @@ def build_context_from_jsons(
     context expected by the template.
 
     Parameters:
-        sides_json: Sides payload (dict/Mapping, Pydantic model, or JSON string).
-        recommendations_json: Recommendations payload (dict/Mapping, Pydantic model,
+        sides_json: Sides payload (CompletionResult, dict/Mapping, Pydantic model, or JSON string).
+        recommendations_json: Recommendations payload (CompletionResult, dict/Mapping, Pydantic model,
             or JSON string).
         mark_name: Label of the assessment to show in headings (e.g., "180°" or "360°").
         employee_name: Employee full name used in the report.
         visualization_url: URL or filesystem path to the visualization image
             (empty string if not available).
         quotes_layout: Quote rendering mode in the template: "inline" or "sublist".
+        score_stats: Optional per-question score statistics rendered as a table.
     """
     sides = _as_dict(sides_json)
     recs = _as_dict(recommendations_json)
@@ -177,6 +218,7 @@ def build_context_from_jsons(
         "ambiguous_sides": ambiguous_sides,
         "recommendations": recommendations,
         "visualization_url": visualization_url,
+        "score_rows": _score_rows(score_stats),
     }
     return context
 
@@ -188,10 +230,12 @@ def create_report(
     sides_json: Any,
     recommendations_json: Any,
     numeric_values: dict,
+    score_stats: Any = None,
     employee_name: str = "employee",
     visualization_url: str | None = None,
     quotes_layout: Literal["inline", "sublist"] = "inline",
     write_intermediate_html: bool = True,
+    file_tag: str | None = None,
 ) -> str:
     """
     Render a PDF report from a Jinja template and numeric scores.
@@ -204,15 +248,19 @@ def create_report(
     Args:
         templates_dir: Directory containing Jinja templates.
         template_name: Template filename within `templates_dir`.
-        sides_json: Sides payload (dict/Mapping, Pydantic model, or JSON string).
-        recommendations_json: Recommendations payload (dict/Mapping, Pydantic model, or JSON string).
+        sides_json: Sides payload (CompletionResult, dict/Mapping, Pydantic model, or JSON string).
+        recommendations_json: Recommendations payload (CompletionResult, dict/Mapping, Pydantic model, or JSON string).
         numeric_values: Score dicts:
             {"manage-esteem": {label: value, ...} (required, ≥3),
              "self-esteem":   {label: value, ...} (optional, ≥3)}.
+        score_stats: Optional per-question statistics (count, mean, median,
+            stddev, min/max split by self and others) for the scores table.
         employee_name: Employee name used in the header and output filename.
         visualization_url: Optional path/URL for the radar image; temp path if None.
         quotes_layout: Quote rendering mode: "inline" or "sublist".
         write_intermediate_html: If True, also save the rendered HTML for debugging.
+        file_tag: Optional suffix of the output filename, so reports of the same
+            employee computed from different inputs do not overwrite each other.
     """
     self_scores = numeric_values.get("self-esteem", {})
     mgr_scores = numeric_values.get("manage-esteem", {})
@@ -250,6 +298,7 @@ def create_report(
         employee_name=employee_name,
         visualization_url=plot_uri,
         quotes_layout=quotes_layout,
+        score_stats=score_stats,
     )
 
     env = Environment(
@@ -261,7 +310,10 @@ def create_report(
     template = env.get_template(template_name)
     html = template.render(**context)
 
-    pdf_name = f"review_{_safe_filename(employee_name)}.pdf"
+    pdf_stem = f"review_{_safe_filename(employee_name)}"
+    if file_tag:
+        pdf_stem += f"_{_safe_filename(file_tag)}"
+    pdf_name = f"{pdf_stem}.pdf"
     tmp_root = Path(tempfile.gettempdir()) / "employee_reviews_html"
     tmp_root.mkdir(parents=True, exist_ok=True)
 
@@ -1,16 +1,119 @@
-from typing import Literal
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Generic, Literal, Optional, TypeVar
 from openai import AsyncOpenAI
 from pydantic import BaseModel
 
+from src.llm_agg.cache import CompletionCache
+from src.llm_agg.prompts import JSON_CONTINUE_PROMPT
+from src.llm_agg.repair import parse_with_repair
+from src.llm_agg.usage import TokenUsage, UsageTracker
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+@dataclass
+class CompletionResult(Generic[ModelT]):
+    """A structured completion, parsed and validated exactly once.
+
+    Attributes:
+        raw: The JSON text as returned by the provider (or the cache).
+        parsed: The validated `pydantic_model` instance.
+        usage: Token usage of the provider call (zeros for a cache hit).
+        latency_s: Wall time of the provider call.
+        model_name: The model that produced it.
+        cached: True if it was served from the completion cache.
+    """
+    raw: str
+    parsed: ModelT
+    usage: TokenUsage
+    latency_s: float
+    model_name: str
+    cached: bool = False
+
+    @property
+    def raw_bytes(self) -> bytes:
+        return self.raw.encode("utf-8")
+
+    def model_dump(self) -> dict:
+        return self.parsed.model_dump()
+
+
+@lru_cache(maxsize=None)
+def json_schema_response_format(pydantic_model: type[BaseModel]) -> dict:
+    """The `response_format` of a model for OpenAI-compatible providers, computed once per model."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": pydantic_model.__name__,
+            "schema": pydantic_model.model_json_schema()
+        }
+    }
+
+
+def continuation_call(
+    log: list,
+    model_name: str,
+    client: AsyncOpenAI,
+    label: str,
+    usage_tracker: Optional[UsageTracker] = None,
+):
+    """A callable that asks the model to finish its cut-off answer (see `parse_with_repair`)."""
+    async def _continue(raw: str) -> str:
+        started = time.perf_counter()
+        completion = await client.chat.completions.create(
+            model=model_name,
+            messages=[
+                *log,
+                {"role": "assistant", "content": raw},
+                {"role": "user", "content": JSON_CONTINUE_PROMPT},
+            ],
+            temperature=0.0,
+        )
+        if usage_tracker is not None:
+            usage_tracker.record(
+                f"{label}.continue", model_name, getattr(completion, "usage", None), time.perf_counter() - started
+            )
+        return completion.choices[0].message.content or ""
+    return _continue
+
 
 async def get_so_completion(
     log: list,
     model_name: str,
     client: AsyncOpenAI,
-    pydantic_model: BaseModel,
+    pydantic_model: type[ModelT],
     provider_name: Literal['openai', 'openrouter', 'local'],
-):
-    job = None
+    cache: Optional[CompletionCache] = None,
+    usage_tracker: Optional[UsageTracker] = None,
+) -> CompletionResult[ModelT]:
+    """Request a structured completion.
+
+    With a `cache`, an identical earlier request (same provider, model,
+    messages and schema) is answered from it. With a `usage_tracker`, the
+    token usage and latency of the provider call are recorded under the
+    model name. Malformed JSON from `openrouter`/`local` is repaired locally
+    (see `llm_agg.repair`) before the call is treated as failed.
+
+    Returns:
+        CompletionResult: The raw JSON and the validated model from one parse.
+    """
+    key = None
+    if cache is not None:
+        key = cache.make_key(log, model_name, pydantic_model, provider_name)
+        cached = cache.get(key)
+        if cached is not None:
+            return CompletionResult(
+                raw=cached,
+                parsed=pydantic_model.model_validate_json(cached),
+                usage=TokenUsage(),
+                latency_s=0.0,
+                model_name=model_name,
+                cached=True,
+            )
+
+    started = time.perf_counter()
     if provider_name == 'openai':
         completion = await client.beta.chat.completions.parse(
             model=model_name,
@@ -18,35 +121,52 @@ async def get_so_completion(
             messages=log,
             max_completion_tokens=10000,
         )
-        job = completion.choices[0].message.parsed
+        message = completion.choices[0].message
+        parsed = message.parsed
+        raw = message.content if message.content is not None else (parsed.model_dump_json() if parsed else None)
     elif provider_name == 'openrouter' or provider_name == "local":
-        model_schema = pydantic_model.model_json_schema()
         completion = await client.chat.completions.create(
             model=model_name,
             messages=log,
-            response_format={
-                "type": "json_schema",
-                "json_schema": {
-                    "name": pydantic_model.__name__,
-                    "schema": model_schema
-                }
-            },
+            response_format=json_schema_response_format(pydantic_model),
             temperature=0.0
         )
-        job = completion.choices[0].message.content
+        raw = completion.choices[0].message.content
+        parsed = None
+        if raw is not None:
+            # malformed JSON is repaired locally before the call counts as failed
+            raw, parsed = await parse_with_repair(
+                raw,
+                pydantic_model,
+                continue_call=continuation_call(
+                    log, model_name, client, pydantic_model.__name__, usage_tracker
+                ),
+            )
     else:
         raise ValueError(
             f"Unsupported provider_name: {provider_name!r}. "
             "Supported providers are: 'openai', 'openrouter', 'local'."
         )
-    
-    if job is None:
+    latency = time.perf_counter() - started
+
+    if parsed is None:
         raise RuntimeError(
             f"Completion returned no result for provider {provider_name!r} "
             f"and model {model_name!r}. This typically indicates an empty API response "
             "or a parsing/formatting issue."
         )
-    return job
+    result = CompletionResult(
+        raw=raw,
+        parsed=parsed,
+        usage=TokenUsage.from_response(getattr(completion, "usage", None)),
+        latency_s=latency,
+        model_name=model_name,
+    )
+    if usage_tracker is not None:
+        usage_tracker.record(pydantic_model.__name__, model_name, result.usage, latency)
+    if cache is not None:
+        cache.set(key, raw)
+    return result
 
 
 # да, это можно было смердижть с get_so_completion - мне пока лень
@@ -0,0 +1,93 @@
+"""Size-, load- and cost-aware routing of structured completions.
+
+Several OpenAI-compatible endpoints can be configured (`LLM_ROUTES`), e.g. a
+fast local model server with a small context and OpenRouter with a large
+one. For every request the endpoints whose context fits the estimated
+prompt are ranked: those with a free concurrency slot first, then the
+cheaper ones, then the ones with the lower recent latency. The rest of the
+ranking is the failover order of `ResilientCompleter`.
+"""
+from dataclasses import dataclass
+from typing import Literal, Optional, Protocol
+
+from pydantic import BaseModel, TypeAdapter
+
+from src.llm_agg.usage import estimate_tokens
+
+# weight of the newest latency in the moving average
+LATENCY_EWMA_ALPHA = 0.3
+
+
+class RouteConfig(BaseModel):
+    """One entry of the `LLM_ROUTES` JSON list."""
+    name: str
+    base_url: str
+    api_key: str = "local"
+    model_name: str
+    provider: Optional[Literal['openai', 'openrouter', 'local']] = None  # by default from `base_url`
+    max_prompt_tokens: int = 0  # 0: no limit
+    max_concurrency: int = 0  # requests in flight; 0: no limit
+    cost_per_1k_tokens: float = 0.0  # only the order matters
+    cache_hints: Optional[bool] = None  # send `cache_control` hints; by default only to OpenRouter
+
+
+ROUTES_ADAPTER = TypeAdapter(list[RouteConfig])
+
+
+def parse_routes(text: str) -> list[RouteConfig]:
+    """Parse `LLM_ROUTES`; an empty string means no routes."""
+    return ROUTES_ADAPTER.validate_json(text) if text.strip() else []
+
+
+class RouteLimits(Protocol):
+    max_prompt_tokens: int
+    max_concurrency: int
+    cost_per_1k_tokens: float
+
+
+@dataclass
+class RouteLoad:
+    in_flight: int = 0
+    routed: int = 0  # requests for which this endpoint was ranked first
+    latency_ewma: Optional[float] = None
+
+    def observe(self, latency_s: float) -> None:
+        if self.latency_ewma is None:
+            self.latency_ewma = latency_s
+        else:
+            self.latency_ewma += LATENCY_EWMA_ALPHA * (latency_s - self.latency_ewma)
+
+
+def prompt_tokens(log: list[dict]) -> int:
+    """Estimated prompt tokens of a message list (plain or content-part messages)."""
+    total = 0
+    for message in log:
+        content = message.get("content")
+        if isinstance(content, list):
+            content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+        total += estimate_tokens(content or "")
+    return total
+
+
+def rank_routes(routes: list[RouteLimits], loads: list[RouteLoad], tokens: int) -> list[int]:
+    """Indices of the routes in the order they should be tried for a prompt of `tokens`.
+
+    Routes whose context is too small are left out, unless none is large
+    enough; then the routes with the largest context are tried.
+    """
+    def fits(route: RouteLimits) -> bool:
+        return not route.max_prompt_tokens or route.max_prompt_tokens >= tokens
+
+    eligible = [i for i, route in enumerate(routes) if fits(route)]
+    if not eligible:
+        largest = max(route.max_prompt_tokens for route in routes)
+        eligible = [i for i, route in enumerate(routes) if route.max_prompt_tokens == largest]
+
+    def key(i: int):
+        route, load = routes[i], loads[i]
+        saturated = bool(route.max_concurrency) and load.in_flight >= route.max_concurrency
+        # an endpoint without samples yet is tried before slower known ones
+        latency = load.latency_ewma if load.latency_ewma is not None else 0.0
+        return saturated, route.cost_per_1k_tokens, latency, i
+
+    return sorted(eligible, key=key)
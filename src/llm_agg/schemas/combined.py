@@ -0,0 +1,8 @@
+from pydantic import BaseModel, Field
+from src.llm_agg.schemas.sides import Sides
+from src.llm_agg.schemas.recommendations import Recommendations
+
+
+class SidesWithRecommendations(BaseModel):
+    sides: Sides = Field(..., description="Classification of the employee's strong, weak and ambiguous sides")
+    recommendations: Recommendations = Field(..., description="Recommendations for the unambiguous sides listed in `sides`")
@@ -0,0 +1,12 @@
+from typing import Literal, Annotated
+from annotated_types import MinLen
+from pydantic import BaseModel, Field
+
+
+class DigestItem(BaseModel):
+    topic: str = Field(..., description="The quality or subject the quotes are about")
+    polarity: Literal['strong', 'weak', 'mixed', 'neutral'] = Field(..., description="How the reviewer assesses the quality")
+    quotes: Annotated[list[str], MinLen(1)] = Field(..., description="Verbatim quotes/excerpts from the feedback, copied without changes")
+
+class FeedbackDigest(BaseModel):
+    items: list[DigestItem]
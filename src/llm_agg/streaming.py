@@ -0,0 +1,232 @@
+"""Streaming structured completions with incremental parsing of sides.
+
+The completion is requested with `stream=True`. While the JSON arrives, a
+small scanner tracks strings and nesting and cuts out every object of the
+`sides` array as soon as its closing brace arrives, so progress (sides found
+so far, tokens received) is reported long before the whole answer is there.
+The final text is validated (and repaired if needed) exactly like
+`get_so_completion` does.
+"""
+import inspect
+import json
+import time
+from dataclasses import dataclass
+from typing import Annotated, Any, Awaitable, Callable, Literal, Optional, Union
+
+from openai import AsyncOpenAI
+from pydantic import Field, TypeAdapter, ValidationError
+
+from src.llm_agg.cache import CompletionCache
+from src.llm_agg.repair import parse_with_repair
+from src.llm_agg.response import CompletionResult, ModelT, continuation_call, json_schema_response_format
+from src.llm_agg.schemas.sides import AmbiguousSide, Side
+from src.llm_agg.usage import TokenUsage, UsageTracker
+
+SideItem = Annotated[Union[Side, AmbiguousSide], Field(discriminator='kind')]
+SIDE_ADAPTER = TypeAdapter(SideItem)
+
+# a progress event is also emitted every this many streamed chunks (~tokens)
+PROGRESS_EVERY_CHUNKS = 64
+
+
+@dataclass
+class ProgressEvent:
+    sides_parsed: int
+    tokens_received: int
+    side: Optional[Union[Side, AmbiguousSide]] = None  # the side that has just been parsed
+    done: bool = False
+
+
+ProgressCallback = Callable[[ProgressEvent], Union[None, Awaitable[None]]]
+
+
+class IncrementalSidesParser:
+    """Feeds on JSON text fragments and returns the side objects completed by each.
+
+    Args:
+        path: Keys leading from the root object to the array of sides:
+            ("sides",) for `Sides`, ("sides", "sides") for
+            `SidesWithRecommendations`.
+    """
+
+    def __init__(self, path: tuple[str, ...] = ("sides",)):
+        self.path = path
+        self.sides: list[Union[Side, AmbiguousSide]] = []
+        self._text = ""
+        self._pos = 0
+        self._stack: list[str] = []
+        self._keys: list[Optional[str]] = []  # the current key of every open object
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._array_depth: Optional[int] = None
+        self._item_start: Optional[int] = None
+
+    def feed(self, fragment: str) -> list[Union[Side, AmbiguousSide]]:
+        self._text += fragment
+        completed = []
+        text = self._text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start + 1:i]
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == ":":
+                if self._stack and self._stack[-1] == "{":
+                    self._keys[-1] = self._last_string
+            elif ch in "{[":
+                if ch == "{" and self._array_depth is not None and len(self._stack) == self._array_depth:
+                    self._item_start = i
+                self._stack.append(ch)
+                self._keys.append(None)
+                if ch == "[" and self._array_depth is None and self._at_path():
+                    self._array_depth = len(self._stack)
+            elif ch in "}]":
+                if ch == "}" and self._item_start is not None and len(self._stack) == self._array_depth + 1:
+                    side = self._parse_item(text[self._item_start:i + 1])
+                    self._item_start = None
+                    if side is not None:
+                        self.sides.append(side)
+                        completed.append(side)
+                if self._stack:
+                    self._stack.pop()
+                    self._keys.pop()
+                if ch == "]" and self._array_depth is not None and len(self._stack) < self._array_depth:
+                    self._array_depth = None
+        self._pos = len(text)
+        return completed
+
+    def _at_path(self) -> bool:
+        # every enclosing container is an object and their keys spell out the path
+        enclosing = self._stack[:-1]
+        if len(enclosing) != len(self.path) or any(c != "{" for c in enclosing):
+            return False
+        return tuple(self._keys[:-1]) == self.path
+
+    @staticmethod
+    def _parse_item(text: str) -> Optional[Union[Side, AmbiguousSide]]:
+        try:
+            return SIDE_ADAPTER.validate_python(json.loads(text))
+        except (ValueError, ValidationError):
+            # reported by the final validation of the whole answer
+            return None
+
+
+async def _emit(on_progress: Optional[ProgressCallback], event: ProgressEvent) -> None:
+    if on_progress is None:
+        return
+    result = on_progress(event)
+    if inspect.isawaitable(result):
+        await result
+
+
+async def stream_so_completion(
+    log: list,
+    model_name: str,
+    client: AsyncOpenAI,
+    pydantic_model: type[ModelT],
+    provider_name: Literal['openai', 'openrouter', 'local'],
+    on_progress: Optional[ProgressCallback] = None,
+    sides_path: tuple[str, ...] = ("sides",),
+    cache: Optional[CompletionCache] = None,
+    usage_tracker: Optional[UsageTracker] = None,
+) -> CompletionResult[ModelT]:
+    """`get_so_completion` over a token stream, reporting sides as they are parsed.
+
+    Args:
+        on_progress: Called (sync or async) whenever a side is parsed, every
+            `PROGRESS_EVERY_CHUNKS` chunks and once at the end with `done`.
+        sides_path: Keys of the sides array in `pydantic_model`.
+        Other arguments are as for `get_so_completion`; `openai` is requested
+        with a `json_schema` response format like the other providers.
+
+    Returns:
+        CompletionResult: The same result `get_so_completion` returns.
+    """
+    if provider_name not in ('openai', 'openrouter', 'local'):
+        raise ValueError(
+            f"Unsupported provider_name: {provider_name!r}. "
+            "Supported providers are: 'openai', 'openrouter', 'local'."
+        )
+    parser = IncrementalSidesParser(sides_path)
+
+    key = None
+    if cache is not None:
+        key = cache.make_key(log, model_name, pydantic_model, provider_name)
+        cached = cache.get(key)
+        if cached is not None:
+            parser.feed(cached)
+            await _emit(on_progress, ProgressEvent(len(parser.sides), 0, done=True))
+            return CompletionResult(
+                raw=cached,
+                parsed=pydantic_model.model_validate_json(cached),
+                usage=TokenUsage(),
+                latency_s=0.0,
+                model_name=model_name,
+                cached=True,
+            )
+
+    started = time.perf_counter()
+    stream = await client.chat.completions.create(
+        model=model_name,
+        messages=log,
+        response_format=json_schema_response_format(pydantic_model),
+        temperature=0.0,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    parts: list[str] = []
+    chunks = 0
+    usage: Any = None
+    async for chunk in stream:
+        if getattr(chunk, "usage", None) is not None:
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        content = chunk.choices[0].delta.content
+        if not content:
+            continue
+        parts.append(content)
+        chunks += 1
+        completed = parser.feed(content)
+        for side in completed:
+            await _emit(on_progress, ProgressEvent(len(parser.sides), chunks, side=side))
+        if not completed and chunks % PROGRESS_EVERY_CHUNKS == 0:
+            await _emit(on_progress, ProgressEvent(len(parser.sides), chunks))
+    latency = time.perf_counter() - started
+
+    raw = "".join(parts)
+    if not raw:
+        raise RuntimeError(
+            f"Completion returned no result for provider {provider_name!r} "
+            f"and model {model_name!r}. This typically indicates an empty API response "
+            "or a parsing/formatting issue."
+        )
+    raw, parsed = await parse_with_repair(
+        raw,
+        pydantic_model,
+        continue_call=continuation_call(log, model_name, client, pydantic_model.__name__, usage_tracker),
+    )
+    result = CompletionResult(
+        raw=raw,
+        parsed=parsed,
+        usage=TokenUsage.from_response(usage),
+        latency_s=latency,
+        model_name=model_name,
+    )
+    await _emit(on_progress, ProgressEvent(len(parser.sides), chunks, done=True))
+    if usage_tracker is not None:
+        usage_tracker.record(pydantic_model.__name__, model_name, result.usage, latency)
+    if cache is not None:
+        cache.set(key, raw)
+    return result
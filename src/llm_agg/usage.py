@@ -0,0 +1,103 @@
+"""Token and latency accounting of LLM calls.
+
+`usage` of a chat completion reports prompt and completion tokens and, for
+providers with prompt caching, how many prompt tokens were served from the
+cache (`prompt_tokens_details.cached_tokens`). Recording them per call makes
+the effect of the cacheable prompt prefix measurable.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (Cyrillic-heavy text averages ~3 characters per token)."""
+    return len(text) // 3 + 1
+
+
+@dataclass
+class TokenUsage:
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    completion_tokens: int = 0
+
+    @classmethod
+    def from_response(cls, usage: Any) -> "TokenUsage":
+        """Read the `usage` object (or dict) of an OpenAI-compatible response."""
+        if usage is None:
+            return cls()
+
+        def _get(obj, name):
+            if obj is None:
+                return None
+            return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+        details = _get(usage, "prompt_tokens_details")
+        return cls(
+            prompt_tokens=_get(usage, "prompt_tokens") or 0,
+            cached_tokens=_get(details, "cached_tokens") or 0,
+            completion_tokens=_get(usage, "completion_tokens") or 0,
+        )
+
+
+@dataclass
+class CallRecord:
+    label: str
+    model_name: str
+    usage: TokenUsage
+    latency_s: float
+
+
+@dataclass
+class UsageTracker:
+    """Collects one `CallRecord` per provider call (completion cache hits are not calls)."""
+    calls: list[CallRecord] = field(default_factory=list)
+
+    def record(self, label: str, model_name: str, usage: Any, latency_s: float) -> CallRecord:
+        record = CallRecord(
+            label=label,
+            model_name=model_name,
+            usage=usage if isinstance(usage, TokenUsage) else TokenUsage.from_response(usage),
+            latency_s=latency_s,
+        )
+        self.calls.append(record)
+        return record
+
+    def totals(self, label: Optional[str] = None) -> dict:
+        """Summed tokens and latency, optionally of the calls with one label."""
+        calls = [c for c in self.calls if label is None or c.label == label]
+        prompt = sum(c.usage.prompt_tokens for c in calls)
+        cached = sum(c.usage.cached_tokens for c in calls)
+        return {
+            "calls": len(calls),
+            "prompt_tokens": prompt,
+            "cached_tokens": cached,
+            "completion_tokens": sum(c.usage.completion_tokens for c in calls),
+            "cached_ratio": round(cached / prompt, 3) if prompt else 0.0,
+            "latency_s": round(sum(c.latency_s for c in calls), 3),
+        }
+
+
+@dataclass
+class ModeComparison:
+    """Wall time and token totals of whole extractions, grouped by mode.
+
+    Lets alternative extraction strategies (e.g. one combined call against
+    sides + recommendations calls) be compared on real reports.
+    """
+    runs: dict[str, list[tuple[float, dict]]] = field(default_factory=dict)
+
+    def record(self, mode: str, wall_s: float, totals: dict) -> None:
+        self.runs.setdefault(mode, []).append((wall_s, totals))
+
+    def summary(self) -> dict:
+        """Per mode: number of runs and mean wall time, prompt and completion tokens."""
+        out = {}
+        for mode, runs in self.runs.items():
+            n = len(runs)
+            out[mode] = {
+                "runs": n,
+                "avg_wall_s": round(sum(w for w, _ in runs) / n, 3),
+                "avg_prompt_tokens": round(sum(t["prompt_tokens"] for _, t in runs) / n, 1),
+                "avg_completion_tokens": round(sum(t["completion_tokens"] for _, t in runs) / n, 1),
+            }
+        return out
@@ -7,17 +7,22 @@ from dotenv import load_dotenv
 from typing import Callable, Any, Mapping, Literal
 from pydantic import BaseModel
 from decimal import Decimal
+
+from src.llm_agg.repair import repair_json
  
 
 def composite_review(reviews: list[str]):
-    composite = ""
-    template = "Review №{number}"
+    """Join reviews into one feedback text; empty reviews are skipped but keep their number.
 
-    for i, review in enumerate(reviews):
-        composite += template.format(number=i+1)
-        composite += review
-        composite += "\n"
-    return composite
+    For answers with their questions, `llm_agg.feedback.assemble_feedback`
+    writes each question once instead.
+    """
+    template = "Review №{number}"
+    return "".join(
+        f"{template.format(number=i+1)}{review}\n"
+        for i, review in enumerate(reviews)
+        if review and review.strip()
+    )
 
 
 def aggregate(schema: BaseModel, functions: Callable[[float], Any] | str) -> dict[str, Any]:
@@ -40,8 +45,21 @@ def aggregate(schema: BaseModel, functions: Callable[[float], Any] | str) -> dic
     return out
  
 
-def remove_ambiguous_sides(json_text: str) -> str:
-    data = json.loads(json_text)
+def remove_ambiguous_sides(sides_result: Any) -> str:
+    """Drop ambiguous sides; accepts a `CompletionResult`, a pydantic model, a dict or JSON text
+    (repaired locally if it is malformed).
+
+    Returns:
+        str: JSON of the remaining payload (the assistant turn of the next request).
+    """
+    if hasattr(sides_result, "parsed"):
+        sides_result = sides_result.parsed
+    if isinstance(sides_result, BaseModel):
+        data = sides_result.model_dump()
+    elif isinstance(sides_result, Mapping):
+        data = dict(sides_result)
+    else:
+        data = json.loads(repair_json(sides_result))
     sides = data.get('sides')
 
     if isinstance(sides, list):
@@ -61,13 +79,13 @@ def get_provider(base_url: str):
         return 'openrouter'
     if 'openai' in base_url:
         return 'openai'
-    if 'localhost' in base_url:
+    if 'localhost' in base_url or '127.0.0.1' in base_url:
         return 'local'
     raise ValueError(
         f"Unable to determine provider from base_url: {base_url!r}. "
-        "Expected it to contain 'openrouter', 'openai', or 'localhost'."
+        "Expected it to contain 'openrouter', 'openai', 'localhost' or '127.0.0.1'."
     )
 
 def get_client():
     load_dotenv()
-    return OpenAI()
\ No newline at end of file
+    return AsyncOpenAI()
\ No newline at end of file
@@ -0,0 +1,271 @@
+"""Verification of the proofs of extracted sides against the feedback.
+
+The extraction prompt requires every proof to be a verbatim quote from one
+reviewer, prefixed with that reviewer's marker, and every respondent count
+to equal the number of unique markers. Here the feedback of every reviewer
+is indexed once with a suffix automaton, so checking a proof takes time
+linear in its length. Counts are recomputed from markers locally; only the
+items with proofs that are not found are sent back to the model, and proofs
+that are still not found after that are dropped.
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import openai
+from pydantic import ValidationError
+
+from src.llm_agg.cache import CompletionCache
+from src.llm_agg.map_reduce import MARKER_RE, ReviewerFeedback, recount_sides, render_feedback, reviewer_marker
+from src.llm_agg.policy import LLMUnavailableError, ResilientCompleter
+from src.llm_agg.prompts import BASE_PROMPT_WO_TASK, PROOF_REPAIR_PROMPT
+from src.llm_agg.schemas.recommendations import Recommendations
+from src.llm_agg.schemas.sides import AmbiguousSide, Side, Sides
+from src.llm_agg.usage import UsageTracker
+
+# a quote may skip text with an ellipsis; every fragment must be verbatim
+ELLIPSIS_RE = re.compile(r"\.{3}|…")
+QUOTE_CHARS = " \t\n.,;:!?\"'«»“”„-—"
+MIN_WORDS, MAX_WORDS = 6, 25
+
+
+def normalize(text: str) -> str:
+    """Case, ё and whitespace insensitive form of feedback and quotes."""
+    return " ".join(text.lower().replace("ё", "е").split())
+
+
+class SuffixAutomaton:
+    """The minimal automaton of all substrings of a text: `contains` is O(len(pattern))."""
+
+    def __init__(self, text: str):
+        self.next: list[dict[str, int]] = [{}]
+        self.link = [-1]
+        self.length = [0]
+        last = 0
+        for ch in text:
+            cur = len(self.next)
+            self.next.append({})
+            self.length.append(self.length[last] + 1)
+            self.link.append(0)
+            p = last
+            while p != -1 and ch not in self.next[p]:
+                self.next[p][ch] = cur
+                p = self.link[p]
+            if p != -1:
+                q = self.next[p][ch]
+                if self.length[p] + 1 == self.length[q]:
+                    self.link[cur] = q
+                else:
+                    clone = len(self.next)
+                    self.next.append(dict(self.next[q]))
+                    self.length.append(self.length[p] + 1)
+                    self.link.append(self.link[q])
+                    while p != -1 and self.next[p].get(ch) == q:
+                        self.next[p][ch] = clone
+                        p = self.link[p]
+                    self.link[q] = clone
+                    self.link[cur] = clone
+            last = cur
+
+    def contains(self, pattern: str) -> bool:
+        state = 0
+        for ch in pattern:
+            state = self.next[state].get(ch)
+            if state is None:
+                return False
+        return True
+
+
+@dataclass
+class ProofIssue:
+    item: int  # index in `Sides.sides`
+    proof: str
+    reason: str  # "not_verbatim" | "unknown_marker" | "no_marker"
+
+
+@dataclass
+class VerificationReport:
+    proofs: int = 0
+    verbatim: int = 0
+    length_violations: int = 0  # outside the 6-25 words the prompt asks for; not repaired
+    counts_fixed: int = 0
+    repaired_items: int = 0  # items sent to the model
+    dropped_proofs: int = 0
+    dropped_items: int = 0
+    repair_error: Optional[str] = None  # the repair call failed; the failing proofs were dropped
+    issues: list[ProofIssue] = field(default_factory=list)
+
+    def stats(self) -> dict:
+        return {
+            "proofs": self.proofs,
+            "verbatim": self.verbatim,
+            "length_violations": self.length_violations,
+            "counts_fixed": self.counts_fixed,
+            "repaired_items": self.repaired_items,
+            "dropped_proofs": self.dropped_proofs,
+            "dropped_items": self.dropped_items,
+            "repair_error": self.repair_error,
+        }
+
+
+class FeedbackIndex:
+    """Suffix automata of the feedback of every reviewer, by normalized marker."""
+
+    def __init__(self, blocks: list[ReviewerFeedback]):
+        self._automata = {
+            reviewer_marker(f"[{block.marker}]"): SuffixAutomaton(normalize(block.text))
+            for block in blocks
+        }
+
+    def check(self, proof: str) -> Optional[str]:
+        """None if the proof is a verbatim quote of its reviewer, else the reason."""
+        marker = reviewer_marker(proof)
+        if marker is None:
+            return "no_marker"
+        automaton = self._automata.get(marker)
+        if automaton is None:
+            return "unknown_marker"
+        quote = MARKER_RE.sub("", proof, count=1)
+        fragments = [normalize(f).strip(QUOTE_CHARS) for f in ELLIPSIS_RE.split(quote)]
+        fragments = [f for f in fragments if f]
+        if not fragments or not all(automaton.contains(f) for f in fragments):
+            return "not_verbatim"
+        return None
+
+
+def _proofs(item) -> list[str]:
+    return item.proofs_strong + item.proofs_weak if isinstance(item, AmbiguousSide) else item.proofs
+
+
+def _counts(item) -> tuple[int, ...]:
+    if isinstance(item, AmbiguousSide):
+        return item.strong_count, item.weak_count
+    return (item.respondents_count,)
+
+
+def check_sides(sides: Sides, index: FeedbackIndex, report: Optional[VerificationReport] = None) -> VerificationReport:
+    """Check every proof of `sides`; issues are collected in the report."""
+    report = report or VerificationReport()
+    for i, item in enumerate(sides.sides):
+        for proof in _proofs(item):
+            report.proofs += 1
+            words = len(MARKER_RE.sub("", proof, count=1).split())
+            if not MIN_WORDS <= words <= MAX_WORDS:
+                report.length_violations += 1
+            reason = index.check(proof)
+            if reason is None:
+                report.verbatim += 1
+            else:
+                report.issues.append(ProofIssue(i, proof, reason))
+    return report
+
+
+def _without(item, bad: set[str]):
+    """The item without the proofs in `bad`, or None if a polarity has no proof left."""
+    if isinstance(item, AmbiguousSide):
+        strong = [p for p in item.proofs_strong if p not in bad]
+        weak = [p for p in item.proofs_weak if p not in bad]
+        if strong and weak:
+            return item.model_copy(update={"proofs_strong": strong, "proofs_weak": weak})
+        if strong or weak:
+            # only one polarity is left: it is no longer ambiguous
+            return Side(
+                side="strong" if strong else "weak",
+                side_description=item.side_description,
+                side_pick_explanation=item.side_pick_explanation,
+                respondents_count=item.strong_count if strong else item.weak_count,
+                proofs=strong or weak,
+            )
+        return None
+    proofs = [p for p in item.proofs if p not in bad]
+    return item.model_copy(update={"proofs": proofs}) if proofs else None
+
+
+def _repair_blocks(blocks: list[ReviewerFeedback], issues: list[ProofIssue]) -> list[ReviewerFeedback]:
+    """The reviewers a repair needs: those named by failing proofs, or all if a marker is unusable."""
+    markers = {reviewer_marker(issue.proof) for issue in issues if issue.reason == "not_verbatim"}
+    if any(issue.reason != "not_verbatim" for issue in issues):
+        return blocks
+    return [b for b in blocks if reviewer_marker(f"[{b.marker}]") in markers]
+
+
+async def verify_sides(
+    sides: Sides,
+    blocks: list[ReviewerFeedback],
+    completer: Optional[ResilientCompleter] = None,
+    cache: Optional[CompletionCache] = None,
+    usage_tracker: Optional[UsageTracker] = None,
+    render: Callable[[list[ReviewerFeedback]], str] = render_feedback,
+) -> tuple[Sides, VerificationReport]:
+    """Verify proofs, repair the failing items and recount respondents.
+
+    Args:
+        sides: The extracted sides.
+        blocks: The feedback of every reviewer (labels as in the prompt).
+        completer: Makes the targeted repair call; without it, or if the
+            call fails, failing proofs are dropped right away.
+        cache: Optional completion cache of the repair call.
+        usage_tracker: Optional recorder of the repair call.
+        render: Renders the feedback of the repair request (e.g. `assemble_feedback`).
+
+    Returns:
+        tuple[Sides, VerificationReport]: Sides whose proofs are all verbatim
+            and whose counts match their markers, and what was done.
+    """
+    index = FeedbackIndex(blocks)
+    report = check_sides(sides, index)
+    items = list(sides.sides)
+
+    failing = sorted({issue.item for issue in report.issues})
+    repaired = False
+    if failing and completer is not None:
+        request = Sides(sides=[items[i] for i in failing], summary=sides.summary)
+        prompt = (PROOF_REPAIR_PROMPT
+                  .replace("{items}", json.dumps(request.model_dump(), ensure_ascii=False, indent=2))
+                  .replace("{feedback}", render(_repair_blocks(blocks, report.issues))))
+        try:
+            result = await completer.get_so_completion(
+                [{"role": "system", "content": BASE_PROMPT_WO_TASK}, {"role": "user", "content": prompt}],
+                Sides, cache=cache, usage_tracker=usage_tracker,
+            )
+        except (LLMUnavailableError, openai.APIError, ValidationError) as e:
+            # the extraction itself succeeded; the unverified proofs are dropped as without a completer
+            report.repair_error = f"{type(e).__name__}: {str(e)[:200]}"
+        else:
+            repaired = True
+            report.repaired_items = len(failing)
+            # the answer replaces the failing items position by position
+            for i, item in zip(failing, result.parsed.sides):
+                items[i] = item
+
+    bad = {issue.proof for issue in report.issues}
+    if repaired:
+        recheck = check_sides(Sides(sides=[items[i] for i in failing], summary=sides.summary), index)
+        bad = {issue.proof for issue in recheck.issues}
+    kept = []
+    for item in items:
+        cleaned = _without(item, bad)
+        report.dropped_proofs += len(_proofs(item)) - (len(_proofs(cleaned)) if cleaned else 0)
+        if cleaned is None:
+            report.dropped_items += 1
+        else:
+            kept.append(cleaned)
+
+    recounted = recount_sides(Sides(sides=kept, summary=sides.summary))
+    report.counts_fixed = sum(_counts(a) != _counts(b) for a, b in zip(kept, recounted.sides))
+    return recounted, report
+
+
+def _side_keys(sides: Sides) -> set[tuple[str, str]]:
+    return {(item.side, normalize(item.side_description)) for item in sides.sides if isinstance(item, Side)}
+
+
+def prune_recommendations(rec: Recommendations, before: Sides, after: Sides) -> Recommendations:
+    """Drop the recommendations for sides that were listed before the verification but not after it."""
+    removed = _side_keys(before) - _side_keys(after)
+    items = [
+        item for item in rec.items
+        if (item.side_ref.side, normalize(item.side_ref.side_description)) not in removed
+    ]
+    return rec if len(items) == len(rec.items) else rec.model_copy(update={"items": items})